@@ -1,15 +1,32 @@
 from .alpaca_client import AlpacaClient
+from .async_fmp_client import AsyncFmpClient
 from .fmp_client import FmpClient
 from .cache_client import CacheClient
+from .cache_manager import CacheManager
+from .corporate_actions import SplitCalendar
+from .hedged_client import HedgedClient
+from .memory_cache_client import MemoryCacheClient
+from .panel import InterdayPanel
+from .rate_limiter import Priority, RateLimiter
+from .single_flight_client import SingleFlightClient
 from .base import (
     TimeInterval,
     DataError,
     DATA_COLUMNS,
+    COLUMN_DTYPES,
     DataClient,
 )
 from .utils import (
     get_default_data_client,
+    get_live_data_client,
     get_transactions,
+    ingest_interday_bulk,
+    invalidate_bars,
     load_interday_dataset,
+    load_interday_panel,
     load_intraday_dataset,
+    load_intraday_range,
+    plan_interday_history,
+    plan_intraday_range,
+    update_interday_history,
 )
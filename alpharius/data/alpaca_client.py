@@ -1,7 +1,7 @@
+import operator
 import os
 from typing import Dict, List, Optional
 
-import numpy as np
 import pandas as pd
 import retrying
 from alpaca.data import (
@@ -14,7 +14,11 @@ from alpaca.data import (
 )
 
 from alpharius.utils import TIME_ZONE, ALPACA_API_KEY_ENV, ALPACA_SECRET_KEY_ENV
-from .base import DATA_COLUMNS, DataClient, TimeInterval
+from .base import DataClient, TimeInterval
+from .decoding import decode_bars
+
+_BATCH_SIZE = 100
+_BAR_GETTER = operator.attrgetter('timestamp', 'open', 'high', 'low', 'close', 'volume')
 
 
 class AlpacaClient(DataClient):
@@ -32,7 +36,6 @@ class AlpacaClient(DataClient):
         secret_key = secret_key or os.environ[ALPACA_SECRET_KEY_ENV]
         self._client = StockHistoricalDataClient(api_key=api_key, secret_key=secret_key)
 
-    @retrying.retry(stop_max_attempt_number=3, wait_exponential_multiplier=500)
     def get_data(self,
                  symbol: str,
                  start_time: pd.Timestamp,
@@ -42,6 +45,28 @@ class AlpacaClient(DataClient):
 
         start_time and end_time are inclusive.
         """
+        return self._get_bars([symbol], start_time, end_time, time_interval)[symbol]
+
+    def get_data_batch(self,
+                       symbols: List[str],
+                       start_time: pd.Timestamp,
+                       end_time: pd.Timestamp,
+                       time_interval: TimeInterval) -> Dict[str, pd.DataFrame]:
+        """Loads data of multiple symbols with specified start and end time.
+
+        start_time and end_time are inclusive.
+        """
+        res = {}
+        for i in range(0, len(symbols), _BATCH_SIZE):
+            res.update(self._get_bars(symbols[i:i + _BATCH_SIZE], start_time, end_time, time_interval))
+        return res
+
+    @retrying.retry(stop_max_attempt_number=3, wait_exponential_multiplier=500)
+    def _get_bars(self,
+                  symbols: List[str],
+                  start_time: pd.Timestamp,
+                  end_time: pd.Timestamp,
+                  time_interval: TimeInterval) -> Dict[str, pd.DataFrame]:
         if not start_time.tzinfo:
             start_time = start_time.tz_localize(TIME_ZONE)
         if not end_time.tzinfo:
@@ -55,21 +80,17 @@ class AlpacaClient(DataClient):
         else:
             raise ValueError(f'time_interval {time_interval} not supported')
         request = StockBarsRequest(
-            symbol_or_symbols=symbol,
+            symbol_or_symbols=symbols,
             start=start_time.to_pydatetime(),
             end=end_time.to_pydatetime(),
             timeframe=timeframe,
             adjustment=Adjustment.SPLIT,
         )
         try:
-            bars = self._client.get_stock_bars(request).data[symbol]
-            bars.sort(key=lambda b: b.timestamp)
+            bar_data = self._client.get_stock_bars(request).data
         except AttributeError:
-            bars = []
-        index = pd.DatetimeIndex([pd.Timestamp(b.timestamp).tz_convert(TIME_ZONE) for b in bars])
-        data = [[np.float32(b.open), np.float32(b.high), np.float32(b.low), np.float32(b.close), np.uint32(b.volume)]
-                for b in bars]
-        return pd.DataFrame(data, index=index, columns=DATA_COLUMNS)
+            bar_data = {}
+        return {symbol: decode_bars(map(_BAR_GETTER, bar_data.get(symbol, []))) for symbol in symbols}
 
     @retrying.retry(stop_max_attempt_number=3, wait_exponential_multiplier=500)
     def get_last_trades(self, symbols: List[str]) -> Dict[str, float]:
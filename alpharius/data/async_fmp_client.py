@@ -0,0 +1,132 @@
+import asyncio
+import threading
+from typing import Any, Coroutine, Dict, List, Optional
+
+import aiohttp
+import pandas as pd
+
+from .base import TimeInterval
+from .fmp_client import FmpClient, _DAILY_BATCH_SIZE, _localize
+from .rate_limiter import Priority
+
+# Maximum number of requests in flight, which is also the connection pool size
+_MAX_CONCURRENCY = 50
+_MAX_ATTEMPTS = 3
+_RETRY_WAIT_SECONDS = 0.5
+
+
+class AsyncFmpClient(FmpClient):
+    """FMP data client sending requests concurrently on an asyncio event loop.
+
+    Requests share one keep-alive HTTP session, so connections and TLS sessions
+    are reused. The event loop runs in a background thread and the DataClient
+    methods are blocking facades over it. Batch methods fan out all requests at
+    once, bounded by max_concurrency, instead of using one thread per request.
+    """
+
+    def __init__(self,
+                 api_key: Optional[str] = None,
+                 priority: Priority = Priority.BACKGROUND,
+                 max_concurrency: int = _MAX_CONCURRENCY,
+                 base_url: Optional[str] = None) -> None:
+        super().__init__(api_key, priority, base_url)
+        self._max_concurrency = max_concurrency
+        self._session = None
+        self._semaphore = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='fmp-event-loop', daemon=True)
+        self._thread.start()
+
+    def _run(self, coro: Coroutine) -> Any:
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def close(self) -> None:
+        if self._session is not None:
+            self._run(self._session.close())
+            self._session = None
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    async def _get_json(self, url: str, params: Dict[str, str], endpoint: str) -> Any:
+        if self._session is None:
+            # Created lazily so that they are bound to the event loop
+            connector = aiohttp.TCPConnector(limit=self._max_concurrency)
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        for attempt in range(_MAX_ATTEMPTS):
+            try:
+                async with self._semaphore:
+                    async with self._rate_limiter.acquire_async(endpoint, self._priority, flow=self):
+                        async with self._session.get(url, params=params) as response:
+                            response.raise_for_status()
+                            return await response.json(content_type=None)
+            except aiohttp.ClientResponseError:
+                if attempt == _MAX_ATTEMPTS - 1:
+                    raise
+                await asyncio.sleep(_RETRY_WAIT_SECONDS * 2 ** attempt)
+
+    async def get_data_async(self,
+                             symbol: str,
+                             start_time: pd.Timestamp,
+                             end_time: pd.Timestamp,
+                             time_interval: TimeInterval) -> pd.DataFrame:
+        start_time, end_time = _localize(start_time), _localize(end_time)
+        url, params, endpoint = self._get_data_request(symbol, start_time, end_time, time_interval)
+        response_json = await self._get_json(url, params, endpoint)
+        return self._parse_data(response_json, start_time, end_time, time_interval)
+
+    async def get_data_batch_async(self,
+                                   symbols: List[str],
+                                   start_time: pd.Timestamp,
+                                   end_time: pd.Timestamp,
+                                   time_interval: TimeInterval) -> Dict[str, pd.DataFrame]:
+        start_time, end_time = _localize(start_time), _localize(end_time)
+        if time_interval != TimeInterval.DAY:
+            dfs = await asyncio.gather(*[self.get_data_async(symbol, start_time, end_time, time_interval)
+                                         for symbol in symbols])
+            return dict(zip(symbols, dfs))
+        batches = [symbols[i:i + _DAILY_BATCH_SIZE] for i in range(0, len(symbols), _DAILY_BATCH_SIZE)]
+        res = {}
+        for batch_res in await asyncio.gather(*[self._get_daily_batch_async(batch, start_time, end_time)
+                                                for batch in batches]):
+            res.update(batch_res)
+        return res
+
+    async def _get_daily_batch_async(self,
+                                     symbols: List[str],
+                                     start_time: pd.Timestamp,
+                                     end_time: pd.Timestamp) -> Dict[str, pd.DataFrame]:
+        url, params = self._get_daily_batch_request(symbols, start_time, end_time)
+        response_json = await self._get_json(url, params, 'historical-price-full')
+        return self._parse_daily_batch(response_json, symbols, start_time, end_time)
+
+    async def get_last_trades_async(self, symbols: List[str]) -> Dict[str, float]:
+        url, params = self._get_last_trades_request(symbols)
+        response_json = await self._get_json(url, params, 'batch-quote-short')
+        return self._parse_last_trades(response_json)
+
+    def get_data(self,
+                 symbol: str,
+                 start_time: pd.Timestamp,
+                 end_time: pd.Timestamp,
+                 time_interval: TimeInterval) -> pd.DataFrame:
+        """Loads data with specified start and end time.
+
+        start_time and end_time are inclusive.
+        """
+        return self._run(self.get_data_async(symbol, start_time, end_time, time_interval))
+
+    def get_data_batch(self,
+                       symbols: List[str],
+                       start_time: pd.Timestamp,
+                       end_time: pd.Timestamp,
+                       time_interval: TimeInterval) -> Dict[str, pd.DataFrame]:
+        """Loads data of multiple symbols concurrently.
+
+        start_time and end_time are inclusive.
+        """
+        return self._run(self.get_data_batch_async(symbols, start_time, end_time, time_interval))
+
+    def get_last_trades(self, symbols: List[str]) -> Dict[str, float]:
+        """Gets the last trade prices of a list of symbols."""
+        return self._run(self.get_last_trades_async(symbols))
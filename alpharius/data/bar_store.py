@@ -0,0 +1,188 @@
+import datetime
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import retrying
+
+from alpharius.utils import TIME_ZONE
+from .base import DATA_COLUMNS
+
+BAR_DTYPE = np.dtype([('Time', '<i8'),
+                      ('Open', '<f4'),
+                      ('High', '<f4'),
+                      ('Low', '<f4'),
+                      ('Close', '<f4'),
+                      ('Volume', '<u4')])
+_BARS_FILE = 'bars.npy'
+_SYMBOLS_FILE = 'symbols.json'
+
+
+def to_records(df: pd.DataFrame) -> np.ndarray:
+    """Converts a bar DataFrame to a fixed-width record array.
+
+    Time is stored as int64 epoch nanoseconds in UTC. Time without time zone
+    is regarded as New York time.
+    """
+    records = np.empty(len(df), dtype=BAR_DTYPE)
+    if len(df):
+        index = pd.DatetimeIndex(df.index)
+        if index.tz is None:
+            index = index.tz_localize(TIME_ZONE)
+        records['Time'] = index.as_unit('ns').asi8
+        for column in DATA_COLUMNS:
+            records[column] = df[column].to_numpy()
+    return records
+
+
+def merge_records(old: np.ndarray, new: np.ndarray) -> np.ndarray:
+    """Merges two record arrays sorted by time. New records win on the same time."""
+    merged = np.concatenate([old, new])[::-1]
+    _, indices = np.unique(merged['Time'], return_index=True)
+    return merged[indices]
+
+
+def to_frame(records: np.ndarray) -> pd.DataFrame:
+    """Converts a record array to a bar DataFrame.
+
+    Columns of the returned DataFrame are views of the records without copy.
+    """
+    index = pd.to_datetime(records['Time'], unit='ns', utc=True).tz_convert(TIME_ZONE)
+    return pd.DataFrame({column: records[column] for column in DATA_COLUMNS},
+                        index=index, copy=False)
+
+
+class BarStore:
+    """Columnar storage of bars of many symbols in one partition directory.
+
+    Bars of all symbols are concatenated into a single structured array which is
+    opened with numpy memory mapping. A JSON file maps each symbol to its row
+    range in the array. Symbols without any bars are recorded with an empty range
+    so that they are not loaded again. Optionally, the date range a symbol's bars
+    cover can be recorded, which may differ from the range of the bars themselves.
+    """
+
+    def __init__(self, partition_dir: str) -> None:
+        self._partition_dir = partition_dir
+        self._bars_file = os.path.join(partition_dir, _BARS_FILE)
+        self._symbols_file = os.path.join(partition_dir, _SYMBOLS_FILE)
+        self._lock = threading.RLock()
+        self._pending: Dict[str, np.ndarray] = dict()
+        self._removed = False
+        self._bars, self._offsets, self._coverages = self._open()
+
+    def _open(self) -> Tuple[np.ndarray, Dict[str, List[int]], Dict[str, List[str]]]:
+        empty = np.empty(0, dtype=BAR_DTYPE), dict(), dict()
+        if not os.path.isfile(self._symbols_file) or not os.path.isfile(self._bars_file):
+            return empty
+        try:
+            meta, bars = self._read()
+        except (IOError, ValueError, KeyError):
+            return empty
+        if bars.dtype != BAR_DTYPE or len(bars) != meta['num_rows']:
+            # Files are from different writes
+            return empty
+        return bars, meta['offsets'], meta.get('coverages', dict())
+
+    @retrying.retry(stop_max_attempt_number=2,
+                    wait_exponential_multiplier=500,
+                    retry_on_exception=lambda e: isinstance(e, IOError))
+    def _read(self) -> Tuple[dict, np.ndarray]:
+        with open(self._symbols_file, 'r') as f:
+            meta = json.load(f)
+        # Memory mapping does not work on an array without elements
+        bars = np.load(self._bars_file, mmap_mode='r' if meta['num_rows'] else None)
+        return meta, bars
+
+    def __contains__(self, symbol: str) -> bool:
+        with self._lock:
+            return symbol in self._offsets or symbol in self._pending
+
+    def symbols(self) -> List[str]:
+        with self._lock:
+            return sorted(set(self._offsets) | set(self._pending))
+
+    def get_records(self, symbol: str) -> np.ndarray:
+        with self._lock:
+            if symbol in self._pending:
+                return self._pending[symbol]
+            start, stop = self._offsets[symbol]
+            return self._bars[start:stop]
+
+    def get_coverage(self, symbol: str) -> Optional[Tuple[datetime.date, datetime.date]]:
+        """Gets the first and last dates covered by the bars of a symbol."""
+        with self._lock:
+            coverage = self._coverages.get(symbol)
+        if coverage is None:
+            return None
+        return pd.Timestamp(coverage[0]).date(), pd.Timestamp(coverage[1]).date()
+
+    def get(self, symbol: str) -> pd.DataFrame:
+        """Gets bars of a symbol as a DataFrame backed by the memory-mapped file."""
+        return to_frame(self.get_records(symbol))
+
+    def put(self, symbol: str, df: pd.DataFrame) -> None:
+        """Adds bars of a symbol. They are persisted on flush."""
+        self.put_records(symbol, to_records(df))
+
+    def put_records(self,
+                    symbol: str,
+                    records: np.ndarray,
+                    coverage: Optional[Tuple[datetime.date, datetime.date]] = None) -> None:
+        """Adds records of a symbol, replacing existing ones. They are persisted on flush."""
+        with self._lock:
+            self._pending[symbol] = records
+            if coverage is not None:
+                self._coverages[symbol] = [str(coverage[0]), str(coverage[1])]
+
+    def remove(self, symbol: str) -> None:
+        """Removes bars and coverage of a symbol. It is persisted on flush."""
+        with self._lock:
+            if symbol not in self and symbol not in self._coverages:
+                return
+            self._pending.pop(symbol, None)
+            self._offsets = {s: offset for s, offset in self._offsets.items() if s != symbol}
+            self._coverages.pop(symbol, None)
+            self._removed = True
+
+    def flush(self) -> None:
+        """Writes pending bars together with existing bars to disk."""
+        with self._lock:
+            if not self._pending and not self._removed:
+                return
+            symbols = self.symbols()
+            chunks = [self.get_records(symbol) for symbol in symbols]
+            offsets = dict()
+            start = 0
+            for symbol, chunk in zip(symbols, chunks):
+                offsets[symbol] = [start, start + len(chunk)]
+                start += len(chunk)
+            bars = np.concatenate(chunks) if chunks else np.empty(0, dtype=BAR_DTYPE)
+            self._write(bars, offsets, self._coverages)
+            # Serve bars from the written file, so that processes reading the
+            # same partition share them through the page cache.
+            mapped_bars, mapped_offsets, _ = self._open()
+            if mapped_offsets == offsets:
+                bars = mapped_bars
+            self._bars, self._offsets = bars, offsets
+            self._pending = dict()
+            self._removed = False
+
+    def _write(self,
+               bars: np.ndarray,
+               offsets: Dict[str, List[int]],
+               coverages: Dict[str, List[str]]) -> None:
+        os.makedirs(self._partition_dir, exist_ok=True)
+        suffix = f'.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(self._bars_file + suffix, 'wb') as f:
+            np.save(f, bars)
+        with open(self._symbols_file + suffix, 'w') as f:
+            json.dump({'num_rows': len(bars), 'offsets': offsets, 'coverages': coverages}, f)
+        # Bars are replaced first. A reader seeing new bars with old symbols
+        # detects the row count mismatch.
+        os.replace(self._bars_file + suffix, self._bars_file)
+        os.replace(self._symbols_file + suffix, self._symbols_file)
+
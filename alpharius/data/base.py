@@ -1,8 +1,9 @@
 import abc
 import os
 from enum import Enum
-from typing import Dict, List
+from typing import Dict, List, Tuple
 
+import numpy as np
 import pandas as pd
 
 from alpharius.utils import TIME_ZONE
@@ -11,6 +12,8 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__fi
 CACHE_DIR = os.path.join(BASE_DIR, 'cache')
 
 DATA_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+# Dtypes of DATA_COLUMNS in bars decoded from vendors and read from cache
+COLUMN_DTYPES = [np.float32, np.float32, np.float32, np.float32, np.uint32]
 
 
 class TimeInterval(Enum):
@@ -26,16 +29,30 @@ class DataError(Exception):
     """Error in data loading."""
 
 
+def get_day_range(day: pd.Timestamp) -> Tuple[pd.Timestamp, pd.Timestamp]:
+    """Gets the first and last minute of a given day."""
+    start_time = pd.Timestamp(year=day.year, month=day.month,
+                              day=day.day, hour=0, minute=0).tz_localize(tz=TIME_ZONE)
+    end_time = pd.Timestamp(year=day.year, month=day.month,
+                            day=day.day, hour=23, minute=59).tz_localize(tz=TIME_ZONE)
+    return start_time, end_time
+
+
 class DataClient(abc.ABC):
 
     def get_daily(self, symbol: str, day: pd.Timestamp, time_interval: TimeInterval) -> pd.DataFrame:
         """Loads data of a given day."""
-        start_time = pd.Timestamp(year=day.year, month=day.month,
-                                  day=day.day, hour=0, minute=0).tz_localize(tz=TIME_ZONE)
-        end_time = pd.Timestamp(year=day.year, month=day.month,
-                                day=day.day, hour=23, minute=59).tz_localize(tz=TIME_ZONE)
+        start_time, end_time = get_day_range(day)
         return self.get_data(symbol, start_time, end_time, time_interval)
 
+    def get_daily_batch(self,
+                        symbols: List[str],
+                        day: pd.Timestamp,
+                        time_interval: TimeInterval) -> Dict[str, pd.DataFrame]:
+        """Loads data of a given day for multiple symbols."""
+        start_time, end_time = get_day_range(day)
+        return self.get_data_batch(symbols, start_time, end_time, time_interval)
+
     @abc.abstractmethod
     def get_data(self,
                  symbol: str,
@@ -48,6 +65,19 @@ class DataClient(abc.ABC):
         """
         raise NotImplementedError()
 
+    def get_data_batch(self,
+                       symbols: List[str],
+                       start_time: pd.Timestamp,
+                       end_time: pd.Timestamp,
+                       time_interval: TimeInterval) -> Dict[str, pd.DataFrame]:
+        """Loads data of multiple symbols with specified start and end time.
+
+        start_time and end_time are inclusive. Clients with multi-symbol endpoints
+        override this to reduce the number of requests.
+        """
+        return {symbol: self.get_data(symbol, start_time, end_time, time_interval)
+                for symbol in symbols}
+
     @abc.abstractmethod
     def get_last_trades(self, symbols: List[str]) -> Dict[str, float]:
         """Gets the last trade prices of a list of symbols."""
@@ -1,23 +1,59 @@
+import collections
+import datetime
+import itertools
 import os
+import queue
 import sqlite3
-import datetime
-from typing import Dict, List, Tuple
+import threading
+from concurrent import futures
+from typing import Dict, Iterable, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 
+from alpharius.utils import TIME_ZONE, get_today
+from .bar_store import BAR_DTYPE, to_frame, to_records
 from .base import CACHE_DIR, DATA_COLUMNS, DataClient, TimeInterval
+from .resample import resample_bars
+
+_NANOS_PER_SECOND = 1000000000
+_SCHEMA_VERSION = 1
+_MAX_WRITE_BATCH = 500
 
 
 class CacheClient(DataClient):
     """A cache layer on top of DataClient with real data access.
 
-    It utilizes a local SQL Lite database as cache storage layer.
+    It utilizes a local SQL Lite database as cache storage layer. The client can be
+    shared by multiple threads. Each thread reads with its own connection, while all
+    writes go through a single writer thread that commits them in groups.
+
+    Hourly bars of past days missing in cache are aggregated from cached five-minute
+    bars if those cover the days, and only loaded from the underlying client otherwise.
+    Aggregation includes extended hours, same as hourly bars from vendors. Daily bars
+    are always loaded from the underlying client, since vendors derive them from
+    consolidated trades and official prices which five-minute bars don't reproduce.
     """
 
     def __init__(self, data_client: DataClient):
         self._data_client = data_client
-        self._db = init_db()
+        self._db_files = init_db()
+        self._local = threading.local()
+        self._writer = _CacheWriter(self._db_files)
+        self._lock = threading.Lock()
         self.cache_hit = 0
+        self.resample_hit = 0
+
+    def _get_conn(self, time_interval: TimeInterval) -> sqlite3.Connection:
+        if not hasattr(self._local, 'conns'):
+            self._local.conns = {}
+        if time_interval not in self._local.conns:
+            self._local.conns[time_interval] = connect_db(self._db_files[time_interval])
+        return self._local.conns[time_interval]
+
+    def _add_cache_hit(self) -> None:
+        with self._lock:
+            self.cache_hit += 1
 
     def get_data(self,
                  symbol: str,
@@ -26,44 +62,261 @@ class CacheClient(DataClient):
                  time_interval: TimeInterval) -> pd.DataFrame:
         """Loads data with specified start and end time.
 
-        start_time and end_time are inclusive.
+        start_time and end_time are inclusive. Only the sub-ranges missing in
+        cache are loaded from the underlying client. Bars of today are incomplete,
+        so they are loaded from the underlying client without being cached.
+        """
+        cached_range, live_range = _split_today(start_time, end_time)
+        if cached_range is None:
+            return self._data_client.get_data(symbol, start_time, end_time, time_interval)
+        df = self._get_cached_data(symbol, *cached_range, time_interval)
+        if live_range is None:
+            return df
+        return _concat([df, self._data_client.get_data(symbol, *live_range, time_interval)])
+
+    def _get_cached_data(self,
+                         symbol: str,
+                         start_time: pd.Timestamp,
+                         end_time: pd.Timestamp,
+                         time_interval: TimeInterval) -> pd.DataFrame:
+        db = self._get_conn(time_interval)
+        gaps = self._get_time_range(db, symbol).get_gaps(*_expand_to_days(start_time, end_time))
+        if not gaps:
+            self._add_cache_hit()
+        writes = []
+        for gap_start, gap_end in gaps:
+            df = self._resample(symbol, gap_start, gap_end, time_interval)
+            if df is None:
+                df = self._data_client.get_data(symbol, gap_start, gap_end, time_interval)
+            writes.append(self._writer.submit(time_interval, symbol, to_records(df), gap_start, gap_end))
+        for write in writes:
+            write.result()
+        return self._read(db, symbol, start_time, end_time, time_interval)
+
+    def get_data_batch(self,
+                       symbols: List[str],
+                       start_time: pd.Timestamp,
+                       end_time: pd.Timestamp,
+                       time_interval: TimeInterval) -> Dict[str, pd.DataFrame]:
+        """Loads data of multiple symbols with specified start and end time.
+
+        start_time and end_time are inclusive. Symbols missing the same sub-ranges
+        in cache are loaded from the underlying client with one batch call per sub-range.
+        Bars of today are loaded from the underlying client without being cached.
+        """
+        cached_range, live_range = _split_today(start_time, end_time)
+        if cached_range is None:
+            return self._data_client.get_data_batch(symbols, start_time, end_time, time_interval)
+        res = self._get_cached_data_batch(symbols, *cached_range, time_interval)
+        if live_range is None:
+            return res
+        live_res = self._data_client.get_data_batch(symbols, *live_range, time_interval)
+        return {symbol: _concat([df, live_res[symbol]]) if symbol in live_res else df
+                for symbol, df in res.items()}
+
+    def _get_cached_data_batch(self,
+                               symbols: List[str],
+                               start_time: pd.Timestamp,
+                               end_time: pd.Timestamp,
+                               time_interval: TimeInterval) -> Dict[str, pd.DataFrame]:
+        db = self._get_conn(time_interval)
+        plans = collections.defaultdict(list)
+        for symbol in symbols:
+            gaps = self._get_time_range(db, symbol).get_gaps(*_expand_to_days(start_time, end_time))
+            if gaps:
+                plans[tuple(gaps)].append(symbol)
+            else:
+                self._add_cache_hit()
+        writes = []
+        for gaps, plan_symbols in plans.items():
+            for gap_start, gap_end in gaps:
+                dfs = dict()
+                for symbol in plan_symbols:
+                    df = self._resample(symbol, gap_start, gap_end, time_interval)
+                    if df is not None:
+                        dfs[symbol] = df
+                missing_symbols = [symbol for symbol in plan_symbols if symbol not in dfs]
+                if missing_symbols:
+                    dfs.update(self._data_client.get_data_batch(missing_symbols, gap_start, gap_end, time_interval))
+                for symbol in plan_symbols:
+                    df = dfs.get(symbol, pd.DataFrame([], columns=DATA_COLUMNS))
+                    writes.append(self._writer.submit(time_interval, symbol, to_records(df), gap_start, gap_end))
+        for write in writes:
+            write.result()
+        return {symbol: self._read(db, symbol, start_time, end_time, time_interval) for symbol in symbols}
+
+    def _resample(self,
+                  symbol: str,
+                  start_time: pd.Timestamp,
+                  end_time: pd.Timestamp,
+                  time_interval: TimeInterval) -> Optional[pd.DataFrame]:
+        """Aggregates cached five-minute bars to hourly bars if they cover the range.
+
+        Returns None for other intervals or if five-minute bars don't cover the range.
         """
-        db = self._db[time_interval]
+        if time_interval != TimeInterval.HOUR or end_time.date() >= get_today().date():
+            return None
+        db = self._get_conn(TimeInterval.FIVE_MIN)
+        if not self._get_time_range(db, symbol).include(start_time, end_time):
+            return None
+        with self._lock:
+            self.resample_hit += 1
+        return resample_bars(self._read(db, symbol, start_time, end_time, TimeInterval.FIVE_MIN),
+                             time_interval, extended_hours=True)
+
+    @staticmethod
+    def _get_time_range(db: sqlite3.Connection, symbol: str) -> 'TimeRange':
         time_range = db.execute(
             'SELECT time_range from time_range WHERE symbol = ?',
             (symbol,)).fetchone()
-        time_range = TimeRange.from_string(time_range[0] if time_range else '')
-        if time_range.include(start_time, end_time):
-            columns = ','.join([c.lower() for c in DATA_COLUMNS])
-            bars = db.execute(
-                f'SELECT time, {columns} FROM chart WHERE date >= ? AND date <= ?',
-                [str(start_time.date()), str(end_time.date())]).fetchall()
-            index = pd.DatetimeIndex([pd.Timestamp(bar[0]) for bar in bars])
-            data = [bar[1:] for bar in bars]
-            self.cache_hit += 1
-            return pd.DataFrame(data, index=index, columns=DATA_COLUMNS)
-        else:
-            df = self._data_client.get_data(symbol, start_time, end_time, time_interval)
-            values = []
-            for ind, row in df.iterrows():
-                ind: pd.Timestamp
-                values.append([symbol, str(ind.date()), str(ind)] + [row[col] for col in DATA_COLUMNS])
-            columns = ','.join(DATA_COLUMNS)
-            marks = ','.join(['?' for _ in DATA_COLUMNS])
-            db.executemany(
-                (f'INSERT INTO chart (symbol, date, time, {columns})'
-                 f'VALUES (?, ?, ?, {marks}) ON CONFLICT (symbol, time) DO NOTHING'),
-                values)
-            time_range.merge(start_time, end_time)
-            db.execute(('INSERT INTO time_range (symbol, time_range) VALUES (?, ?)'
-                        'ON CONFLICT (symbol) DO UPDATE SET time_range = ?'),
-                       [symbol, time_range.to_string(), time_range.to_string()])
-            db.commit()
-            return df
+        return TimeRange.from_string(time_range[0] if time_range else '')
+
+    @staticmethod
+    def _read(db: sqlite3.Connection,
+              symbol: str,
+              start_time: pd.Timestamp,
+              end_time: pd.Timestamp,
+              time_interval: TimeInterval) -> pd.DataFrame:
+        start_time, end_time = _localize(start_time), _localize(end_time)
+        if time_interval == TimeInterval.DAY:
+            # Daily bars are indexed at 00:00 and selected by date, same as from vendors
+            start_time = pd.Timestamp.combine(start_time.date(), datetime.time(0, 0)).tz_localize(TIME_ZONE)
+            end_time = pd.Timestamp.combine(end_time.date(), datetime.time(23, 59)).tz_localize(TIME_ZONE)
+        columns = ','.join([c.lower() for c in DATA_COLUMNS])
+        cursor = db.execute(
+            f'SELECT time * {_NANOS_PER_SECOND}, {columns} FROM chart '
+            'WHERE symbol = ? AND time >= ? AND time <= ? ORDER BY time',
+            [symbol, int(start_time.timestamp()), int(end_time.timestamp())])
+        return to_frame(np.fromiter(cursor, dtype=BAR_DTYPE))
 
     def get_last_trades(self, symbols: List[str]) -> Dict[str, float]:
         return self._data_client.get_last_trades(symbols)
 
+    def close(self) -> None:
+        """Stops the writer thread after pending writes are committed."""
+        self._writer.close()
+
+
+def _localize(t: pd.Timestamp) -> pd.Timestamp:
+    return t if t.tzinfo else t.tz_localize(TIME_ZONE)
+
+
+def _split_today(start_time: pd.Timestamp,
+                 end_time: pd.Timestamp) -> Tuple[Optional[Tuple[pd.Timestamp, pd.Timestamp]],
+                                                  Optional[Tuple[pd.Timestamp, pd.Timestamp]]]:
+    """Splits a time range into the part before today, which is cached, and the part since today."""
+    today = get_today()
+    if _localize(end_time) < today:
+        return (start_time, end_time), None
+    if _localize(start_time) >= today:
+        return None, (start_time, end_time)
+    return (start_time, today - datetime.timedelta(minutes=1)), (today, end_time)
+
+
+def _expand_to_days(start_time: pd.Timestamp,
+                    end_time: pd.Timestamp) -> Tuple[pd.Timestamp, pd.Timestamp]:
+    """Expands a time range to whole days, which are the unit of cached ranges."""
+    start_day = pd.Timestamp.combine(start_time.date(), datetime.time(0, 0))
+    end_day = pd.Timestamp.combine(end_time.date(), datetime.time(23, 59))
+    if start_time.tzinfo:
+        start_day = start_day.tz_localize(start_time.tzinfo)
+    if end_time.tzinfo:
+        end_day = end_day.tz_localize(end_time.tzinfo)
+    return start_day, end_day
+
+
+def _concat(dfs: List[pd.DataFrame]) -> pd.DataFrame:
+    non_empty = [df for df in dfs if len(df)]
+    if len(non_empty) <= 1:
+        return non_empty[0] if non_empty else dfs[0]
+    return pd.concat(non_empty)
+
+
+class _CacheWriter:
+    """Writes bars to cache in a dedicated thread.
+
+    Writes submitted while a commit is in progress are grouped into the next commit.
+    Time ranges are read and merged in the writer thread so that concurrent writes
+    of the same symbol do not overwrite each other.
+    """
+
+    def __init__(self, db_files: Dict[TimeInterval, str]) -> None:
+        self._db_files = db_files
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='cache_writer', daemon=True)
+        self._thread.start()
+
+    def submit(self,
+               time_interval: TimeInterval,
+               symbol: str,
+               records: np.ndarray,
+               start_time: pd.Timestamp,
+               end_time: pd.Timestamp) -> futures.Future:
+        future = futures.Future()
+        self._queue.put((future, time_interval, symbol, records, start_time, end_time))
+        return future
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        conns = {time_interval: connect_db(db_file) for time_interval, db_file in self._db_files.items()}
+        closed = False
+        while not closed:
+            batch = [self._queue.get()]
+            while len(batch) < _MAX_WRITE_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                closed = True
+                batch = [item for item in batch if item is not None]
+            try:
+                for _, time_interval, symbol, records, start_time, end_time in batch:
+                    self._write(conns[time_interval], symbol, records, start_time, end_time)
+                for conn in conns.values():
+                    conn.commit()
+            except Exception as e:
+                # Errors are raised to the callers so that the writer keeps running
+                for conn in conns.values():
+                    conn.rollback()
+                for future, *_ in batch:
+                    future.set_exception(e)
+            else:
+                for future, *_ in batch:
+                    future.set_result(None)
+        for conn in conns.values():
+            conn.close()
+
+    @staticmethod
+    def _write(db: sqlite3.Connection,
+               symbol: str,
+               records: np.ndarray,
+               start_time: pd.Timestamp,
+               end_time: pd.Timestamp) -> None:
+        columns = ','.join(DATA_COLUMNS)
+        marks = ','.join(['?' for _ in DATA_COLUMNS])
+        updates = ','.join([f'{column} = excluded.{column}' for column in DATA_COLUMNS])
+        db.executemany(
+            (f'INSERT INTO chart (symbol, time, {columns})'
+             f'VALUES (?, ?, {marks}) ON CONFLICT (symbol, time) DO UPDATE SET {updates}'),
+            zip(itertools.repeat(symbol),
+                (records['Time'] // _NANOS_PER_SECOND).tolist(),
+                *[records[column].tolist() for column in DATA_COLUMNS]))
+        # Bars of today are incomplete, and they are always loaded again
+        today = get_today().date()
+        if end_time.date() >= today:
+            end_time = pd.Timestamp.combine(today - datetime.timedelta(days=1), datetime.time(23, 59))
+            if start_time.date() > end_time.date():
+                return
+        time_range = CacheClient._get_time_range(db, symbol)
+        time_range.merge(start_time, end_time)
+        db.execute(('INSERT INTO time_range (symbol, time_range) VALUES (?, ?)'
+                    'ON CONFLICT (symbol) DO UPDATE SET time_range = ?'),
+                   [symbol, time_range.to_string(), time_range.to_string()])
+
 
 class TimeRange:
     def __init__(self, intervals: List[Tuple[datetime.date, datetime.date]]):
@@ -97,13 +350,65 @@ class TimeRange:
                 return True
         return False
 
+    def get_gaps(self,
+                 start_time: pd.Timestamp,
+                 end_time: pd.Timestamp) -> List[Tuple[pd.Timestamp, pd.Timestamp]]:
+        """Gets the sub-ranges between start_time and end_time not covered by intervals.
+
+        Each sub-range spans whole days, except that the first and last ones are
+        bounded by start_time and end_time.
+        """
+        start_date = start_time.date()
+        end_date = end_time.date()
+        gap_dates = []
+        current = start_date
+        for interval_start, interval_end in self.intervals:
+            if current > end_date or interval_start > end_date:
+                break
+            if interval_end < current:
+                continue
+            if interval_start > current:
+                gap_dates.append((current, interval_start - datetime.timedelta(days=1)))
+            current = interval_end + datetime.timedelta(days=1)
+        if current <= end_date:
+            gap_dates.append((current, end_date))
+        gaps = []
+        for gap_start_date, gap_end_date in gap_dates:
+            if gap_start_date == start_date:
+                gap_start = start_time
+            else:
+                gap_start = pd.Timestamp.combine(gap_start_date, datetime.time(0, 0))
+                if start_time.tzinfo:
+                    gap_start = gap_start.tz_localize(start_time.tzinfo)
+            if gap_end_date == end_date:
+                gap_end = end_time
+            else:
+                gap_end = pd.Timestamp.combine(gap_end_date, datetime.time(23, 59))
+                if end_time.tzinfo:
+                    gap_end = gap_end.tz_localize(end_time.tzinfo)
+            gaps.append((gap_start, gap_end))
+        return gaps
+
+    def remove(self, date: datetime.date):
+        intervals = []
+        for interval_start, interval_end in self.intervals:
+            if not interval_start <= date <= interval_end:
+                intervals.append((interval_start, interval_end))
+                continue
+            if interval_start < date:
+                intervals.append((interval_start, date - datetime.timedelta(days=1)))
+            if date < interval_end:
+                intervals.append((date + datetime.timedelta(days=1), interval_end))
+        self.intervals = intervals
+
     def merge(self, start_time: pd.Timestamp, end_time: pd.Timestamp):
         self.intervals.append((start_time.date(), end_time.date()))
         self.intervals.sort()
         intervals = []
         for interval in self.intervals:
-            if intervals and intervals[-1][1] >= interval[0]:
-                intervals[-1] = (intervals[-1][0], interval[1])
+            # Intervals on consecutive days are joined
+            if intervals and intervals[-1][1] + datetime.timedelta(days=1) >= interval[0]:
+                intervals[-1] = (intervals[-1][0], max(intervals[-1][1], interval[1]))
             else:
                 intervals.append(interval)
         self.intervals = intervals
@@ -115,14 +420,93 @@ def get_db_file(time_interval: TimeInterval):
     return db_file
 
 
-def init_db() -> Dict[TimeInterval, sqlite3.Connection]:
+def connect_db(db_file: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_file)
+    conn.execute('PRAGMA synchronous = NORMAL')
+    return conn
+
+
+def init_db() -> Dict[TimeInterval, str]:
+    """Creates or migrates cache databases and returns their file paths."""
     sql_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'cache_db.sql')
     with open(sql_file, 'r') as f:
         init_script = f.read()
-    db = {}
+    db_files = {}
     for time_interval in TimeInterval:
         db_file = get_db_file(time_interval)
         conn = sqlite3.connect(db_file)
-        conn.executescript(init_script)
-        db[time_interval] = conn
-    return db
+        # WAL mode lets readers proceed while the writer commits
+        conn.execute('PRAGMA journal_mode = WAL')
+        migrate_db(conn, init_script)
+        conn.close()
+        db_files[time_interval] = db_file
+    return db_files
+
+
+def invalidate_db(db_file: str, invalidations: Dict[str, datetime.date]) -> None:
+    """Removes cached bars of symbols before the given dates, so that they are loaded again."""
+    if not os.path.isfile(db_file):
+        return
+    conn = connect_db(db_file)
+    try:
+        for symbol, date in invalidations.items():
+            cutoff = int(pd.Timestamp(date).tz_localize(TIME_ZONE).timestamp())
+            conn.execute('DELETE FROM chart WHERE symbol = ? AND time < ?', [symbol, cutoff])
+            _trim_time_range(conn, symbol, date)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def remove_days_from_db(db_file: str, days: Iterable[datetime.date]) -> None:
+    """Removes cached bars of all symbols on the given days, so that they are loaded again."""
+    if not os.path.isfile(db_file):
+        return
+    days = sorted(set(days))
+    conn = connect_db(db_file)
+    try:
+        for day in days:
+            day_start = int(pd.Timestamp(day).tz_localize(TIME_ZONE).timestamp())
+            day_end = int(pd.Timestamp(day + datetime.timedelta(days=1)).tz_localize(TIME_ZONE).timestamp())
+            conn.execute('DELETE FROM chart WHERE time >= ? AND time < ?', [day_start, day_end])
+        for symbol, in conn.execute('SELECT symbol FROM time_range').fetchall():
+            time_range = CacheClient._get_time_range(conn, symbol)
+            for day in days:
+                time_range.remove(day)
+            conn.execute('UPDATE time_range SET time_range = ? WHERE symbol = ?',
+                         [time_range.to_string(), symbol])
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _trim_time_range(conn: sqlite3.Connection, symbol: str, date: datetime.date) -> None:
+    time_range = CacheClient._get_time_range(conn, symbol)
+    time_range.intervals = [(max(interval_start, date), interval_end)
+                            for interval_start, interval_end in time_range.intervals
+                            if interval_end >= date]
+    conn.execute('UPDATE time_range SET time_range = ? WHERE symbol = ?',
+                 [time_range.to_string(), symbol])
+
+
+def migrate_db(conn: sqlite3.Connection, init_script: str) -> None:
+    """Creates tables and migrates existing tables to the latest schema.
+
+    Schema version 1 stores time as integer epoch seconds instead of text.
+    """
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    legacy_chart = version < _SCHEMA_VERSION and conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'chart'").fetchone()
+    if legacy_chart:
+        # Indexes of the legacy table are dropped together with it
+        conn.execute('ALTER TABLE chart RENAME TO legacy_chart')
+    conn.executescript(init_script)
+    if legacy_chart:
+        columns = ','.join(DATA_COLUMNS)
+        # Text time is in the format of "%F %T%z", which SQLite converts to UTC
+        conn.execute(f'INSERT INTO chart (symbol, time, {columns}) '
+                     f"SELECT symbol, CAST(strftime('%s', time) AS INTEGER), {columns} FROM legacy_chart "
+                     'WHERE true ON CONFLICT (symbol, time) DO NOTHING')
+        conn.execute('DROP TABLE legacy_chart')
+    conn.execute(f'PRAGMA user_version = {_SCHEMA_VERSION}')
+    conn.commit()
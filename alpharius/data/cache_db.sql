@@ -5,8 +5,7 @@ CREATE TABLE IF NOT EXISTS time_range (
 
 CREATE TABLE IF NOT EXISTS chart (
     symbol TEXT,
-    date TEXT,
-    time TEXT,
+    time INTEGER,
     open REAL,
     high REAL,
     low REAL,
@@ -14,6 +13,3 @@ CREATE TABLE IF NOT EXISTS chart (
     volume INTEGER,
     UNIQUE (symbol, time)
 );
-
-CREATE INDEX IF NOT EXISTS chart_time ON chart (symbol);
-CREATE INDEX IF NOT EXISTS chart_time ON chart (date);
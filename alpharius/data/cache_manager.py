@@ -0,0 +1,328 @@
+import argparse
+import collections
+import dataclasses
+import datetime
+import hashlib
+import os
+import shutil
+import sqlite3
+import time
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd
+import tabulate
+
+from .bar_store import BarStore
+from .base import CACHE_DIR, TimeInterval
+from .cache_client import connect_db, remove_days_from_db
+
+_CACHE_BUDGET_ENV = 'CACHE_BUDGET_GB'
+_DEFAULT_BUDGET_GB = 20
+_BYTES_PER_GB = 1024 ** 3
+# Units used recently may be read by a running process
+_MIN_IDLE_SECONDS = 3600
+_HASH_CHUNK_SIZE = 1024 * 1024
+_MUTABLE_SUFFIXES = ('.db', '.db-wal', '.db-shm')
+# Files of these categories are only replaced as a whole, so they can share content
+_IMMUTABLE_CATEGORIES = ('interday_history', 'interday_snapshot', 'intraday', 'stock_universe')
+_LEGACY_PICKLE_PREFIX = 'history_'
+_LEGACY_PICKLE_SUFFIX = '.pickle'
+
+
+@dataclasses.dataclass
+class CacheUnit:
+    """A directory or file in cache that is evicted as a whole."""
+    path: str
+    category: str
+    num_files: int
+    num_bytes: int
+    # Bytes released if the unit is removed, excluding content shared with other units
+    num_own_bytes: int
+    last_access: float
+    evictable: bool
+
+
+def _walk_files(path: str) -> Iterator[str]:
+    if os.path.isfile(path):
+        yield path
+        return
+    for root, _, files in os.walk(path):
+        for file in files:
+            yield os.path.join(root, file)
+
+
+def _get_file_hash(file: str) -> str:
+    digest = hashlib.sha256()
+    with open(file, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class CacheManager:
+    """Keeps the cache directory within a disk budget.
+
+    The cache is organized into units: interday snapshots and intraday partitions
+    of each day are evictable, as well as cached stock universes. The interday
+    history and the SQL Lite databases are never evicted as a whole. Evictable units
+    are removed in least recently used order, by access or modification time, until
+    the cache fits into the budget. Intraday loaders also write five-minute bars into
+    the five-minute database, so its bars of the days of evicted intraday partitions
+    are removed along with the partitions. Identical immutable files are deduplicated
+    by content hash with hard links. Compaction removes data of earlier cache
+    layouts and left-over temporary files, and vacuums the databases.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, budget_bytes: Optional[int] = None) -> None:
+        self._cache_dir = cache_dir
+        if budget_bytes is None:
+            budget_bytes = int(float(os.environ.get(_CACHE_BUDGET_ENV, _DEFAULT_BUDGET_GB)) * _BYTES_PER_GB)
+        self._budget_bytes = budget_bytes
+
+    def _get_category(self, rel_path: List[str]) -> str:
+        top = rel_path[0]
+        if len(rel_path) == 1 and os.path.isfile(os.path.join(self._cache_dir, top)):
+            return 'other'
+        if top == str(TimeInterval.DAY):
+            if len(rel_path) == 1:
+                return 'root'
+            if rel_path[1] == 'history':
+                return 'interday_history'
+            if rel_path[1] == 'snapshots':
+                return 'interday_snapshot'
+            if rel_path[1].endswith(_MUTABLE_SUFFIXES):
+                return 'database'
+            # Windows of daily bars written by earlier versions
+            return 'legacy'
+        if top in (str(TimeInterval.FIVE_MIN), str(TimeInterval.HOUR)):
+            if len(rel_path) == 1:
+                return 'root'
+            if rel_path[1].endswith(_MUTABLE_SUFFIXES):
+                return 'database'
+            return 'intraday'
+        if top == 'stock_universe':
+            return 'root' if len(rel_path) == 1 else 'stock_universe'
+        return 'other'
+
+    def _iter_unit_paths(self) -> Iterator[str]:
+        if not os.path.isdir(self._cache_dir):
+            return
+        for top in sorted(os.listdir(self._cache_dir)):
+            top_path = os.path.join(self._cache_dir, top)
+            if self._get_category([top]) != 'root':
+                yield top_path
+                continue
+            for name in sorted(os.listdir(top_path)):
+                path = os.path.join(top_path, name)
+                if self._get_category([top, name]) == 'interday_snapshot' and os.path.isdir(path):
+                    for snapshot in sorted(os.listdir(path)):
+                        yield os.path.join(path, snapshot)
+                else:
+                    yield path
+
+    def get_units(self) -> List[CacheUnit]:
+        units = []
+        for path in self._iter_unit_paths():
+            rel_path = os.path.relpath(path, self._cache_dir).split(os.sep)
+            category = self._get_category(rel_path)
+            num_files, num_bytes, num_own_bytes, last_access = 0, 0, 0, 0.0
+            for file in _walk_files(path):
+                try:
+                    stat = os.stat(file)
+                except FileNotFoundError:
+                    continue
+                num_files += 1
+                num_bytes += stat.st_size
+                if stat.st_nlink == 1:
+                    num_own_bytes += stat.st_size
+                last_access = max(last_access, stat.st_atime, stat.st_mtime)
+            evictable = category in ('interday_snapshot', 'intraday', 'stock_universe', 'legacy')
+            units.append(CacheUnit(path, category, num_files, num_bytes, num_own_bytes, last_access, evictable))
+        return units
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        """Gets number of units, files and bytes of each category. Shared content is counted once."""
+        stats = collections.defaultdict(lambda: {'units': 0, 'files': 0, 'bytes': 0})
+        seen = set()
+        for unit in self.get_units():
+            category_stats = stats[unit.category]
+            category_stats['units'] += 1
+            for file in _walk_files(unit.path):
+                try:
+                    stat = os.stat(file)
+                except FileNotFoundError:
+                    continue
+                category_stats['files'] += 1
+                if (stat.st_dev, stat.st_ino) not in seen:
+                    seen.add((stat.st_dev, stat.st_ino))
+                    category_stats['bytes'] += stat.st_size
+        return dict(stats)
+
+    def get_total_bytes(self) -> int:
+        return sum(category_stats['bytes'] for category_stats in self.get_stats().values())
+
+    def deduplicate(self) -> int:
+        """Replaces identical immutable files with hard links to one copy. Returns saved bytes."""
+        files_by_size = collections.defaultdict(list)
+        for unit in self.get_units():
+            if unit.category not in _IMMUTABLE_CATEGORIES:
+                continue
+            for file in _walk_files(unit.path):
+                if file.endswith(_MUTABLE_SUFFIXES) or file.endswith('.tmp'):
+                    continue
+                stat = os.stat(file)
+                if stat.st_size:
+                    files_by_size[stat.st_size].append((file, stat))
+        saved = 0
+        for size, files in files_by_size.items():
+            if len(files) < 2:
+                continue
+            originals = dict()
+            for file, stat in files:
+                key = _get_file_hash(file)
+                if key not in originals:
+                    originals[key] = (file, stat)
+                    continue
+                original, original_stat = originals[key]
+                if (stat.st_dev, stat.st_ino) == (original_stat.st_dev, original_stat.st_ino):
+                    continue
+                if stat.st_dev != original_stat.st_dev:
+                    continue
+                # Linked next to the file and swapped in, so readers never see it missing
+                link = file + f'.{os.getpid()}.link.tmp'
+                os.link(original, link)
+                os.replace(link, file)
+                if stat.st_nlink == 1:
+                    saved += size
+        return saved
+
+    def _convert_legacy_pickles(self, partition_dir: str) -> None:
+        pickle_files = [name for name in os.listdir(partition_dir)
+                        if name.startswith(_LEGACY_PICKLE_PREFIX) and name.endswith(_LEGACY_PICKLE_SUFFIX)]
+        if not pickle_files:
+            return
+        store = BarStore(partition_dir)
+        for name in pickle_files:
+            symbol = name[len(_LEGACY_PICKLE_PREFIX):-len(_LEGACY_PICKLE_SUFFIX)]
+            if symbol not in store:
+                store.put(symbol, pd.read_pickle(os.path.join(partition_dir, name)))
+        store.flush()
+        for name in pickle_files:
+            os.remove(os.path.join(partition_dir, name))
+
+    def compact(self) -> int:
+        """Rewrites cache into the current layout. Returns freed bytes."""
+        before = self.get_total_bytes()
+        now = time.time()
+        for unit in self.get_units():
+            if unit.category == 'legacy':
+                shutil.rmtree(unit.path, ignore_errors=True)
+            elif unit.category == 'intraday' and os.path.isdir(unit.path):
+                self._convert_legacy_pickles(unit.path)
+            elif unit.category == 'database' and unit.path.endswith('.db'):
+                _vacuum(unit.path)
+        for root, dirs, files in os.walk(self._cache_dir, topdown=False):
+            for file in files:
+                path = os.path.join(root, file)
+                # Temporary files of interrupted writes
+                if file.endswith('.tmp') and now - os.path.getmtime(path) > _MIN_IDLE_SECONDS:
+                    os.remove(path)
+            # Recently created directories may be about to be written
+            if (root != self._cache_dir and not os.listdir(root)
+                    and now - os.path.getmtime(root) > _MIN_IDLE_SECONDS):
+                os.rmdir(root)
+        return before - self.get_total_bytes()
+
+    def evict(self) -> int:
+        """Removes least recently used units until cache fits into the budget. Returns freed bytes."""
+        total_bytes = self.get_total_bytes()
+        freed = 0
+        now = time.time()
+        units = sorted((unit for unit in self.get_units() if unit.evictable), key=lambda unit: unit.last_access)
+        evicted_days = []
+        for unit in units:
+            if total_bytes - freed <= self._budget_bytes:
+                break
+            if now - unit.last_access < _MIN_IDLE_SECONDS:
+                continue
+            if os.path.isdir(unit.path):
+                shutil.rmtree(unit.path, ignore_errors=True)
+            else:
+                os.remove(unit.path)
+            freed += unit.num_own_bytes
+            day = self._get_intraday_day(unit)
+            if day is not None:
+                evicted_days.append(day)
+        if evicted_days:
+            freed += self._evict_intraday_db(evicted_days)
+        return freed
+
+    def _get_intraday_day(self, unit: CacheUnit) -> Optional[datetime.date]:
+        """Gets the day of a five-minute partition. Returns None for other units."""
+        rel_path = os.path.relpath(unit.path, self._cache_dir).split(os.sep)
+        if unit.category != 'intraday' or rel_path[0] != str(TimeInterval.FIVE_MIN):
+            return None
+        try:
+            return datetime.datetime.strptime(rel_path[1], '%Y-%m-%d').date()
+        except ValueError:
+            return None
+
+    def _evict_intraday_db(self, days: List[datetime.date]) -> int:
+        """Removes bars of days from the five-minute database. Returns freed bytes."""
+        db_file = os.path.join(self._cache_dir, str(TimeInterval.FIVE_MIN), 'data.db')
+        if not os.path.isfile(db_file):
+            return 0
+        before = os.path.getsize(db_file)
+        remove_days_from_db(db_file, days)
+        _vacuum(db_file)
+        return max(before - os.path.getsize(db_file), 0)
+
+    def run(self) -> Dict[str, int]:
+        """Compacts, deduplicates and evicts. Returns bytes freed by each step."""
+        return {'compacted': self.compact(),
+                'deduplicated': self.deduplicate(),
+                'evicted': self.evict()}
+
+
+def _vacuum(db_file: str) -> None:
+    conn = connect_db(db_file)
+    try:
+        conn.execute('VACUUM')
+    except sqlite3.OperationalError:
+        # The database is being written
+        pass
+    finally:
+        conn.close()
+
+
+def _format_bytes(num_bytes: int) -> str:
+    return f'{num_bytes / _BYTES_PER_GB:.2f} GB' if num_bytes >= _BYTES_PER_GB else f'{num_bytes / 1024 ** 2:.1f} MB'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Alpharius cache management.')
+    parser.add_argument('action', choices=['stats', 'compact', 'dedup', 'evict', 'run'],
+                        help='Action to take on the cache.')
+    parser.add_argument('--budget_gb', default=None, type=float,
+                        help=f'Disk budget of the cache. Defaults to ${_CACHE_BUDGET_ENV} or {_DEFAULT_BUDGET_GB}.')
+    args = parser.parse_args()
+    budget_bytes = int(args.budget_gb * _BYTES_PER_GB) if args.budget_gb is not None else None
+    manager = CacheManager(budget_bytes=budget_bytes)
+    if args.action == 'compact':
+        print(f'Compaction freed {_format_bytes(manager.compact())}')
+    elif args.action == 'dedup':
+        print(f'Deduplication saved {_format_bytes(manager.deduplicate())}')
+    elif args.action == 'evict':
+        print(f'Eviction freed {_format_bytes(manager.evict())}')
+    elif args.action == 'run':
+        for step, num_bytes in manager.run().items():
+            print(f'{step}: {_format_bytes(num_bytes)}')
+    stats = manager.get_stats()
+    rows = [[category, s['units'], s['files'], _format_bytes(s['bytes'])] for category, s in sorted(stats.items())]
+    rows.append(['total', sum(s['units'] for s in stats.values()), sum(s['files'] for s in stats.values()),
+                 _format_bytes(sum(s['bytes'] for s in stats.values()))])
+    print(tabulate.tabulate(rows, headers=['Category', 'Units', 'Files', 'Size'], tablefmt='grid'))
+
+
+if __name__ == '__main__':
+    main()
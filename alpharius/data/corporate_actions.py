@@ -0,0 +1,82 @@
+import datetime
+import json
+import os
+from typing import Optional
+
+import pandas as pd
+
+from alpharius.utils import get_today
+from .base import CACHE_DIR
+from .fmp_client import FmpClient
+from .utils import invalidate_bars
+
+_SPLITS_FILE = 'splits.json'
+_SPLIT_COLUMNS = ['Symbol', 'Date', 'Numerator', 'Denominator']
+# Bars cached before the first sync may predate splits up to this far back
+_INITIAL_SYNC_DAYS = 365
+# Splits are sometimes published after their dates
+_SYNC_OVERLAP_DAYS = 7
+# Maximum date range accepted by the splits calendar endpoint
+_MAX_REQUEST_DAYS = 90
+
+
+class SplitCalendar:
+    """Stock splits recorded in a local file.
+
+    Bars are adjusted for splits when they are loaded, so cached bars of a symbol
+    before its split date become stale once the split happens. Syncing records
+    splits published since the last sync, and invalidates only the cached bars of
+    newly split symbols before their split dates, which are loaded again with the
+    new adjustment. Dividends are not recorded since bars are not adjusted for them.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR) -> None:
+        self._splits_file = os.path.join(cache_dir, 'corporate_actions', _SPLITS_FILE)
+
+    def _read(self):
+        if not os.path.isfile(self._splits_file):
+            return None, pd.DataFrame([], columns=_SPLIT_COLUMNS)
+        with open(self._splits_file, 'r') as f:
+            content = json.load(f)
+        splits = pd.DataFrame(content['splits'], columns=_SPLIT_COLUMNS)
+        splits['Date'] = [pd.Timestamp(date).date() for date in splits['Date']]
+        return pd.Timestamp(content['synced_until']).date(), splits
+
+    def _write(self, synced_until: datetime.date, splits: pd.DataFrame) -> None:
+        os.makedirs(os.path.dirname(self._splits_file), exist_ok=True)
+        rows = [[symbol, str(date), numerator, denominator]
+                for symbol, date, numerator, denominator in splits[_SPLIT_COLUMNS].itertuples(index=False)]
+        tmp_file = self._splits_file + f'.{os.getpid()}.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump({'synced_until': str(synced_until), 'splits': rows}, f)
+        os.replace(tmp_file, self._splits_file)
+
+    def get_splits(self) -> pd.DataFrame:
+        """Gets recorded splits with Symbol, Date, Numerator and Denominator columns."""
+        return self._read()[1]
+
+    def sync(self, data_client: FmpClient, end_date: Optional[datetime.date] = None) -> pd.DataFrame:
+        """Records splits until end_date and invalidates cached bars they make stale.
+
+        Returns the newly recorded splits.
+        """
+        end_date = end_date or get_today().date()
+        synced_until, splits = self._read()
+        if synced_until is None:
+            start_date = end_date - datetime.timedelta(days=_INITIAL_SYNC_DAYS)
+        else:
+            start_date = synced_until - datetime.timedelta(days=_SYNC_OVERLAP_DAYS)
+        fetched = [splits]
+        while start_date <= end_date:
+            request_end_date = min(start_date + datetime.timedelta(days=_MAX_REQUEST_DAYS - 1), end_date)
+            fetched.append(data_client.get_splits(pd.Timestamp(start_date), pd.Timestamp(request_end_date)))
+            start_date = request_end_date + datetime.timedelta(days=1)
+        merged = pd.concat(fetched, ignore_index=True)
+        merged = merged[merged['Date'] <= end_date]
+        is_new = ~merged.duplicated(['Symbol', 'Date'])
+        new_splits = merged[is_new.to_numpy() & (merged.index >= len(splits))]
+        merged = merged[is_new]
+        # Bars before the latest split of a symbol are stale
+        invalidate_bars(new_splits.groupby('Symbol')['Date'].max().to_dict())
+        self._write(max(end_date, synced_until or end_date), merged)
+        return new_splits.reset_index(drop=True)
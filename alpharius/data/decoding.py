@@ -0,0 +1,38 @@
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from alpharius.utils import TIME_ZONE
+from .base import COLUMN_DTYPES, DATA_COLUMNS
+
+
+def decode_bars(rows: Iterable[Tuple],
+                start_time: Optional[pd.Timestamp] = None,
+                end_time: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+    """Decodes (time, open, high, low, close, volume) rows into a bar DataFrame.
+
+    Rows are transposed into columns in one pass and times are parsed as a whole.
+    Time can be ISO 8601 strings or datetime objects. Time without time zone
+    is regarded as New York time. If start_time and end_time are given, bars out
+    of the inclusive range are dropped. Returned bars are sorted by time.
+    """
+    columns = list(zip(*rows))
+    if not columns:
+        return pd.DataFrame({column: np.empty(0, dtype=dtype)
+                             for column, dtype in zip(DATA_COLUMNS, COLUMN_DTYPES)},
+                            index=pd.DatetimeIndex([], tz=TIME_ZONE))
+    times = columns[0]
+    index = pd.to_datetime(pd.Index(times), format='ISO8601' if isinstance(times[0], str) else None)
+    index = index.tz_localize(TIME_ZONE) if index.tz is None else index.tz_convert(TIME_ZONE)
+    timestamps = index.as_unit('ns').asi8
+    selected = np.ones(len(index), dtype=bool)
+    if start_time is not None:
+        selected &= timestamps >= start_time.as_unit('ns').value
+    if end_time is not None:
+        selected &= timestamps <= end_time.as_unit('ns').value
+    order = np.flatnonzero(selected)
+    order = order[np.argsort(timestamps[order], kind='stable')]
+    data = {column: np.asarray(values, dtype=dtype)[order]
+            for column, values, dtype in zip(DATA_COLUMNS, columns[1:], COLUMN_DTYPES)}
+    return pd.DataFrame(data, index=index[order])
@@ -1,53 +1,92 @@
-import collections
 import contextlib
+import io
+import math
+import operator
 import os
 import threading
-import time
 from datetime import timedelta
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
 import requests
 import retrying
 
-from alpharius.utils import TIME_ZONE
-from .base import DATA_COLUMNS, DataClient, TimeInterval
+from alpharius.utils import TIME_ZONE, get_current_time
+from .base import COLUMN_DTYPES, DATA_COLUMNS, DataClient, TimeInterval
+from .decoding import decode_bars
+from .rate_limiter import Priority, RateLimiter
 
 _FMP_API_KEY_ENV = 'FMP_API_KEY'
+# Overrides the API server, e.g. to run against a local replay server
+_FMP_BASE_URL_ENV = 'FMP_BASE_URL'
 _BASE_URL = 'https://financialmodelingprep.com/'
+# Maximum number of symbols accepted by the multi-symbol historical price endpoint
+_DAILY_BATCH_SIZE = 5
+_BAR_GETTER = operator.itemgetter('date', 'open', 'high', 'low', 'close', 'volume')
+_MAX_CALLS = 700
+_PERIOD = 60
+# Historical data endpoints leave part of the quota to quotes used by live trading
+_ENDPOINT_BUDGETS = {
+    'historical-chart': 600,
+    'historical-price-eod': 600,
+    'historical-price-full': 600,
+}
+# Clients in the same process with the same API key share one quota
+_rate_limiters: Dict[str, RateLimiter] = dict()
+_rate_limiters_lock = threading.Lock()
+
+
+def _get_rate_limiter(api_key: str) -> RateLimiter:
+    with _rate_limiters_lock:
+        if api_key not in _rate_limiters:
+            _rate_limiters[api_key] = RateLimiter(_MAX_CALLS, _PERIOD, budgets=_ENDPOINT_BUDGETS)
+        return _rate_limiters[api_key]
+
+
+def get_num_calls(num_symbols: int, time_interval: TimeInterval) -> int:
+    """Gets the number of calls of get_data_batch to load one range of bars of symbols."""
+    if time_interval == TimeInterval.DAY:
+        return math.ceil(num_symbols / _DAILY_BATCH_SIZE)
+    return num_symbols
+
+
+def get_call_rate(time_interval: TimeInterval) -> float:
+    """Gets the sustained number of data calls per second granted by the rate limiter.
+
+    Part of the quota is held back for bursts, so the sustained rate is lower than
+    the quota divided by its period.
+    """
+    endpoint = 'historical-price-full' if time_interval == TimeInterval.DAY else 'historical-chart'
+    return RateLimiter(_MAX_CALLS, _PERIOD, budgets=_ENDPOINT_BUDGETS).get_rate(endpoint)
+
+
+def _localize(t: pd.Timestamp) -> pd.Timestamp:
+    return t if t.tzinfo else t.tz_localize(TIME_ZONE)
 
 
 class FmpClient(DataClient):
 
-    def __init__(self, api_key: Optional[str] = None) -> None:
+    def __init__(self,
+                 api_key: Optional[str] = None,
+                 priority: Priority = Priority.BACKGROUND,
+                 base_url: Optional[str] = None) -> None:
         """Instantiates an FMP Data Client.
 
         Parameters:
             api_key: FMP API key.
+            priority: Priority of calls from this client under the shared quota.
+            base_url: Base URL of the API server.
         """
         self._api_key = api_key or os.environ[_FMP_API_KEY_ENV]
-        self._call_history = collections.deque()
-        self._max_calls = 700
-        self._period = 60
-        self._lock = threading.RLock()
-        self._now = pd.Timestamp.now().tz_localize(TIME_ZONE)
+        self._base_url = base_url or os.environ.get(_FMP_BASE_URL_ENV, _BASE_URL)
+        self._priority = priority
+        self._rate_limiter = _get_rate_limiter(self._api_key)
 
     @contextlib.contextmanager
-    def rate_limit(self):
-        def remove_queue():
-            while self._call_history and self._call_history[0] < time.time() - self._period:
-                self._call_history.popleft()
-
-        with self._lock:
-            remove_queue()
-            while len(self._call_history) >= self._max_calls:
-                wait_time = max(self._call_history[0] + 60 - time.time(), 0)
-                time.sleep(wait_time)
-                remove_queue()
-        yield
-        with self._lock:
-            self._call_history.append(time.time())
+    def rate_limit(self, endpoint: str):
+        with self._rate_limiter.acquire(endpoint, self._priority, flow=self):
+            yield
 
     @retrying.retry(stop_max_attempt_number=3,
                     wait_exponential_multiplier=500,
@@ -61,13 +100,23 @@ class FmpClient(DataClient):
 
         start_time and end_time are inclusive.
         """
-        if not start_time.tzinfo:
-            start_time = start_time.tz_localize(TIME_ZONE)
-        if not end_time.tzinfo:
-            end_time = end_time.tz_localize(TIME_ZONE)
-        url = _BASE_URL
+        start_time, end_time = _localize(start_time), _localize(end_time)
+        url, params, endpoint = self._get_data_request(symbol, start_time, end_time, time_interval)
+        with self.rate_limit(endpoint):
+            response = requests.get(url, params=params)
+            response.raise_for_status()
+        return self._parse_data(response.json(), start_time, end_time, time_interval)
+
+    def _get_data_request(self,
+                          symbol: str,
+                          start_time: pd.Timestamp,
+                          end_time: pd.Timestamp,
+                          time_interval: TimeInterval) -> Tuple[str, Dict[str, str], str]:
+        """Gets URL, parameters and rate limit endpoint of a data request."""
+        url = self._base_url
         if time_interval == TimeInterval.FIVE_MIN:
-            if self._now - start_time > timedelta(days=60):
+            # Clients are long-lived, so the age of the range is checked per request
+            if get_current_time() - start_time > timedelta(days=60):
                 url += f'api/v3/historical-chart/5min/{symbol}'
             else:
                 url += 'stable/historical-chart/5min'
@@ -80,36 +129,153 @@ class FmpClient(DataClient):
         start = start_time.strftime('%F')
         end = end_time.strftime('%F')
         params = {'symbol': symbol, 'from': start, 'to': end, 'apikey': self._api_key, 'extended': 'true'}
-        with self.rate_limit():
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-        response_json = response.json()
+        endpoint = 'historical-price-eod' if time_interval == TimeInterval.DAY else 'historical-chart'
+        return url, params, endpoint
+
+    def _parse_data(self,
+                    response_json: Any,
+                    start_time: pd.Timestamp,
+                    end_time: pd.Timestamp,
+                    time_interval: TimeInterval) -> pd.DataFrame:
         if isinstance(response_json, dict):
             raw_bars = response_json.get('historical', [])
         else:
             raw_bars = response_json
-        bars = []
-        for bar in raw_bars:
-            t = pd.Timestamp(bar['date']).tz_localize(TIME_ZONE)
-            if time_interval == time_interval.DAY or start_time <= t <= end_time:
-                bars.append(bar)
-        bars.sort(key=lambda b: b['date'])
-        index = pd.DatetimeIndex([pd.Timestamp(b['date']).tz_localize(TIME_ZONE) for b in bars])
-        data = [[np.float32(b['open']), np.float32(b['high']), np.float32(b['low']), np.float32(b['close']),
-                 np.uint32(b['volume'])] for b in bars]
-        return pd.DataFrame(data, index=index, columns=DATA_COLUMNS)
+        return self._to_dataframe(raw_bars, start_time, end_time, time_interval)
+
+    def get_data_batch(self,
+                       symbols: List[str],
+                       start_time: pd.Timestamp,
+                       end_time: pd.Timestamp,
+                       time_interval: TimeInterval) -> Dict[str, pd.DataFrame]:
+        """Loads data of multiple symbols with specified start and end time.
+
+        start_time and end_time are inclusive. Daily bars are loaded with the
+        multi-symbol historical price endpoint. Other intervals are loaded per symbol.
+        """
+        if time_interval != TimeInterval.DAY:
+            return super().get_data_batch(symbols, start_time, end_time, time_interval)
+        start_time, end_time = _localize(start_time), _localize(end_time)
+        res = {}
+        for i in range(0, len(symbols), _DAILY_BATCH_SIZE):
+            res.update(self._get_daily_batch(symbols[i:i + _DAILY_BATCH_SIZE], start_time, end_time))
+        return res
+
+    @retrying.retry(stop_max_attempt_number=3,
+                    wait_exponential_multiplier=500,
+                    retry_on_exception=lambda e: isinstance(e, requests.HTTPError))
+    def _get_daily_batch(self,
+                         symbols: List[str],
+                         start_time: pd.Timestamp,
+                         end_time: pd.Timestamp) -> Dict[str, pd.DataFrame]:
+        url, params = self._get_daily_batch_request(symbols, start_time, end_time)
+        with self.rate_limit('historical-price-full'):
+            response = requests.get(url, params=params)
+            response.raise_for_status()
+        return self._parse_daily_batch(response.json(), symbols, start_time, end_time)
+
+    def _get_daily_batch_request(self,
+                                 symbols: List[str],
+                                 start_time: pd.Timestamp,
+                                 end_time: pd.Timestamp) -> Tuple[str, Dict[str, str]]:
+        url = self._base_url + 'api/v3/historical-price-full/' + ','.join(symbols)
+        params = {'from': start_time.strftime('%F'), 'to': end_time.strftime('%F'), 'apikey': self._api_key}
+        return url, params
+
+    def _parse_daily_batch(self,
+                           response_json: Any,
+                           symbols: List[str],
+                           start_time: pd.Timestamp,
+                           end_time: pd.Timestamp) -> Dict[str, pd.DataFrame]:
+        # A single symbol is returned as a plain object instead of a list
+        if isinstance(response_json, dict) and 'historicalStockList' in response_json:
+            stock_list = response_json['historicalStockList']
+        elif isinstance(response_json, dict) and 'symbol' in response_json:
+            stock_list = [response_json]
+        else:
+            stock_list = []
+        raw_bars = {item['symbol']: item.get('historical', []) for item in stock_list}
+        return {symbol: self._to_dataframe(raw_bars.get(symbol, []), start_time, end_time, TimeInterval.DAY)
+                for symbol in symbols}
+
+    @staticmethod
+    def _to_dataframe(raw_bars: List[Dict],
+                      start_time: pd.Timestamp,
+                      end_time: pd.Timestamp,
+                      time_interval: TimeInterval) -> pd.DataFrame:
+        rows = map(_BAR_GETTER, raw_bars)
+        if time_interval == TimeInterval.DAY:
+            return decode_bars(rows)
+        return decode_bars(rows, start_time, end_time)
+
+    @retrying.retry(stop_max_attempt_number=3,
+                    wait_exponential_multiplier=500,
+                    retry_on_exception=lambda e: isinstance(e, requests.HTTPError))
+    def get_daily_bulk(self, day: pd.Timestamp) -> pd.DataFrame:
+        """Loads daily bars of all symbols on a day with one request.
+
+        Returns a DataFrame indexed by time with a Symbol column besides DATA_COLUMNS.
+        """
+        url = self._base_url + 'stable/eod-bulk'
+        params = {'date': day.strftime('%F'), 'apikey': self._api_key}
+        with self.rate_limit('eod-bulk'):
+            response = requests.get(url, params=params)
+            response.raise_for_status()
+        return self._parse_daily_bulk(response.text)
+
+    @staticmethod
+    def _parse_daily_bulk(text: str) -> pd.DataFrame:
+        raw = pd.read_csv(io.StringIO(text))
+        raw = raw[raw['close'].notna() & raw['symbol'].notna()]
+        index = pd.DatetimeIndex(pd.to_datetime(raw['date'])).tz_localize(TIME_ZONE)
+        data = {'Symbol': raw['symbol'].astype(str).to_numpy()}
+        for column, dtype in zip(DATA_COLUMNS, COLUMN_DTYPES):
+            data[column] = raw[column.lower()].fillna(0).to_numpy().astype(dtype)
+        return pd.DataFrame(data, index=index)
+
+    @retrying.retry(stop_max_attempt_number=3,
+                    wait_exponential_multiplier=500,
+                    retry_on_exception=lambda e: isinstance(e, requests.HTTPError))
+    def get_splits(self, start_date: pd.Timestamp, end_date: pd.Timestamp) -> pd.DataFrame:
+        """Loads stock splits with split dates from start_date to end_date, inclusive.
+
+        Returns a DataFrame with Symbol, Date, Numerator and Denominator columns. A split
+        of numerator for denominator multiplies the number of shares by numerator / denominator.
+        """
+        url = self._base_url + 'stable/splits-calendar'
+        params = {'from': start_date.strftime('%F'), 'to': end_date.strftime('%F'), 'apikey': self._api_key}
+        with self.rate_limit('splits-calendar'):
+            response = requests.get(url, params=params)
+            response.raise_for_status()
+        return self._parse_splits(response.json())
+
+    @staticmethod
+    def _parse_splits(response_json: Any) -> pd.DataFrame:
+        rows = [(item['symbol'], pd.Timestamp(item['date']).date(),
+                 float(item['numerator']), float(item['denominator']))
+                for item in response_json
+                if item.get('numerator') and item.get('denominator')]
+        return pd.DataFrame(rows, columns=['Symbol', 'Date', 'Numerator', 'Denominator'])
 
     @retrying.retry(stop_max_attempt_number=3,
                     wait_exponential_multiplier=500,
                     retry_on_exception=lambda e: isinstance(e, requests.HTTPError))
     def get_last_trades(self, symbols: List[str]) -> Dict[str, float]:
         """Gets the last trade prices of a list of symbols."""
-        url = _BASE_URL + 'stable/batch-quote-short'
-        params = {'symbols': ','.join(symbols), 'apikey': self._api_key}
-        with self.rate_limit():
+        url, params = self._get_last_trades_request(symbols)
+        with self.rate_limit('batch-quote-short'):
             response = requests.get(url, params=params)
             response.raise_for_status()
+        return self._parse_last_trades(response.json())
+
+    def _get_last_trades_request(self, symbols: List[str]) -> Tuple[str, Dict[str, str]]:
+        url = self._base_url + 'stable/batch-quote-short'
+        params = {'symbols': ','.join(symbols), 'apikey': self._api_key}
+        return url, params
+
+    @staticmethod
+    def _parse_last_trades(response_json: Any) -> Dict[str, float]:
         res = {}
-        for item in response.json():
+        for item in response_json:
             res[item['symbol']] = item['price']
         return res
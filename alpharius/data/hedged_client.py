@@ -0,0 +1,156 @@
+import collections
+import threading
+import time
+from concurrent import futures
+from typing import Callable, Dict, List, Tuple, TypeVar
+
+import numpy as np
+import pandas as pd
+
+from alpharius.utils import TIME_ZONE
+from .base import COLUMN_DTYPES, DATA_COLUMNS, DataClient, TimeInterval
+
+_T = TypeVar('_T')
+_LATENCY_QUANTILE = 0.9
+# Number of recent primary latencies used to estimate the quantile
+_LATENCY_WINDOW = 100
+_MIN_LATENCY_SAMPLES = 10
+# Hedge delay in seconds before enough latencies are observed
+_INITIAL_HEDGE_DELAY = 1.0
+_MIN_HEDGE_DELAY = 0.05
+_MAX_WORKERS = 8
+
+
+def _normalize(df: pd.DataFrame) -> pd.DataFrame:
+    """Converts bars from either source to DATA_COLUMNS with the same dtypes and time zone."""
+    df = df[DATA_COLUMNS].astype(dict(zip(DATA_COLUMNS, COLUMN_DTYPES)))
+    if getattr(df.index, 'tz', None) is not None:
+        df.index = df.index.tz_convert(TIME_ZONE)
+    return df
+
+
+class HedgedClient(DataClient):
+    """Data client sending latency-critical requests to a secondary source if the primary is slow.
+
+    A request is sent to the primary client first. If it does not finish within
+    the hedge delay, the same request is also sent to the secondary client and
+    the first successful response is used. A failed primary request is hedged
+    immediately. The hedge delay is the given quantile of recent latencies of
+    successful primary requests, so only the slow tail of requests is duplicated.
+    It counts from the start of the primary request, excluding its time in queue.
+    A primary request still queued when the secondary responds is cancelled.
+    """
+
+    def __init__(self,
+                 primary: DataClient,
+                 secondary: DataClient,
+                 quantile: float = _LATENCY_QUANTILE,
+                 initial_hedge_delay: float = _INITIAL_HEDGE_DELAY,
+                 max_workers: int = _MAX_WORKERS) -> None:
+        self._primary = primary
+        self._secondary = secondary
+        self._quantile = quantile
+        self._initial_hedge_delay = initial_hedge_delay
+        self._primary_pool = futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hedged-primary')
+        # Secondary requests do not queue behind primary requests of a batch
+        self._secondary_pool = futures.ThreadPoolExecutor(max_workers=max_workers,
+                                                          thread_name_prefix='hedged-secondary')
+        self._lock = threading.Lock()
+        # Method name -> recent latencies of the primary client
+        self._latencies: Dict[str, collections.deque] = collections.defaultdict(
+            lambda: collections.deque(maxlen=_LATENCY_WINDOW))
+        self.hedged = 0
+        self.secondary_wins = 0
+
+    def close(self) -> None:
+        self._primary_pool.shutdown(wait=False)
+        self._secondary_pool.shutdown(wait=False)
+
+    def get_hedge_delay(self, method: str) -> float:
+        with self._lock:
+            latencies = list(self._latencies[method])
+        if len(latencies) < _MIN_LATENCY_SAMPLES:
+            return self._initial_hedge_delay
+        return max(float(np.quantile(latencies, self._quantile)), _MIN_HEDGE_DELAY)
+
+    def _call_primary(self, method: str, call: Callable[[DataClient], _T]) -> _T:
+        """Calls the primary client and records the latency if it succeeds."""
+        start = time.monotonic()
+        result = call(self._primary)
+        latency = time.monotonic() - start
+        with self._lock:
+            self._latencies[method].append(latency)
+        return result
+
+    def _submit_primary(self,
+                        method: str,
+                        call: Callable[[DataClient], _T]) -> Tuple[futures.Future, threading.Event]:
+        """Submits a primary call. The returned event is set once the call starts."""
+        started = threading.Event()
+
+        def run() -> _T:
+            started.set()
+            return self._call_primary(method, call)
+
+        return self._primary_pool.submit(run), started
+
+    def _hedge(self, method: str, call: Callable[[DataClient], _T]) -> _T:
+        delay = self.get_hedge_delay(method)
+        primary_task, started = self._submit_primary(method, call)
+        # The delay counts from the start of the primary call. A call still queued
+        # after the delay is hedged, as it can't finish in time anyway.
+        if started.wait(timeout=delay):
+            try:
+                return primary_task.result(timeout=delay)
+            except futures.TimeoutError:
+                pass
+            except Exception:
+                # Hedged below and raised again if the secondary also fails
+                pass
+        with self._lock:
+            self.hedged += 1
+        secondary_task = self._secondary_pool.submit(call, self._secondary)
+        pending = {primary_task, secondary_task}
+        error = None
+        while pending:
+            done, pending = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    error = error or task.exception()
+                    continue
+                if task is secondary_task:
+                    # A primary call still queued would only use up quota
+                    primary_task.cancel()
+                    with self._lock:
+                        self.secondary_wins += 1
+                return task.result()
+        raise error
+
+    def get_data(self,
+                 symbol: str,
+                 start_time: pd.Timestamp,
+                 end_time: pd.Timestamp,
+                 time_interval: TimeInterval) -> pd.DataFrame:
+        """Loads data with specified start and end time.
+
+        start_time and end_time are inclusive.
+        """
+        return _normalize(self._hedge(
+            'get_data', lambda client: client.get_data(symbol, start_time, end_time, time_interval)))
+
+    def get_data_batch(self,
+                       symbols: List[str],
+                       start_time: pd.Timestamp,
+                       end_time: pd.Timestamp,
+                       time_interval: TimeInterval) -> Dict[str, pd.DataFrame]:
+        """Loads data of multiple symbols with specified start and end time.
+
+        start_time and end_time are inclusive. The batch is sent to the primary client
+        in one call, so that its requests are fanned out together.
+        """
+        res = self._hedge('get_data_batch',
+                          lambda client: client.get_data_batch(symbols, start_time, end_time, time_interval))
+        return {symbol: _normalize(df) for symbol, df in res.items()}
+
+    def get_last_trades(self, symbols: List[str]) -> Dict[str, float]:
+        return self._hedge('get_last_trades', lambda client: client.get_last_trades(symbols))
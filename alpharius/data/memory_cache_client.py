@@ -0,0 +1,120 @@
+import threading
+from typing import Dict, Hashable, List
+
+import cachetools
+import pandas as pd
+
+from alpharius.utils import TIME_ZONE, get_today
+from .base import DataClient, TimeInterval
+
+# 256 MiB
+_MAX_BYTES = 256 * 1024 * 1024
+# Bars before today do not change, except for corporate actions
+_HISTORICAL_TTL = 6 * 60 * 60
+# Bars of today grow while the market is open
+_TODAY_TTL = 60
+
+
+class MemoryCacheClient(DataClient):
+    """An in-process cache layer on top of another DataClient.
+
+    Bars are kept in an LRU cache bounded by the total bytes of the cached
+    DataFrames. Requests ending before today expire after historical_ttl
+    seconds and requests touching today expire after today_ttl seconds.
+    Last trades are always passed through. It can be stacked on top of
+    CacheClient or a network client, and shared by multiple threads.
+    """
+
+    def __init__(self,
+                 data_client: DataClient,
+                 max_bytes: int = _MAX_BYTES,
+                 historical_ttl: float = _HISTORICAL_TTL,
+                 today_ttl: float = _TODAY_TTL) -> None:
+        self._data_client = data_client
+        self._historical_ttl = historical_ttl
+        self._today_ttl = today_ttl
+        self._cache = cachetools.TLRUCache(maxsize=max_bytes,
+                                           ttu=self._get_expire_time,
+                                           getsizeof=self._get_size)
+        self._lock = threading.Lock()
+        self.cache_hit = 0
+        self.cache_miss = 0
+
+    @property
+    def current_bytes(self) -> int:
+        return int(self._cache.currsize)
+
+    def _get_expire_time(self, key: Hashable, value: pd.DataFrame, now: float) -> float:
+        end_time = key[2]
+        end_time = end_time if end_time.tzinfo else end_time.tz_localize(TIME_ZONE)
+        ttl = self._historical_ttl if end_time < get_today() else self._today_ttl
+        return now + ttl
+
+    @staticmethod
+    def _get_size(value: pd.DataFrame) -> int:
+        return int(value.memory_usage(index=True).sum())
+
+    def _get(self, key: Hashable):
+        with self._lock:
+            value = self._cache.get(key)
+            if value is None:
+                self.cache_miss += 1
+                return None
+            self.cache_hit += 1
+        return value.copy()
+
+    def _put(self, key: Hashable, value: pd.DataFrame) -> None:
+        with self._lock:
+            try:
+                self._cache[key] = value.copy()
+            except ValueError:
+                # Larger than the whole cache
+                pass
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def get_data(self,
+                 symbol: str,
+                 start_time: pd.Timestamp,
+                 end_time: pd.Timestamp,
+                 time_interval: TimeInterval) -> pd.DataFrame:
+        """Loads data with specified start and end time.
+
+        start_time and end_time are inclusive.
+        """
+        key = (symbol, start_time, end_time, time_interval)
+        df = self._get(key)
+        if df is None:
+            df = self._data_client.get_data(symbol, start_time, end_time, time_interval)
+            self._put(key, df)
+        return df
+
+    def get_data_batch(self,
+                       symbols: List[str],
+                       start_time: pd.Timestamp,
+                       end_time: pd.Timestamp,
+                       time_interval: TimeInterval) -> Dict[str, pd.DataFrame]:
+        """Loads data of multiple symbols with specified start and end time.
+
+        start_time and end_time are inclusive. Symbols missing in cache are
+        loaded from the underlying client with one batch call.
+        """
+        res = dict()
+        missing = []
+        for symbol in symbols:
+            df = self._get((symbol, start_time, end_time, time_interval))
+            if df is None:
+                missing.append(symbol)
+            else:
+                res[symbol] = df
+        if missing:
+            loaded = self._data_client.get_data_batch(missing, start_time, end_time, time_interval)
+            for symbol, df in loaded.items():
+                self._put((symbol, start_time, end_time, time_interval), df)
+            res.update(loaded)
+        return {symbol: res[symbol] for symbol in symbols if symbol in res}
+
+    def get_last_trades(self, symbols: List[str]) -> Dict[str, float]:
+        return self._data_client.get_last_trades(symbols)
@@ -0,0 +1,87 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from alpharius.utils import TIME_ZONE
+from .base import DATA_COLUMNS
+from .bar_store import BAR_DTYPE, to_records
+
+
+class InterdayPanel:
+    """Daily bars of many symbols aligned on a shared market calendar.
+
+    Bars are kept in one float32 array of shape (symbols, days, columns), where
+    columns follow DATA_COLUMNS and days are the union of days of all symbols.
+    Days without a bar of a symbol are NaN.
+    """
+
+    def __init__(self, symbols: List[str], times: np.ndarray, values: np.ndarray) -> None:
+        assert values.shape == (len(symbols), len(times), len(DATA_COLUMNS))
+        self._symbols = list(symbols)
+        self._rows = {symbol: i for i, symbol in enumerate(self._symbols)}
+        self._times = times
+        self._values = values
+        self._num_bars = None
+
+    @classmethod
+    def from_dataset(cls, dataset: Dict[str, pd.DataFrame]) -> 'InterdayPanel':
+        symbols = list(dataset.keys())
+        records = [to_records(dataset[symbol]) for symbol in symbols]
+        times = np.unique(np.concatenate([r['Time'] for r in records])) if records else np.empty(0, dtype=np.int64)
+        values = np.full((len(symbols), len(times), len(DATA_COLUMNS)), np.nan, dtype=np.float32)
+        for row, symbol_records in enumerate(records):
+            cols = np.searchsorted(times, symbol_records['Time'])
+            for k, column in enumerate(DATA_COLUMNS):
+                values[row, cols, k] = symbol_records[column]
+        return cls(symbols, times, values)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._rows
+
+    def __repr__(self) -> str:
+        # Used in stock universe cache keys, so it does not contain object ids
+        return f'InterdayPanel(symbols={len(self._symbols)}, days={len(self._times)})'
+
+    @property
+    def symbols(self) -> List[str]:
+        return self._symbols
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        return pd.to_datetime(self._times, unit='ns', utc=True).tz_convert(TIME_ZONE)
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._values
+
+    def get_row(self, symbol: str) -> Optional[int]:
+        return self._rows.get(symbol)
+
+    def get_day_index(self, day: pd.Timestamp) -> Optional[int]:
+        """Gets the index of a day on the calendar, or None if it is not a market day."""
+        if day.tzinfo is None:
+            day = day.tz_localize(TIME_ZONE)
+        t = day.as_unit('ns').value
+        ind = int(np.searchsorted(self._times, t))
+        if ind < len(self._times) and self._times[ind] == t:
+            return ind
+        return None
+
+    def get_column(self, column: str) -> np.ndarray:
+        """Gets a (symbols, days) view of one column."""
+        return self._values[:, :, DATA_COLUMNS.index(column)]
+
+    def get_num_bars(self) -> np.ndarray:
+        """Gets the number of bars of each symbol up to and including each day."""
+        if self._num_bars is None:
+            self._num_bars = np.cumsum(~np.isnan(self.get_column('Close')), axis=1, dtype=np.int32)
+        return self._num_bars
+
+    def get_frame(self, symbol: str) -> pd.DataFrame:
+        """Gets bars of a symbol as a DataFrame without the missing days."""
+        values = self._values[self._rows[symbol]]
+        mask = ~np.isnan(values[:, DATA_COLUMNS.index('Close')])
+        return pd.DataFrame({column: values[mask, k].astype(BAR_DTYPE[column])
+                             for k, column in enumerate(DATA_COLUMNS)},
+                            index=self.index[mask])
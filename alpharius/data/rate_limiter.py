@@ -0,0 +1,166 @@
+import asyncio
+import collections
+import contextlib
+import enum
+import threading
+import time
+from typing import AsyncIterator, Dict, Hashable, Iterator, Optional, Tuple
+
+
+class Priority(enum.IntEnum):
+    """Priority of API calls. Calls with a smaller value are granted first."""
+    REALTIME = 0
+    BACKGROUND = 1
+
+    def __str__(self):
+        return self.name
+
+
+class _Bucket:
+    """Token bucket allowing at most max_calls in any window of period seconds."""
+
+    def __init__(self, max_calls: int, period: float, burst: int) -> None:
+        assert 0 < burst < max_calls
+        self._capacity = burst
+        # Burst plus refills within a period never exceed max_calls
+        self._rate = (max_calls - burst) / period
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    def refill(self, now: float) -> None:
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def has_token(self) -> bool:
+        return self._tokens >= 1
+
+    def take(self) -> None:
+        self._tokens -= 1
+
+    def get_wait_time(self) -> float:
+        return max(1 - self._tokens, 0) / self._rate
+
+
+class _Ticket:
+
+    def __init__(self, endpoint: str) -> None:
+        self.endpoint = endpoint
+        self.granted = False
+
+
+class RateLimiter:
+    """Schedules API calls under a global quota and per-endpoint budgets.
+
+    A call reserves its tokens before it is sent, so concurrent calls never
+    overshoot the quota. Waiting calls are granted by priority first. Within
+    the same priority, flows such as different clients are served round-robin
+    and calls of the same flow are served in order, skipping calls whose endpoint
+    budget is used up. Waiting does not hold the lock, so other callers are not
+    blocked by one waiter.
+    """
+
+    def __init__(self,
+                 max_calls: int,
+                 period: float,
+                 burst: Optional[int] = None,
+                 budgets: Optional[Dict[str, int]] = None) -> None:
+        self._bucket = _Bucket(max_calls, period, burst or max(max_calls // 10, 1))
+        self._endpoint_buckets = {endpoint: _Bucket(budget, period, max(budget // 10, 1))
+                                  for endpoint, budget in (budgets or dict()).items()}
+        self._cond = threading.Condition()
+        # Priority -> flow -> waiting tickets of the flow
+        self._queues: Dict[Priority, 'collections.OrderedDict[Hashable, collections.deque]'] = {
+            priority: collections.OrderedDict() for priority in Priority}
+
+    def get_rate(self, endpoint: str) -> float:
+        """Gets the sustained number of calls per second that can be granted to an endpoint."""
+        endpoint_bucket = self._endpoint_buckets.get(endpoint)
+        if endpoint_bucket is None:
+            return self._bucket.rate
+        return min(self._bucket.rate, endpoint_bucket.rate)
+
+    @contextlib.contextmanager
+    def acquire(self,
+                endpoint: str,
+                priority: Priority = Priority.BACKGROUND,
+                flow: Optional[Hashable] = None) -> Iterator[None]:
+        ticket = _Ticket(endpoint)
+        with self._cond:
+            flows = self._queues[priority]
+            flows.setdefault(flow, collections.deque()).append(ticket)
+            while True:
+                wait_time = self._dispatch()
+                if ticket.granted:
+                    break
+                self._cond.wait(timeout=wait_time)
+        yield
+
+    @contextlib.asynccontextmanager
+    async def acquire_async(self,
+                            endpoint: str,
+                            priority: Priority = Priority.BACKGROUND,
+                            flow: Optional[Hashable] = None) -> AsyncIterator[None]:
+        """Same as acquire but waits without blocking the event loop."""
+        ticket = _Ticket(endpoint)
+        with self._cond:
+            flows = self._queues[priority]
+            flows.setdefault(flow, collections.deque()).append(ticket)
+        while True:
+            with self._cond:
+                wait_time = self._dispatch()
+                if ticket.granted:
+                    break
+            await asyncio.sleep(wait_time)
+        yield
+
+    def _dispatch(self) -> Optional[float]:
+        """Grants tokens to waiting tickets in order.
+
+        Returns the time until more tickets can be granted, or None if nothing waits.
+        """
+        now = time.monotonic()
+        self._bucket.refill(now)
+        for bucket in self._endpoint_buckets.values():
+            bucket.refill(now)
+        granted = False
+        wait_time = None
+        while self._bucket.has_token():
+            ticket, flows, flow = self._get_next_ticket()
+            if ticket is None:
+                break
+            ticket.granted = True
+            granted = True
+            self._bucket.take()
+            endpoint_bucket = self._endpoint_buckets.get(ticket.endpoint)
+            if endpoint_bucket is not None:
+                endpoint_bucket.take()
+            tickets = flows[flow]
+            tickets.remove(ticket)
+            if tickets:
+                flows.move_to_end(flow)
+            else:
+                del flows[flow]
+        if granted:
+            self._cond.notify_all()
+        if any(self._queues.values()):
+            if not self._bucket.has_token():
+                wait_time = self._bucket.get_wait_time()
+            else:
+                # Remaining tickets wait for their endpoint budgets
+                wait_time = min(bucket.get_wait_time() for bucket in self._endpoint_buckets.values()
+                                if not bucket.has_token())
+        return wait_time
+
+    def _get_next_ticket(self) -> Tuple[Optional[_Ticket], Optional[collections.OrderedDict], Hashable]:
+        for priority in Priority:
+            flows = self._queues[priority]
+            for flow, tickets in flows.items():
+                for ticket in tickets:
+                    endpoint_bucket = self._endpoint_buckets.get(ticket.endpoint)
+                    if endpoint_bucket is None or endpoint_bucket.has_token():
+                        return ticket, flows, flow
+        return None, None, None
@@ -0,0 +1,307 @@
+import argparse
+import collections
+import datetime
+import http.server
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+from urllib import parse
+
+import numpy as np
+import pandas as pd
+
+from alpharius.utils import TIME_ZONE
+from .bar_store import BarStore, merge_records, to_frame
+from .base import CACHE_DIR, DATA_COLUMNS, DataClient, TimeInterval, get_day_range
+
+_NANOS_PER_SECOND = 1000000000
+_BAR_SECONDS = {TimeInterval.FIVE_MIN: 300, TimeInterval.HOUR: 3600}
+_MARKET_OPEN = datetime.time(9, 30)
+_MARKET_CLOSE = datetime.time(16, 0)
+
+
+class SyntheticClient(DataClient):
+    """Generates deterministic bars of regular market hours on weekdays.
+
+    Prices are smooth functions of symbol and time, so the same request always
+    returns the same bars and consecutive requests are continuous.
+    """
+
+    def get_data(self,
+                 symbol: str,
+                 start_time: pd.Timestamp,
+                 end_time: pd.Timestamp,
+                 time_interval: TimeInterval) -> pd.DataFrame:
+        start_time = start_time if start_time.tzinfo else start_time.tz_localize(TIME_ZONE)
+        end_time = end_time if end_time.tzinfo else end_time.tz_localize(TIME_ZONE)
+        days = pd.date_range(start_time.date(), end_time.date(), freq='B')
+        if time_interval == TimeInterval.DAY:
+            index = days.tz_localize(TIME_ZONE)
+        elif time_interval in _BAR_SECONDS:
+            # Seconds of the day of bars starting in regular market hours
+            offsets = np.arange(_MARKET_OPEN.hour * 3600 + _MARKET_OPEN.minute * 60,
+                                _MARKET_CLOSE.hour * 3600 + _MARKET_CLOSE.minute * 60,
+                                _BAR_SECONDS[time_interval]).astype('timedelta64[s]')
+            times = days.to_numpy()[:, np.newaxis] + offsets[np.newaxis, :]
+            index = pd.DatetimeIndex(times.ravel()).tz_localize(TIME_ZONE)
+        else:
+            raise ValueError(f'time_interval {time_interval} not supported')
+        index = index[(index >= start_time) & (index <= end_time)]
+        return self._get_bars(symbol, index)
+
+    @staticmethod
+    def _get_bars(symbol: str, index: pd.DatetimeIndex) -> pd.DataFrame:
+        seconds = index.as_unit('ns').asi8 / _NANOS_PER_SECOND
+        base = 20 + zlib.crc32(symbol.encode()) % 480
+        close = base * (1 + 0.2 * np.sin(seconds / (86400 * 30)) + 0.01 * np.sin(seconds / 3600))
+        open_ = close * (1 + 0.002 * np.sin(seconds / 1000))
+        data = {
+            'Open': open_.astype(np.float32),
+            'High': (np.maximum(open_, close) * 1.003).astype(np.float32),
+            'Low': (np.minimum(open_, close) * 0.997).astype(np.float32),
+            'Close': close.astype(np.float32),
+            'Volume': (1000 + (seconds // 300) % 5000).astype(np.uint32),
+        }
+        return pd.DataFrame(data, index=index, columns=DATA_COLUMNS)
+
+    def get_last_trades(self, symbols: List[str]) -> Dict[str, float]:
+        index = pd.DatetimeIndex([pd.Timestamp.now(tz=TIME_ZONE)])
+        return {symbol: float(self._get_bars(symbol, index)['Close'].iloc[0]) for symbol in symbols}
+
+
+class RecordedClient(DataClient):
+    """Serves bars previously recorded in the local bar stores.
+
+    Daily bars are read from the interday history and five-minute bars from
+    the intraday partitions of each day. Missing bars are returned as empty.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR) -> None:
+        self._cache_dir = cache_dir
+        self._stores: Dict[str, BarStore] = dict()
+        self._lock = threading.Lock()
+
+    def _get_store(self, partition_dir: str) -> Optional[BarStore]:
+        with self._lock:
+            if partition_dir not in self._stores:
+                self._stores[partition_dir] = BarStore(partition_dir) if os.path.isdir(partition_dir) else None
+            return self._stores[partition_dir]
+
+    def _get_partitions(self,
+                        start_time: pd.Timestamp,
+                        end_time: pd.Timestamp,
+                        time_interval: TimeInterval) -> List[str]:
+        if time_interval == TimeInterval.DAY:
+            return [os.path.join(self._cache_dir, str(TimeInterval.DAY), 'history')]
+        if time_interval == TimeInterval.FIVE_MIN:
+            return [os.path.join(self._cache_dir, str(TimeInterval.FIVE_MIN), day.strftime('%F'))
+                    for day in pd.date_range(start_time.date(), end_time.date(), freq='B')]
+        return []
+
+    def get_data(self,
+                 symbol: str,
+                 start_time: pd.Timestamp,
+                 end_time: pd.Timestamp,
+                 time_interval: TimeInterval) -> pd.DataFrame:
+        start_time = start_time if start_time.tzinfo else start_time.tz_localize(TIME_ZONE)
+        end_time = end_time if end_time.tzinfo else end_time.tz_localize(TIME_ZONE)
+        records = None
+        for partition_dir in self._get_partitions(start_time, end_time, time_interval):
+            store = self._get_store(partition_dir)
+            if store is not None and symbol in store:
+                new_records = store.get_records(symbol)
+                records = new_records if records is None else merge_records(records, new_records)
+        if records is None:
+            return pd.DataFrame([], columns=DATA_COLUMNS)
+        times = records['Time']
+        selected = (times >= start_time.as_unit('ns').value) & (times <= end_time.as_unit('ns').value)
+        return to_frame(records[selected])
+
+    def get_last_trades(self, symbols: List[str]) -> Dict[str, float]:
+        res = dict()
+        history = self._get_store(os.path.join(self._cache_dir, str(TimeInterval.DAY), 'history'))
+        for symbol in symbols:
+            if history is not None and symbol in history and len(history.get_records(symbol)):
+                res[symbol] = float(history.get_records(symbol)['Close'][-1])
+        return res
+
+
+def _to_json_bars(df: pd.DataFrame, time_interval: TimeInterval) -> List[Dict[str, Any]]:
+    if not len(df):
+        return []
+    time_format = '%F' if time_interval == TimeInterval.DAY else '%F %H:%M:%S'
+    times = pd.DatetimeIndex(df.index).strftime(time_format)
+    columns = [df[column].tolist() for column in DATA_COLUMNS]
+    bars = [{'date': t, 'open': o, 'high': h, 'low': l, 'close': c, 'volume': v}
+            for t, o, h, l, c, v in zip(times, *columns)]
+    # FMP returns the latest bar first
+    bars.reverse()
+    return bars
+
+
+class ReplayServer:
+    """Local HTTP server speaking the subset of FMP endpoints used by FmpClient.
+
+    Responses are served from a DataClient, such as SyntheticClient or
+    RecordedClient. Each request can be delayed by latency plus uniform jitter
+    in seconds, rejected with status 429 beyond max_calls in any window of
+    period seconds, and failed with status 500 at error_rate. Point FmpClient
+    at the server with its base_url parameter or the FMP_BASE_URL environment
+    variable.
+    """
+
+    def __init__(self,
+                 data_client: DataClient,
+                 host: str = '127.0.0.1',
+                 port: int = 0,
+                 latency: float = 0,
+                 jitter: float = 0,
+                 max_calls: Optional[int] = None,
+                 period: float = 60,
+                 error_rate: float = 0,
+                 seed: Optional[int] = None) -> None:
+        self._data_client = data_client
+        self._latency = latency
+        self._jitter = jitter
+        self._max_calls = max_calls
+        self._period = period
+        self._error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._call_times = collections.deque()
+        self.stats = collections.Counter()
+        self._server = http.server.ThreadingHTTPServer((host, port), _make_handler(self))
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/'
+
+    def start(self) -> None:
+        """Serves requests in a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever, name='replay-server', daemon=True)
+        self._thread.start()
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _admit(self) -> Tuple[int, Optional[str]]:
+        """Applies the rate limit and error injection. Returns status and error message."""
+        with self._lock:
+            self.stats['requests'] += 1
+            if self._max_calls is not None:
+                now = time.monotonic()
+                while self._call_times and self._call_times[0] <= now - self._period:
+                    self._call_times.popleft()
+                if len(self._call_times) >= self._max_calls:
+                    self.stats['rate_limited'] += 1
+                    return 429, 'Limit Reach'
+                self._call_times.append(now)
+            if self._random.random() < self._error_rate:
+                self.stats['errors'] += 1
+                return 500, 'Injected error'
+            delay = max(self._latency + self._random.uniform(-self._jitter, self._jitter), 0)
+        time.sleep(delay)
+        return 200, None
+
+    def handle(self, path: str) -> Tuple[int, Any]:
+        status, error = self._admit()
+        if error:
+            return status, {'Error Message': error}
+        url = parse.urlparse(path)
+        params = {key: values[0] for key, values in parse.parse_qs(url.query).items()}
+        parts = url.path.strip('/').split('/')
+        if url.path.startswith('/stable/batch-quote-short'):
+            symbols = params.get('symbols', '').split(',')
+            prices = self._data_client.get_last_trades(symbols)
+            return 200, [{'symbol': symbol, 'price': price, 'change': 0, 'volume': 0}
+                         for symbol, price in prices.items()]
+        start_time, _ = get_day_range(pd.Timestamp(params['from']))
+        _, end_time = get_day_range(pd.Timestamp(params['to']))
+        if url.path.startswith('/api/v3/historical-price-full/'):
+            symbols = parts[-1].split(',')
+            dfs = self._data_client.get_data_batch(symbols, start_time, end_time, TimeInterval.DAY)
+            stock_list = [{'symbol': symbol, 'historical': _to_json_bars(dfs[symbol], TimeInterval.DAY)}
+                          for symbol in symbols if symbol in dfs and len(dfs[symbol])]
+            if len(stock_list) == 1:
+                return 200, stock_list[0]
+            return 200, {'historicalStockList': stock_list}
+        if url.path.startswith('/api/v3/historical-chart/5min/'):
+            symbol, time_interval = parts[-1], TimeInterval.FIVE_MIN
+        elif url.path.startswith('/stable/historical-chart/5min'):
+            symbol, time_interval = params['symbol'], TimeInterval.FIVE_MIN
+        elif url.path.startswith('/stable/historical-chart/1hour'):
+            symbol, time_interval = params['symbol'], TimeInterval.HOUR
+        elif url.path.startswith('/stable/historical-price-eod/full'):
+            symbol, time_interval = params['symbol'], TimeInterval.DAY
+        else:
+            return 404, {'Error Message': f'Unknown endpoint {url.path}'}
+        df = self._data_client.get_data(symbol, start_time, end_time, time_interval)
+        bars = _to_json_bars(df, time_interval)
+        if time_interval == TimeInterval.DAY:
+            for bar in bars:
+                bar['symbol'] = symbol
+        return 200, bars
+
+
+def _make_handler(replay_server: ReplayServer):
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            try:
+                status, body = replay_server.handle(self.path)
+            except (KeyError, ValueError) as e:
+                status, body = 400, {'Error Message': str(e)}
+            except Exception as e:
+                # Keep the connection, so that clients see a server error like from FMP
+                status, body = 500, {'Error Message': f'{type(e).__name__}: {e}'}
+            content = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local FMP replay server for load and latency testing.')
+    parser.add_argument('--host', default='127.0.0.1', help='Host to bind.')
+    parser.add_argument('--port', default=8765, type=int, help='Port to bind.')
+    parser.add_argument('--source', default='synthetic', choices=['synthetic', 'recorded'],
+                        help='Serve synthetic bars or bars recorded in the local cache.')
+    parser.add_argument('--latency', default=0, type=float, help='Latency of each request in seconds.')
+    parser.add_argument('--jitter', default=0, type=float, help='Uniform jitter of latency in seconds.')
+    parser.add_argument('--max_calls', default=None, type=int,
+                        help='Maximum number of requests per period. Exceeding requests get status 429.')
+    parser.add_argument('--period', default=60, type=float, help='Rate limit period in seconds.')
+    parser.add_argument('--error_rate', default=0, type=float, help='Fraction of requests failing with status 500.')
+    parser.add_argument('--seed', default=None, type=int, help='Random seed of jitter and errors.')
+    args = parser.parse_args()
+    data_client = SyntheticClient() if args.source == 'synthetic' else RecordedClient()
+    server = ReplayServer(data_client, host=args.host, port=args.port, latency=args.latency,
+                          jitter=args.jitter, max_calls=args.max_calls, period=args.period,
+                          error_rate=args.error_rate, seed=args.seed)
+    print(f'Serving on {server.url}. Set FMP_BASE_URL={server.url} to use it.')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
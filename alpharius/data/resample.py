@@ -0,0 +1,37 @@
+import pandas as pd
+
+from .base import COLUMN_DTYPES, DATA_COLUMNS, TimeInterval
+
+# Regular session in minutes of the day in New York time
+_SESSION_START_MINUTE = 9 * 60 + 30
+_SESSION_END_MINUTE = 16 * 60
+_AGGREGATIONS = {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Volume': 'sum'}
+
+
+def resample_bars(df: pd.DataFrame,
+                  time_interval: TimeInterval,
+                  extended_hours: bool = False) -> pd.DataFrame:
+    """Aggregates five-minute bars into hourly or daily bars.
+
+    Only bars of the regular session are used unless extended_hours is set.
+    Hourly bars start at half past each hour, aligned with the session open.
+    Daily bars are indexed at 00:00 of each day, same as daily bars from vendors.
+    """
+    if time_interval == TimeInterval.FIVE_MIN or not len(df):
+        return df
+    index = pd.DatetimeIndex(df.index)
+    if not extended_hours:
+        minutes = index.hour * 60 + index.minute
+        selected = (minutes >= _SESSION_START_MINUTE) & (minutes < _SESSION_END_MINUTE)
+        df, index = df[selected], index[selected]
+    if time_interval == TimeInterval.DAY:
+        keys = index.normalize()
+    elif time_interval == TimeInterval.HOUR:
+        half_hour = pd.Timedelta(minutes=30)
+        keys = (index - half_hour).floor('h') + half_hour
+    else:
+        raise ValueError(f'time_interval {time_interval} not supported')
+    res = df[DATA_COLUMNS].groupby(keys, sort=True).agg(_AGGREGATIONS)
+    res = res.astype(dict(zip(DATA_COLUMNS, COLUMN_DTYPES)))
+    res.index = pd.DatetimeIndex(res.index)
+    return res
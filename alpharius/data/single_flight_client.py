@@ -0,0 +1,102 @@
+import threading
+from concurrent import futures
+from typing import Callable, Dict, Hashable, List, Tuple, TypeVar
+
+import pandas as pd
+
+from .base import DATA_COLUMNS, DataClient, TimeInterval
+
+_T = TypeVar('_T')
+
+
+class SingleFlightClient(DataClient):
+    """Data client letting identical concurrent requests share one underlying call.
+
+    The first caller of a request makes the call. Callers arriving while it is in
+    flight wait for its result instead of calling again, and receive copies so
+    that they can modify their DataFrames independently. Batch requests are
+    split per symbol, so they also join in-flight single-symbol requests.
+    """
+
+    def __init__(self, data_client: DataClient) -> None:
+        self._data_client = data_client
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, futures.Future] = dict()
+
+    def _join_or_lead(self, keys: List[Hashable]) -> Tuple[Dict[Hashable, futures.Future],
+                                                           Dict[Hashable, futures.Future]]:
+        """Returns in-flight futures of keys. Futures of keys led by the caller are created."""
+        joined, led = dict(), dict()
+        with self._lock:
+            for key in keys:
+                if key in self._flights:
+                    joined[key] = self._flights[key]
+                else:
+                    led[key] = self._flights[key] = futures.Future()
+        return joined, led
+
+    def _land(self, led: Dict[Hashable, futures.Future]) -> None:
+        with self._lock:
+            for key in led:
+                self._flights.pop(key, None)
+
+    def _do(self, key: Hashable, func: Callable[[], _T], copy: Callable[[_T], _T]) -> _T:
+        joined, led = self._join_or_lead([key])
+        if joined:
+            return copy(joined[key].result())
+        try:
+            result = func()
+            led[key].set_result(result)
+            return result
+        except BaseException as e:
+            led[key].set_exception(e)
+            raise
+        finally:
+            self._land(led)
+
+    @staticmethod
+    def _get_data_key(symbol: str,
+                      start_time: pd.Timestamp,
+                      end_time: pd.Timestamp,
+                      time_interval: TimeInterval) -> Hashable:
+        return 'data', symbol, start_time, end_time, time_interval
+
+    def get_data(self,
+                 symbol: str,
+                 start_time: pd.Timestamp,
+                 end_time: pd.Timestamp,
+                 time_interval: TimeInterval) -> pd.DataFrame:
+        return self._do(self._get_data_key(symbol, start_time, end_time, time_interval),
+                        lambda: self._data_client.get_data(symbol, start_time, end_time, time_interval),
+                        lambda df: df.copy())
+
+    def get_data_batch(self,
+                       symbols: List[str],
+                       start_time: pd.Timestamp,
+                       end_time: pd.Timestamp,
+                       time_interval: TimeInterval) -> Dict[str, pd.DataFrame]:
+        keys = {symbol: self._get_data_key(symbol, start_time, end_time, time_interval) for symbol in symbols}
+        joined, led = self._join_or_lead(list(keys.values()))
+        res = dict()
+        if led:
+            led_symbols = [symbol for symbol in symbols if keys[symbol] in led]
+            try:
+                res = self._data_client.get_data_batch(led_symbols, start_time, end_time, time_interval)
+                for symbol in led_symbols:
+                    led[keys[symbol]].set_result(res.get(symbol, pd.DataFrame([], columns=DATA_COLUMNS)))
+            except BaseException as e:
+                for future in led.values():
+                    if not future.done():
+                        future.set_exception(e)
+                raise
+            finally:
+                self._land(led)
+        for symbol in symbols:
+            if keys[symbol] in joined:
+                res[symbol] = joined[keys[symbol]].result().copy()
+        return {symbol: res[symbol] for symbol in symbols if symbol in res}
+
+    def get_last_trades(self, symbols: List[str]) -> Dict[str, float]:
+        return self._do(('last_trades',) + tuple(sorted(symbols)),
+                        lambda: self._data_client.get_last_trades(symbols),
+                        dict)
@@ -1,87 +1,497 @@
+import collections
 import datetime
 import functools
+import math
 import os
+import shutil
 import sys
+import threading
 from concurrent import futures
-from typing import Dict, Callable, Iterable, List, Optional
+from typing import Dict, Callable, Iterable, List, Optional, Tuple
 
 import alpaca.trading as trading
 import cachetools
+import numpy as np
 import pandas as pd
 import retrying
 from tqdm import tqdm
 
-from alpharius.utils import Transaction, TIME_ZONE, hash_str, get_trading_client
-from .base import DataClient, CACHE_DIR, TimeInterval
+from alpharius.utils import Transaction, TIME_ZONE, hash_str, get_current_time, get_today, get_trading_client
+from .alpaca_client import AlpacaClient
+from .bar_store import BarStore, merge_records, to_frame, to_records
+from .async_fmp_client import AsyncFmpClient
+from .base import DataClient, DataError, CACHE_DIR, DATA_COLUMNS, TimeInterval, get_day_range
+from .cache_client import CacheClient, invalidate_db
 from .fmp_client import FmpClient
+from .hedged_client import HedgedClient
+from .panel import InterdayPanel
+from .rate_limiter import Priority
+from .single_flight_client import SingleFlightClient
 
 _MAX_WORKERS = 10
+_BATCH_SIZE = 50
+_MAX_SNAPSHOTS = 4
+# Maximum number of market days in one intraday range request
+_INTRADAY_RANGE_DAYS = 10
+_MARKET_CLOSE = datetime.time(16, 0)
 _interday_dataset_cache = cachetools.LRUCache(maxsize=2)
+_interday_panel_cache = cachetools.LRUCache(maxsize=2)
+_default_data_clients: Dict[Tuple[int, Priority], DataClient] = dict()
+_default_data_clients_lock = threading.Lock()
+
+
+def _fetch_batches(symbols: List[str],
+                   load_func: Callable[[List[str]], Dict[str, pd.DataFrame]],
+                   show_progress: bool = False,
+                   pool: Optional[futures.Executor] = None) -> Dict[str, pd.DataFrame]:
+    if pool is None:
+        with futures.ThreadPoolExecutor(max_workers=_MAX_WORKERS) as pool:
+            return _fetch_batches(symbols, load_func, show_progress, pool)
+    # Keep batches small enough so that all workers are utilized
+    batch_size = max(min(_BATCH_SIZE, math.ceil(len(symbols) / _MAX_WORKERS)), 1)
+    res = {}
+    tasks = []
+    for i in range(0, len(symbols), batch_size):
+        batch = symbols[i:i + batch_size]
+        tasks.append((batch, pool.submit(load_func, batch)))
+    iterator = tqdm(tasks, ncols=80) if show_progress and sys.stdout.isatty() else tasks
+    for batch, t in iterator:
+        batch_result = t.result()
+        for symbol in batch:
+            res[symbol] = batch_result.get(symbol, pd.DataFrame([], columns=DATA_COLUMNS))
+    return res
 
 
 @retrying.retry(stop_max_attempt_number=2,
                 wait_exponential_multiplier=500,
                 retry_on_exception=lambda e: isinstance(e, IOError))
-def _load_cached_symbol(symbol: str,
-                        cache_dir: str,
-                        load_func: Callable[[str], pd.DataFrame]) -> pd.DataFrame:
-    cache_file = os.path.join(cache_dir, f'history_{symbol}.pickle')
-    if os.path.isfile(cache_file):
-        hist = pd.read_pickle(cache_file)
-    else:
-        hist = load_func(symbol)
-        hist.to_pickle(cache_file)
-    return hist
+def _read_legacy_file(legacy_file: str) -> pd.DataFrame:
+    return pd.read_pickle(legacy_file)
+
+
+def _load_dataset(symbols: Iterable[str],
+                  cache_dir: str,
+                  load_func: Callable[[List[str]], Dict[str, pd.DataFrame]],
+                  pool: Optional[futures.Executor] = None) -> Dict[str, pd.DataFrame]:
+    store = BarStore(cache_dir)
+    symbols = list(symbols)
+    missing_symbols = []
+    for symbol in symbols:
+        if symbol in store:
+            continue
+        # Pickle files are written by earlier versions of the cache
+        legacy_file = os.path.join(cache_dir, f'history_{symbol}.pickle')
+        if os.path.isfile(legacy_file):
+            store.put(symbol, _read_legacy_file(legacy_file))
+        else:
+            missing_symbols.append(symbol)
+    for symbol, df in _fetch_batches(missing_symbols, load_func, pool=pool).items():
+        store.put(symbol, df)
+    store.flush()
+    return {symbol: store.get(symbol) for symbol in symbols}
+
+
+def _get_history_gaps(coverage: Optional[Tuple[datetime.date, datetime.date]],
+                      start_date: datetime.date,
+                      end_date: datetime.date) -> List[Tuple[datetime.date, datetime.date]]:
+    if coverage is None:
+        return [(start_date, end_date)]
+    gaps = []
+    first_date, last_date = coverage
+    if start_date < first_date:
+        gaps.append((start_date, first_date - datetime.timedelta(days=1)))
+    if end_date > last_date:
+        gaps.append((last_date + datetime.timedelta(days=1), end_date))
+    return gaps
+
 
+def _get_last_loadable_date() -> datetime.date:
+    """Gets the last date with daily bars available, which is today after the market closes."""
+    today = get_today().date()
+    return today if get_current_time().time() >= _MARKET_CLOSE else today - datetime.timedelta(days=1)
+
+
+def _clip_coverage(coverage: Optional[Tuple[datetime.date, datetime.date]],
+                   start_date: datetime.date,
+                   end_date: datetime.date) -> Optional[Tuple[datetime.date, datetime.date]]:
+    if coverage is None or coverage[0] > end_date or coverage[1] < start_date:
+        return None
+    return max(coverage[0], start_date), min(coverage[1], end_date)
+
+
+def _plan_history(store: BarStore,
+                  symbols: Iterable[str],
+                  start_time: pd.Timestamp,
+                  end_time: pd.Timestamp) -> Dict[Tuple[Tuple[datetime.date, datetime.date], ...], List[str]]:
+    """Groups symbols by the date ranges missing in their stored daily histories.
+
+    Today's bars are not loaded before the market closes.
+    """
+    start_date, end_date = start_time.date(), min(end_time.date(), _get_last_loadable_date())
+    plans = collections.defaultdict(list)
+    if start_date > end_date:
+        return plans
+    for symbol in symbols:
+        gaps = _get_history_gaps(store.get_coverage(symbol), start_date, end_date)
+        if gaps:
+            plans[tuple(gaps)].append(symbol)
+    return plans
+
+
+def _update_history(store: BarStore,
+                    symbols: List[str],
+                    start_time: pd.Timestamp,
+                    end_time: pd.Timestamp,
+                    data_client: DataClient) -> None:
+    """Extends the stored daily histories of symbols to cover start_time to end_time.
+
+    Only the days before the first or after the last covered day are loaded. Today's
+    bars are never marked as covered, and are not loaded before the market closes.
+    """
+    last_complete_date = get_today().date() - datetime.timedelta(days=1)
+    plans = _plan_history(store, symbols, start_time, end_time)
+    for gaps, plan_symbols in plans.items():
+        for gap_start_date, gap_end_date in gaps:
+            load_func = functools.partial(data_client.get_data_batch,
+                                          start_time=get_day_range(gap_start_date)[0],
+                                          end_time=get_day_range(gap_end_date)[1],
+                                          time_interval=TimeInterval.DAY)
+            dfs = _fetch_batches(plan_symbols, load_func, show_progress=True)
+            covered_end_date = min(gap_end_date, last_complete_date)
+            for symbol in plan_symbols:
+                records = to_records(dfs[symbol])
+                coverage = store.get_coverage(symbol)
+                if symbol in store:
+                    records = merge_records(store.get_records(symbol), records)
+                if covered_end_date >= gap_start_date:
+                    first_date = min(coverage[0], gap_start_date) if coverage else gap_start_date
+                    last_date = max(coverage[1], covered_end_date) if coverage else covered_end_date
+                    coverage = (first_date, last_date)
+                store.put_records(symbol, records, coverage)
+    store.flush()
 
-def get_default_data_client():
-    return FmpClient()
+
+def _get_history_store() -> BarStore:
+    return BarStore(os.path.join(CACHE_DIR, str(TimeInterval.DAY), 'history'))
+
+
+def plan_interday_history(symbols: Iterable[str],
+                          start_time: pd.Timestamp,
+                          end_time: pd.Timestamp) -> Dict[Tuple[Tuple[datetime.date, datetime.date], ...], List[str]]:
+    """Groups symbols by the date ranges missing in the stored daily histories.
+
+    Symbols with the same missing ranges are loaded together.
+    """
+    return _plan_history(_get_history_store(), symbols, start_time, end_time)
+
+
+def update_interday_history(symbols: Iterable[str],
+                            start_time: pd.Timestamp,
+                            end_time: pd.Timestamp,
+                            data_client: DataClient,
+                            chunk_size: Optional[int] = None) -> None:
+    """Extends the stored daily histories of symbols to cover start_time to end_time.
+
+    If chunk_size is given, histories are persisted after each chunk of symbols,
+    so that an interrupted update keeps the completed chunks.
+    """
+    symbols = list(symbols)
+    chunk_size = chunk_size or max(len(symbols), 1)
+    history = _get_history_store()
+    for i in range(0, len(symbols), chunk_size):
+        _update_history(history, symbols[i:i + chunk_size], start_time, end_time, data_client)
+
+
+def ingest_interday_bulk(day: pd.Timestamp, prev_day: pd.Timestamp, data_client: FmpClient) -> int:
+    """Appends daily bars of a market day to the stored daily histories.
+
+    Bars of all symbols are loaded with one bulk request instead of one request per
+    symbol. Histories covering the previous market day and having a bar of the day
+    in the response are extended to cover the day, so that later loads up to the day
+    are served from local data. Other histories are left to be extended by the next
+    load. Returns the number of extended histories.
+
+    Raises DataError if the response has no bars of the day, e.g. when the vendor
+    has not published them yet.
+    """
+    bars = data_client.get_daily_bulk(day)
+    bars = bars[pd.DatetimeIndex(bars.index).date == day.date()]
+    if not len(bars):
+        raise DataError(f'No daily bars of [{day.date()}] in bulk response')
+    records = to_records(bars)
+    symbols = bars['Symbol'].to_numpy()
+    order = np.argsort(symbols, kind='stable')
+    unique_symbols, starts = np.unique(symbols[order], return_index=True)
+    day_records = dict(zip(unique_symbols, np.split(records[order], starts[1:])))
+    history = _get_history_store()
+    num_extended = 0
+    for symbol in history.symbols():
+        coverage = history.get_coverage(symbol)
+        if symbol not in day_records or coverage is None or coverage[1] < prev_day.date():
+            continue
+        symbol_records = merge_records(history.get_records(symbol), day_records[symbol])
+        history.put_records(symbol, symbol_records, (coverage[0], max(coverage[1], day.date())))
+        num_extended += 1
+    history.flush()
+    # Datasets loaded in this process before the ingest do not include the day
+    _interday_dataset_cache.clear()
+    _interday_panel_cache.clear()
+    return num_extended
+
+
+def get_default_data_client(priority: Priority = Priority.BACKGROUND) -> DataClient:
+    """Gets the data client of the process for a priority.
+
+    The client holds an event loop thread, a pooled session and a cache writer thread,
+    so it is created once per process and shared by all callers.
+    """
+    # Forked processes do not inherit the threads of the parent's clients
+    key = os.getpid(), priority
+    with _default_data_clients_lock:
+        if key not in _default_data_clients:
+            _default_data_clients[key] = SingleFlightClient(CacheClient(AsyncFmpClient(priority=priority)))
+        return _default_data_clients[key]
+
+
+def get_live_data_client():
+    """Gets the data client for live trading, which falls back to Alpaca on slow FMP requests."""
+    return HedgedClient(get_default_data_client(Priority.REALTIME), AlpacaClient())
+
+
+def _get_dataset_key(symbols: Iterable[str], start_time: pd.Timestamp, end_time: pd.Timestamp) -> str:
+    # Datasets loaded before new daily bars are available do not include them
+    end_date = min(end_time.date(), _get_last_loadable_date())
+    return hash_str(','.join(sorted(symbols)) + start_time.strftime('%F') + end_time.strftime('%F') + str(end_date))
+
+
+def _prune_snapshots(snapshot_root: str, keep: str) -> None:
+    if not os.path.isdir(snapshot_root):
+        return
+    snapshot_dirs = [os.path.join(snapshot_root, name) for name in os.listdir(snapshot_root)
+                     if name != keep]
+    snapshot_dirs.sort(key=os.path.getmtime, reverse=True)
+    # Processes attached to a removed snapshot keep their mapping until they exit
+    for snapshot_dir in snapshot_dirs[_MAX_SNAPSHOTS - 1:]:
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+
+def _is_snapshot_fresh(snapshot: BarStore,
+                       history: BarStore,
+                       symbols: List[str],
+                       start_time: pd.Timestamp,
+                       end_time: pd.Timestamp) -> bool:
+    """Checks that the snapshot has all symbols with the coverages of their histories."""
+    start_date, end_date = start_time.date(), end_time.date()
+    return all(symbol in snapshot and
+               snapshot.get_coverage(symbol) == _clip_coverage(history.get_coverage(symbol), start_date, end_date)
+               for symbol in symbols)
+
+
+def _publish_interday_dataset(snapshot: BarStore,
+                              history: BarStore,
+                              symbols: List[str],
+                              start_time: pd.Timestamp,
+                              end_time: pd.Timestamp,
+                              data_client: DataClient) -> None:
+    _update_history(history, symbols, start_time, end_time, data_client)
+    start_day = pd.Timestamp(start_time.date()).tz_localize(TIME_ZONE)
+    end_day = pd.Timestamp(end_time.date() + datetime.timedelta(days=1)).tz_localize(TIME_ZONE)
+    start_ns, end_ns = start_day.as_unit('ns').value, end_day.as_unit('ns').value
+    for symbol in symbols:
+        records = history.get_records(symbol)
+        start_ind, end_ind = np.searchsorted(records['Time'], [start_ns, end_ns])
+        coverage = _clip_coverage(history.get_coverage(symbol), start_time.date(), end_time.date())
+        snapshot.put_records(symbol, records[start_ind:end_ind], coverage)
+    snapshot.flush()
 
 
 def load_interday_dataset(symbols: Iterable[str],
                           start_time: pd.Timestamp,
                           end_time: pd.Timestamp,
                           data_client: DataClient) -> Dict[str, pd.DataFrame]:
-    cache_key = hash_str(','.join(sorted(symbols)) + start_time.strftime('%F') + end_time.strftime('%F'))
+    """Loads daily bars of symbols from start_time to end_time.
+
+    Daily bars are kept in a persistent history per symbol, which is extended
+    incrementally. The requested window is published as a read-only memory-mapped
+    snapshot. Later loads of the same window, including those from other processes,
+    attach to the snapshot without loading again. The snapshot records the coverages
+    of the histories, and is published again once they are extended.
+    """
+    cache_key = _get_dataset_key(symbols, start_time, end_time)
     if cache_key in _interday_dataset_cache:
         return _interday_dataset_cache[cache_key]
-    cache_dir = os.path.join(CACHE_DIR, str(TimeInterval.DAY),
-                             start_time.strftime('%F'), end_time.strftime('%F'))
-    os.makedirs(cache_dir, exist_ok=True)
-    res = {}
-    tasks = {}
-    load_func = functools.partial(data_client.get_data,
-                                  start_time=start_time,
-                                  end_time=end_time,
-                                  time_interval=TimeInterval.DAY)
-    with futures.ThreadPoolExecutor(max_workers=_MAX_WORKERS) as pool:
-        for symbol in symbols:
-            t = pool.submit(_load_cached_symbol, symbol, cache_dir, load_func)
-            tasks[symbol] = t
-        iterator = tqdm(tasks.items(), ncols=80) if sys.stdout.isatty() else tasks.items()
-        for symbol, t in iterator:
-            res[symbol] = t.result()
+    symbols = list(symbols)
+    snapshot_root = os.path.join(CACHE_DIR, str(TimeInterval.DAY), 'snapshots')
+    snapshot = BarStore(os.path.join(snapshot_root, cache_key))
+    history = _get_history_store()
+    if not _is_snapshot_fresh(snapshot, history, symbols, start_time, end_time):
+        _publish_interday_dataset(snapshot, history, symbols, start_time, end_time, data_client)
+        _prune_snapshots(snapshot_root, cache_key)
+    res = {symbol: snapshot.get(symbol) for symbol in symbols}
     _interday_dataset_cache[cache_key] = res
     return res
 
 
+def load_interday_panel(symbols: Iterable[str],
+                        start_time: pd.Timestamp,
+                        end_time: pd.Timestamp,
+                        data_client: DataClient) -> InterdayPanel:
+    """Loads daily bars of symbols from start_time to end_time as an aligned panel."""
+    symbols = list(symbols)
+    cache_key = _get_dataset_key(symbols, start_time, end_time)
+    if cache_key not in _interday_panel_cache:
+        dataset = load_interday_dataset(symbols, start_time, end_time, data_client)
+        _interday_panel_cache[cache_key] = InterdayPanel.from_dataset(dataset)
+    return _interday_panel_cache[cache_key]
+
+
+def _get_intraday_dir(day: datetime.date) -> str:
+    return os.path.join(CACHE_DIR, str(TimeInterval.FIVE_MIN), day.strftime('%F'))
+
+
 def load_intraday_dataset(symbols: Iterable[str],
                           day: pd.Timestamp,
-                          data_client: DataClient) -> Dict[str, pd.DataFrame]:
-    cache_dir = os.path.join(CACHE_DIR, str(TimeInterval.FIVE_MIN), day.strftime('%F'))
-    os.makedirs(cache_dir, exist_ok=True)
-    res = {}
-    tasks = {}
-    load_func = functools.partial(data_client.get_daily,
+                          data_client: DataClient,
+                          pool: Optional[futures.Executor] = None) -> Dict[str, pd.DataFrame]:
+    """Loads five-minute bars of symbols on a day.
+
+    If pool is given, batches are loaded on it instead of a new thread pool.
+    """
+    load_func = functools.partial(data_client.get_daily_batch,
                                   day=day,
                                   time_interval=TimeInterval.FIVE_MIN)
-    with futures.ThreadPoolExecutor(max_workers=_MAX_WORKERS) as pool:
-        for symbol in symbols:
-            t = pool.submit(_load_cached_symbol, symbol, cache_dir, load_func)
-            tasks[symbol] = t
-        for symbol, t in tasks.items():
-            res[symbol] = t.result()
-    return res
+    return _load_dataset(symbols, _get_intraday_dir(day), load_func, pool)
+
+
+def _get_intraday_ranges(symbol: str,
+                         days: List[datetime.date],
+                         stores: Dict[datetime.date, BarStore]) -> List[Tuple[datetime.date, datetime.date]]:
+    """Groups consecutive days missing a symbol into ranges of limited length."""
+    ranges = []
+    current = []
+    for day in days:
+        if symbol not in stores[day]:
+            current.append(day)
+        if current and (symbol in stores[day] or len(current) == _INTRADAY_RANGE_DAYS):
+            ranges.append((current[0], current[-1]))
+            current = []
+    if current:
+        ranges.append((current[0], current[-1]))
+    return ranges
+
+
+def _plan_intraday_range(symbols: Iterable[str],
+                         days: List[datetime.date],
+                         stores: Dict[datetime.date, BarStore]) -> Dict[Tuple[datetime.date, datetime.date], List[str]]:
+    plans = collections.defaultdict(list)
+    for symbol in symbols:
+        for day_range in _get_intraday_ranges(symbol, days, stores):
+            plans[day_range].append(symbol)
+    return plans
+
+
+def plan_intraday_range(symbols: Iterable[str],
+                        days: Iterable[datetime.date]) -> Dict[Tuple[datetime.date, datetime.date], List[str]]:
+    """Groups symbols by the ranges of days missing in the intraday cache.
+
+    Each range is loaded by load_intraday_range with one request per symbol.
+    """
+    days = sorted(days)
+    return _plan_intraday_range(symbols, days, {day: BarStore(_get_intraday_dir(day)) for day in days})
+
+
+def load_intraday_range(symbols: Iterable[str],
+                        days: Iterable[datetime.date],
+                        data_client: DataClient,
+                        pool: Optional[futures.Executor] = None) -> None:
+    """Caches five-minute bars of symbols on market days with multi-day requests.
+
+    Consecutive days missing in the cache are requested as one range per symbol
+    and the response is split into the per-day partitions read by
+    load_intraday_dataset. Days already cached are skipped.
+    """
+    days = sorted(days)
+    stores = {day: BarStore(_get_intraday_dir(day)) for day in days}
+    plans = _plan_intraday_range(symbols, days, stores)
+    for (first_day, last_day), plan_symbols in plans.items():
+        range_days = [day for day in days if first_day <= day <= last_day]
+        load_func = functools.partial(data_client.get_data_batch,
+                                      start_time=get_day_range(first_day)[0],
+                                      end_time=get_day_range(last_day)[1],
+                                      time_interval=TimeInterval.FIVE_MIN)
+        day_starts = [get_day_range(day)[0].as_unit('ns').value for day in range_days]
+        day_ends = [get_day_range(day + datetime.timedelta(days=1))[0].as_unit('ns').value for day in range_days]
+        for symbol, df in _fetch_batches(plan_symbols, load_func, pool=pool).items():
+            records = to_records(df)
+            starts = np.searchsorted(records['Time'], day_starts)
+            ends = np.searchsorted(records['Time'], day_ends)
+            for day, start, end in zip(range_days, starts, ends):
+                stores[day].put_records(symbol, records[start:end])
+    for store in stores.values():
+        store.flush()
+
+
+def invalidate_bars(invalidations: Dict[str, datetime.date]) -> int:
+    """Removes cached bars of symbols before the given dates, so that they are loaded again.
+
+    Bars are adjusted for splits when they are loaded, so bars cached before a split
+    are stale. Only the affected symbols are touched: their daily histories are
+    trimmed to start from the dates, the interday snapshots including them are
+    removed, and they are removed from intraday partitions of earlier days and from
+    the cache databases. Returns the number of rewritten partitions.
+    """
+    if not invalidations:
+        return 0
+    num_partitions = 0
+    history = _get_history_store()
+    for symbol, date in invalidations.items():
+        if symbol not in history:
+            continue
+        coverage = history.get_coverage(symbol)
+        if coverage is None or coverage[1] < date:
+            # All bars are before the split date and stale, so the whole history
+            # is loaded again on the next load
+            history.remove(symbol)
+        else:
+            # Bars since the split date are already adjusted
+            records = history.get_records(symbol)
+            date_ns = pd.Timestamp(date).tz_localize(TIME_ZONE).as_unit('ns').value
+            history.put_records(symbol, records[records['Time'] >= date_ns], (max(coverage[0], date), coverage[1]))
+        num_partitions += 1
+    history.flush()
+    snapshot_root = os.path.join(CACHE_DIR, str(TimeInterval.DAY), 'snapshots')
+    if os.path.isdir(snapshot_root):
+        for name in os.listdir(snapshot_root):
+            snapshot_dir = os.path.join(snapshot_root, name)
+            if any(symbol in BarStore(snapshot_dir) for symbol in invalidations):
+                # Processes attached to a removed snapshot keep their mapping until they exit
+                shutil.rmtree(snapshot_dir, ignore_errors=True)
+                num_partitions += 1
+    intraday_root = os.path.join(CACHE_DIR, str(TimeInterval.FIVE_MIN))
+    if os.path.isdir(intraday_root):
+        for name in os.listdir(intraday_root):
+            partition_dir = os.path.join(intraday_root, name)
+            if not os.path.isdir(partition_dir):
+                continue
+            try:
+                day = datetime.datetime.strptime(name, '%Y-%m-%d').date()
+            except ValueError:
+                # Not an intraday partition
+                continue
+            symbols = [symbol for symbol, date in invalidations.items() if day < date]
+            store = BarStore(partition_dir)
+            symbols = [symbol for symbol in symbols if symbol in store]
+            if not symbols:
+                continue
+            for symbol in symbols:
+                store.remove(symbol)
+            store.flush()
+            num_partitions += 1
+    for time_interval in TimeInterval:
+        invalidate_db(os.path.join(CACHE_DIR, str(time_interval), 'data.db'), invalidations)
+    _interday_dataset_cache.clear()
+    _interday_panel_cache.clear()
+    return num_partitions
 
 
 def get_transactions(start_date: Optional[str], data_client: DataClient) -> List[Transaction]:
@@ -1,11 +1,12 @@
+import bisect
 import collections
 import datetime
 import difflib
-import functools
 import math
 import os
 import signal
 import time
+from concurrent import futures
 from typing import Any, Dict, List, Optional, Set, Tuple, Union
 
 import alpaca.trading as trading
@@ -17,7 +18,7 @@ import pandas as pd
 import tabulate
 
 from alpharius.data import (
-    DataClient, load_intraday_dataset, load_interday_dataset,
+    DataClient, load_intraday_dataset, load_intraday_range, load_interday_dataset,
 )
 from alpharius.utils import (
     TIME_ZONE,
@@ -29,12 +30,124 @@ from alpharius.utils import (
     get_trading_client,
 )
 from .common import (
-    Action, ActionType, Context, Position, Processor, ProcessorFactory,
+    Action, ActionType, Context, IndicatorTable, Position, Processor, ProcessorFactory,
     TradingFrequency, Mode, BASE_DIR, MARKET_OPEN, MARKET_CLOSE, OUTPUT_DIR,
     INTERDAY_LOOKBACK_LOAD, BID_ASK_SPREAD, SHORT_RESERVE_RATIO,
-    logging_config, timestamp_to_index, get_unique_actions, get_header)
+    logging_config, timestamp_to_index, get_market_open_index, get_unique_actions, get_header)
 
 _MAX_WORKERS = 20
+# Number of market days loaded with one intraday prefetch
+PREFETCH_DAYS = 5
+_INTERVAL = datetime.timedelta(minutes=5)
+
+
+class IntradayPrefetcher:
+    """Loads intraday data of upcoming market days in the background.
+
+    Days are scheduled in windows. Each window is loaded by a task on a persistent
+    day pool, which caches the window with multi-day range requests and then reads
+    each day from the cache. Symbol batches are fetched on a persistent batch pool.
+    Loaded days are released once taken, so only scheduled windows are held in memory.
+    """
+
+    def __init__(self, data_client: DataClient, max_workers: int = 2) -> None:
+        self._data_client = data_client
+        self._day_pool = futures.ThreadPoolExecutor(max_workers=max_workers)
+        self._batch_pool = futures.ThreadPoolExecutor(max_workers=_MAX_WORKERS)
+        self._tasks: Dict[datetime.date, futures.Future] = dict()
+
+    def __contains__(self, day: datetime.date) -> bool:
+        return day in self._tasks
+
+    def schedule(self, days: List[datetime.date], symbols: Set[str]) -> None:
+        days = [day for day in days if day not in self._tasks]
+        if not days:
+            return
+        task = self._day_pool.submit(self._load_window, days, symbols)
+        for day in days:
+            self._tasks[day] = task
+
+    def _load_window(self,
+                     days: List[datetime.date],
+                     symbols: Set[str]) -> Dict[datetime.date, Dict[str, pd.DataFrame]]:
+        load_intraday_range(symbols, days, self._data_client, self._batch_pool)
+        return {day: load_intraday_dataset(symbols, pd.Timestamp(day), self._data_client, self._batch_pool)
+                for day in days}
+
+    def get(self, day: datetime.date, symbols: Set[str]) -> Dict[str, pd.DataFrame]:
+        """Gets intraday data of symbols on a day.
+
+        Symbols not scheduled in advance are loaded synchronously.
+        """
+        intraday_dataset = dict()
+        task = self._tasks.pop(day, None)
+        if task is not None:
+            intraday_dataset = task.result().pop(day)
+        missing_symbols = set(symbols) - set(intraday_dataset)
+        if missing_symbols:
+            intraday_dataset.update(load_intraday_dataset(
+                missing_symbols, pd.Timestamp(day), self._data_client, self._batch_pool))
+        return intraday_dataset
+
+    def close(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks = dict()
+        self._day_pool.shutdown(wait=False)
+        self._batch_pool.shutdown(wait=False)
+
+
+class IntradayGrid:
+    """Intraday bars of a day aligned to the five-minute intervals of the market session.
+
+    The position of the bar starting at each interval is located once per day with
+    one vectorized search per symbol. Lookbacks at each interval are then sliced by
+    position, and current prices are read from arrays, without searching again.
+    """
+
+    def __init__(self,
+                 intraday_datas: Dict[str, pd.DataFrame],
+                 market_open: pd.Timestamp,
+                 market_close: pd.Timestamp) -> None:
+        self._intraday_datas = intraday_datas
+        self.num_intervals = int((market_close - market_open) / _INTERVAL)
+        interval_starts = (market_open.as_unit('ns').value
+                           + np.arange(self.num_intervals, dtype=np.int64) * pd.Timedelta(_INTERVAL).value)
+        self._ends: Dict[str, np.ndarray] = dict()
+        self._closes: Dict[str, np.ndarray] = dict()
+        self._market_open_indices: Dict[str, Optional[int]] = dict()
+        for symbol, intraday_data in intraday_datas.items():
+            if not len(intraday_data):
+                continue
+            index = pd.DatetimeIndex(intraday_data.index)
+            if index.tz is None:
+                index = index.tz_localize(TIME_ZONE)
+            times = index.as_unit('ns').asi8
+            positions = np.searchsorted(times, interval_starts)
+            found = positions < len(times)
+            found[found] = times[positions[found]] == interval_starts[found]
+            # Lookbacks end after the bar of the interval. Zero marks a missing bar.
+            self._ends[symbol] = np.where(found, positions + 1, 0)
+            self._closes[symbol] = intraday_data['Close'].to_numpy()
+            self._market_open_indices[symbol] = get_market_open_index(index)
+
+    def get_lookback(self, symbol: str, interval: int) -> Optional[Tuple[pd.DataFrame, float]]:
+        """Gets bars of a symbol until the bar starting at an interval, and its close price.
+
+        Returns None if the symbol has no bar starting at the interval.
+        """
+        ends = self._ends.get(symbol)
+        if ends is None or not ends[interval]:
+            return None
+        end = ends[interval]
+        return self._intraday_datas[symbol].iloc[:end], self._closes[symbol][end - 1]
+
+    def get_market_open_index(self, symbol: str, interval: int) -> Optional[int]:
+        """Gets the position of the market open bar in the lookback of a symbol at an interval."""
+        market_open_index = self._market_open_indices.get(symbol)
+        if market_open_index is None or market_open_index >= self._ends[symbol][interval]:
+            return None
+        return market_open_index
 
 
 class Backtest:
@@ -60,6 +173,8 @@ class Backtest:
         self._cash_portion = 1
         self._processor_stats = dict()
         self._interday_dataset = None
+        self._indicator_table = None
+        self._interday_lookbacks = dict()
         self._ack_all = ack_all
         self._data_client = data_client
 
@@ -97,12 +212,16 @@ class Backtest:
         self._context_prep_time = 0
         self._transactions = []
         self._processor_time = collections.defaultdict(int)
+        self._intraday_prefetcher = None
 
     def _safe_exit(self, signum, frame) -> None:
         self._close()
         exit(1)
 
     def _close(self):
+        if self._intraday_prefetcher is not None:
+            self._intraday_prefetcher.close()
+            self._intraday_prefetcher = None
         self._print_profile()
         self._print_summary()
         self._plot_summary()
@@ -155,8 +274,10 @@ class Backtest:
         history_start = self._start_date - datetime.timedelta(days=INTERDAY_LOOKBACK_LOAD)
         self._interday_dataset = load_interday_dataset(
             get_all_symbols(), history_start, self._end_date, self._data_client)
+        self._indicator_table = IndicatorTable(self._interday_dataset)
         self._interday_load_time += time.time() - self._run_start_time
         self._init_processors(history_start)
+        self._intraday_prefetcher = IntradayPrefetcher(self._data_client)
         transactions = []
         for day in self._market_dates:
             executed_closes = self._process(day)
@@ -201,26 +322,25 @@ class Backtest:
             self._processor_time[processor_name] += time.time() - data_process_start
         return actions
 
-    @functools.lru_cache()
-    def _prepare_interday_lookback(self, day: pd.Timestamp, symbol: str) -> Optional[pd.DataFrame]:
-        if symbol not in self._interday_dataset:
-            return
-        interday_data = self._interday_dataset[symbol]
-        interday_ind = timestamp_to_index(interday_data.index, pd.Timestamp(day).tz_localize(TIME_ZONE))
-        if interday_ind is None:
-            return
-        interday_lookback = interday_data.iloc[:interday_ind]
-        return interday_lookback
-
-    @staticmethod
-    def _prepare_intraday_lookback(current_interval_start: pd.Timestamp, symbol: str,
-                                   intraday_datas: Dict[str, pd.DataFrame]) -> Optional[pd.DataFrame]:
-        intraday_data = intraday_datas[symbol]
-        intraday_ind = timestamp_to_index(intraday_data.index, current_interval_start)
-        if intraday_ind is None:
-            return
-        intraday_lookback = intraday_data.iloc[:intraday_ind + 1]
-        return intraday_lookback
+    def _prepare_interday_lookback(self,
+                                   day: datetime.date,
+                                   symbol: str) -> Optional[Tuple[pd.DataFrame, float, np.ndarray]]:
+        """Gets the interday lookback of a symbol, its last close and its indicators.
+
+        Lookbacks are kept for the current day only.
+        """
+        if symbol in self._interday_lookbacks:
+            return self._interday_lookbacks[symbol]
+        res = None
+        interday_data = self._interday_dataset.get(symbol)
+        if interday_data is not None:
+            interday_ind = timestamp_to_index(interday_data.index, pd.Timestamp(day).tz_localize(TIME_ZONE))
+            if interday_ind:
+                res = (interday_data.iloc[:interday_ind],
+                       interday_data['Close'].iloc[interday_ind - 1],
+                       self._indicator_table.get(symbol, interday_ind))
+        self._interday_lookbacks[symbol] = res
+        return res
 
     def _load_intraday_data(self,
                             day: pd.Timestamp,
@@ -229,25 +349,54 @@ class Backtest:
         unique_symbols = set()
         for _, symbols in stock_universe.items():
             unique_symbols.update(symbols)
-        intraday_dataset = load_intraday_dataset(unique_symbols, day, self._data_client)
+        intraday_dataset = self._intraday_prefetcher.get(day.date(), unique_symbols)
         self._intraday_load_time += time.time() - load_intraday_start
         return intraday_dataset
 
+    def _prefetch_intraday_data(self, day: datetime.date) -> None:
+        """Schedules loading intraday data of the market days after day.
+
+        Once a day within the prefetch window is not scheduled, a whole window starting
+        from it is scheduled, so that intraday data is requested in multi-day ranges.
+        Stock universes of upcoming days are computed with current positions. They are
+        cached by the stock universes and reused when the days are processed. Getting
+        a stock universe does not change the state of a processor, so it can be called
+        for upcoming days.
+        """
+        start = bisect.bisect_right(self._market_dates, day)
+        for i in range(start, min(start + PREFETCH_DAYS, len(self._market_dates))):
+            if self._market_dates[i] not in self._intraday_prefetcher:
+                window = self._market_dates[i:i + PREFETCH_DAYS]
+                break
+        else:
+            return
+        unique_symbols = set()
+        for next_day in window:
+            _, stock_universe = self._load_stock_universe(next_day)
+            for _, symbols in stock_universe.items():
+                unique_symbols.update(symbols)
+        self._intraday_prefetcher.schedule(window, unique_symbols)
+
     def _process(self, day: datetime.date) -> List[Transaction]:
         for processor in self._processors:
             processor.setup(self._positions, day)
+        self._interday_lookbacks = dict()
 
         processor_stock_universes, stock_universe = self._load_stock_universe(day)
+        self._prefetch_intraday_data(day)
 
         intraday_datas = self._load_intraday_data(pd.Timestamp(day), stock_universe)
 
         market_open = pd.to_datetime(pd.Timestamp.combine(day, MARKET_OPEN)).tz_localize(TIME_ZONE)
         market_close = pd.to_datetime(pd.Timestamp.combine(day, MARKET_CLOSE)).tz_localize(TIME_ZONE)
-        current_interval_start = market_open
+        prep_context_start = time.time()
+        intraday_grid = IntradayGrid(intraday_datas, market_open, market_close)
+        self._context_prep_time += time.time() - prep_context_start
 
         executed_actions = []
-        while current_interval_start < market_close:
-            current_time = current_interval_start + datetime.timedelta(minutes=5)
+        for interval in range(intraday_grid.num_intervals):
+            current_interval_start = market_open + interval * _INTERVAL
+            current_time = current_interval_start + _INTERVAL
 
             frequency_to_process = [TradingFrequency.FIVE_MIN]
             if current_interval_start == market_open:
@@ -265,20 +414,23 @@ class Backtest:
                 if frequency in frequency_to_process:
                     unique_symbols.update(symbols)
             for symbol in unique_symbols:
-                intraday_lookback = self._prepare_intraday_lookback(
-                    current_interval_start, symbol, intraday_datas)
-                if intraday_lookback is None or len(intraday_lookback) == 0:
+                lookback = intraday_grid.get_lookback(symbol, interval)
+                if lookback is None:
                     continue
-                interday_lookback = self._prepare_interday_lookback(day, symbol)
-                if interday_lookback is None or len(interday_lookback) == 0:
+                interday = self._prepare_interday_lookback(day, symbol)
+                if interday is None:
                     continue
-                current_price = intraday_lookback['Close'].iloc[-1]
+                intraday_lookback, current_price = lookback
+                interday_lookback, prev_day_close, indicators = interday
                 context = Context(symbol=symbol,
                                   current_time=current_time,
                                   current_price=current_price,
                                   interday_lookback=interday_lookback,
                                   intraday_lookback=intraday_lookback,
-                                  mode=Mode.BACKTEST)
+                                  mode=Mode.BACKTEST,
+                                  market_open_index=intraday_grid.get_market_open_index(symbol, interval),
+                                  prev_day_close=prev_day_close,
+                                  indicators=indicators)
                 contexts[symbol] = context
             self._context_prep_time += time.time() - prep_context_start
 
@@ -290,8 +442,6 @@ class Backtest:
             current_executed_actions = self._process_actions(current_time, actions)
             executed_actions.extend(current_executed_actions)
 
-            current_interval_start += datetime.timedelta(minutes=5)
-
         for processor in self._processors:
             processor.teardown()
 
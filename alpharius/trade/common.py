@@ -6,8 +6,9 @@ import logging
 import os
 import re
 from enum import Enum
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple, Union
 
+import cachetools
 import numpy as np
 import pandas as pd
 
@@ -131,7 +132,92 @@ def get_header(title):
     return header_left + '=' * (80 - len(header_left))
 
 
+def get_market_open_index(index: pd.Index) -> Optional[int]:
+    """Gets the position of the first bar at or after market open."""
+    index = pd.DatetimeIndex(index)
+    seconds = index.hour * 3600 + index.minute * 60 + index.second
+    after_open = np.flatnonzero(seconds >= MARKET_OPEN.hour * 3600 + MARKET_OPEN.minute * 60)
+    return int(after_open[0]) if len(after_open) else None
+
+
+INDICATORS = ('h2l_avg', 'h2l_std', 'l2h_avg', 'o2h_avg', 'o2h_std', 'o2l_avg', 'o2l_std',
+              'dollar_volume', 'true_range_avg')
+_INDICATOR_INDEX = {name: i for i, name in enumerate(INDICATORS)}
+# Symbols whose indicators are kept in a table
+_MAX_INDICATOR_SYMBOLS = 2000
+
+
+def _rolling_stats(values: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Gets mean and standard deviation of up to window values before each position."""
+    padded = np.concatenate([np.full(window, np.nan), values])
+    windows = np.lib.stride_tricks.sliding_window_view(padded, window)
+    valid = ~np.isnan(windows)
+    counts = valid.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = np.where(valid, windows, 0).sum(axis=1) / counts
+        stds = np.sqrt(np.where(valid, (windows - means[:, None]) ** 2, 0).sum(axis=1) / counts)
+    return means, stds
+
+
+def compute_indicators(interday_data: pd.DataFrame, window: int = DAYS_IN_A_MONTH) -> np.ndarray:
+    """Computes indicators over daily bars for all positions in one pass.
+
+    Returns an array of shape (len(interday_data) + 1, len(INDICATORS)). Row i holds
+    indicators over the last window bars before bar i, so that the row of a lookback
+    is at its length. Rows without any bar before them are NaN.
+    """
+    opens, highs, lows, closes, volumes = [interday_data[column].to_numpy(dtype=np.float64)
+                                           for column in ('Open', 'High', 'Low', 'Close', 'Volume')]
+    prev_closes = np.concatenate([[np.nan], closes[:-1]])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        h2l_avg, h2l_std = _rolling_stats(lows / highs - 1, window)
+        l2h_avg, _ = _rolling_stats(highs / lows - 1, window)
+        o2h_avg, o2h_std = _rolling_stats(highs / opens - 1, window)
+        o2l_avg, o2l_std = _rolling_stats(lows / opens - 1, window)
+    dollar_volume, _ = _rolling_stats(closes * volumes, window)
+    true_range_avg, _ = _rolling_stats(np.fmax(highs, prev_closes) - np.fmin(lows, prev_closes), window)
+    return np.stack([h2l_avg, h2l_std, l2h_avg, o2h_avg, o2h_std, o2l_avg, o2l_std,
+                     dollar_volume, true_range_avg], axis=1)
+
+
+class IndicatorTable:
+    """Indicators of daily bars of symbols, looked up by the length of a lookback.
+
+    Indicators of a symbol are computed for all of its days at once on first use.
+    Only recently used symbols are kept, so that the table stays bounded.
+    """
+
+    def __init__(self, interday_dataset: Dict[str, pd.DataFrame]) -> None:
+        self._interday_dataset = interday_dataset
+        self._indicators = cachetools.LRUCache(maxsize=_MAX_INDICATOR_SYMBOLS)
+
+    def get(self, symbol: str, num_bars: int) -> Optional[np.ndarray]:
+        """Gets indicators of a symbol over the lookback of its first num_bars bars."""
+        if symbol not in self._interday_dataset:
+            return None
+        indicators = self._indicators.get(symbol)
+        if indicators is None:
+            indicators = compute_indicators(self._interday_dataset[symbol])
+            self._indicators[symbol] = indicators
+        return indicators[num_bars]
+
+
+# Marks values of a Context not computed yet, since None is a valid value
+_UNSET = object()
+
+
 class Context:
+    """Data of a symbol visible to processors at a point of time.
+
+    Thousands of contexts are created per day, so attributes are kept in slots.
+    Columns of the lookbacks are converted to arrays and lists once per context
+    and shared by all processors reading them. The market open index, the
+    previous day close and the row of interday indicators can be given when they
+    are known in advance, and are computed on first access otherwise.
+    """
+
+    __slots__ = ('symbol', 'current_time', 'current_price', 'interday_lookback', 'intraday_lookback',
+                 'mode', '_market_open_index', '_prev_day_close', '_indicators', '_columns')
 
     def __init__(self,
                  symbol: str,
@@ -139,66 +225,83 @@ class Context:
                  current_price: float,
                  interday_lookback: pd.DataFrame,
                  intraday_lookback: Optional[pd.DataFrame],
-                 mode: Optional[Mode] = None) -> None:
+                 mode: Optional[Mode] = None,
+                 market_open_index: Any = _UNSET,
+                 prev_day_close: Any = _UNSET,
+                 indicators: Optional[np.ndarray] = None) -> None:
         self.symbol = symbol
         self.current_time = current_time
         self.current_price = current_price
         self.interday_lookback = interday_lookback
         self.intraday_lookback = intraday_lookback
         self.mode = mode
-        self._market_open_index = None
+        self._market_open_index = market_open_index
+        self._prev_day_close = prev_day_close
+        self._indicators = indicators
+        self._columns = dict()
+
+    def _get_column(self, key: Tuple[str, str, bool]) -> Union[np.ndarray, List[float]]:
+        if key not in self._columns:
+            lookback_name, column, as_list = key
+            if as_list:
+                value = self._get_column((lookback_name, column, False)).tolist()
+            else:
+                lookback = self.interday_lookback if lookback_name == 'interday' else self.intraday_lookback
+                value = lookback[column].to_numpy()
+            self._columns[key] = value
+        return self._columns[key]
+
+    def get_interday_array(self, column: str) -> np.ndarray:
+        """Gets a column of the interday lookback as an array, which must not be modified."""
+        return self._get_column(('interday', column, False))
+
+    def get_intraday_array(self, column: str) -> np.ndarray:
+        """Gets a column of the intraday lookback as an array, which must not be modified."""
+        return self._get_column(('intraday', column, False))
+
+    def get_interday_values(self, column: str) -> List[float]:
+        """Gets a column of the interday lookback as a list, which must not be modified."""
+        return self._get_column(('interday', column, True))
+
+    def get_intraday_values(self, column: str) -> List[float]:
+        """Gets a column of the intraday lookback as a list, which must not be modified."""
+        return self._get_column(('intraday', column, True))
 
     @property
     def prev_day_close(self) -> float:
-        return self.interday_lookback['Close'].iloc[-1]
+        if self._prev_day_close is _UNSET:
+            self._prev_day_close = self.get_interday_array('Close')[-1]
+        return self._prev_day_close
 
     @property
     def market_open_index(self) -> Optional[int]:
-        if self._market_open_index is not None:
-            return self._market_open_index
-        for i in range(len(self.intraday_lookback)):
-            if self.intraday_lookback.index[i].time() >= MARKET_OPEN:
-                self._market_open_index = i
-                return i
-        return None
+        if self._market_open_index is _UNSET:
+            self._market_open_index = get_market_open_index(self.intraday_lookback.index)
+        return self._market_open_index
 
     @property
     def today_open(self) -> float:
         p = self.market_open_index
-        return self.intraday_lookback['Open'].iloc[p] if p is not None else None
+        return self.get_intraday_array('Open')[p] if p is not None else None
+
+    def get_indicator(self, name: str) -> float:
+        """Gets an indicator in INDICATORS over the last month of the interday lookback."""
+        if self._indicators is None:
+            # The true range of the first bar in the window needs the close before it
+            self._indicators = compute_indicators(self.interday_lookback.iloc[-(DAYS_IN_A_MONTH + 1):])[-1]
+        return float(self._indicators[_INDICATOR_INDEX[name]])
 
     @property
     def h2l_avg(self) -> float:
-        key = 'h2l_avg'
-        if key not in self.interday_lookback.attrs:
-            interday_highs = self.interday_lookback['High'][-DAYS_IN_A_MONTH:]
-            interday_lows = self.interday_lookback['Low'][-DAYS_IN_A_MONTH:]
-            h2l = [l / h - 1 for h, l in zip(interday_highs, interday_lows)]
-            h2l_avg = np.average(h2l)
-            self.interday_lookback.attrs[key] = h2l_avg
-        return self.interday_lookback.attrs[key]
+        return self.get_indicator('h2l_avg')
 
     @property
     def h2l_std(self) -> float:
-        key = 'h2l_std'
-        if key not in self.interday_lookback.attrs:
-            interday_highs = self.interday_lookback['High'][-DAYS_IN_A_MONTH:]
-            interday_lows = self.interday_lookback['Low'][-DAYS_IN_A_MONTH:]
-            h2l = [l / h - 1 for h, l in zip(interday_highs, interday_lows)]
-            h2l_std = float(np.std(h2l))
-            self.interday_lookback.attrs[key] = h2l_std
-        return self.interday_lookback.attrs[key]
+        return self.get_indicator('h2l_std')
 
     @property
     def l2h_avg(self) -> float:
-        key = 'l2h_avg'
-        if key not in self.interday_lookback.attrs:
-            interday_highs = self.interday_lookback['High'][-DAYS_IN_A_MONTH:]
-            interday_lows = self.interday_lookback['Low'][-DAYS_IN_A_MONTH:]
-            l2h = [h / l - 1 for h, l in zip(interday_highs, interday_lows)]
-            l2h_avg = np.average(l2h)
-            self.interday_lookback.attrs[key] = l2h_avg
-        return self.interday_lookback.attrs[key]
+        return self.get_indicator('l2h_avg')
 
 
 class Processor(abc.ABC):
@@ -221,6 +324,11 @@ class Processor(abc.ABC):
 
     @abc.abstractmethod
     def get_stock_universe(self, view_time: pd.Timestamp) -> List[str]:
+        """Gets symbols to process on the day of view_time.
+
+        Backtest also calls it for upcoming days to prefetch their data, so it
+        must not change the state of the processor.
+        """
         raise NotImplementedError('Calling parent interface')
 
     def process_data(self, context: Context) -> Optional[ProcessorAction]:
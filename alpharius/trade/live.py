@@ -4,7 +4,6 @@ import os
 import socket
 import threading
 import time
-from concurrent import futures
 from typing import List, Optional
 
 import alpaca.trading as trading
@@ -34,8 +33,6 @@ from .common import (
     Position, MARKET_OPEN, INTERDAY_LOOKBACK_LOAD, OUTPUT_DIR,
     SHORT_RESERVE_RATIO, logging_config, get_unique_actions)
 
-_MAX_WORKERS = 10
-
 
 class Live:
 
@@ -223,20 +220,14 @@ class Live:
                               frequency_to_process: List[TradingFrequency],
                               checkpoint_time: pd.Timestamp) -> None:
         update_start = time.time()
-        tasks = dict()
         all_symbols = []
         for frequency, symbols in self._stock_universe.items():
             if frequency not in frequency_to_process:
                 continue
             all_symbols.extend(symbols)
         all_symbols = list(set(all_symbols))
-        with futures.ThreadPoolExecutor(max_workers=_MAX_WORKERS) as pool:
-            for symbol in all_symbols:
-                t = pool.submit(self._data_client.get_daily,
-                                symbol, self._today, TimeInterval.FIVE_MIN)
-                tasks[symbol] = t
-            for symbol, t in tasks.items():
-                self._intraday_data[symbol] = t.result()
+        self._intraday_data.update(
+            self._data_client.get_daily_batch(all_symbols, self._today, TimeInterval.FIVE_MIN))
         latest_trades = self._data_client.get_last_trades(all_symbols)
         expected_index = checkpoint_time - datetime.timedelta(minutes=5)
         for symbol, price in latest_trades.items():
@@ -259,7 +250,7 @@ class Live:
                                       symbol, old_value, price)
                 intraday_lookback.at[intraday_lookback.index[-1], 'Close'] = np.float32(price)
         self._logger.info('Intraday data updated for [%d] symbols. Time elapsed [%.2fs]',
-                          len(tasks), time.time() - update_start)
+                          len(all_symbols), time.time() - update_start)
 
     def _get_position(self, symbol: str) -> Optional[Position]:
         for position in self._positions:
@@ -67,8 +67,8 @@ class CrossCloseProcessor(Processor):
         market_open_index = context.market_open_index
         if market_open_index is None:
             return
-        intraday_opens = context.intraday_lookback['Open'].tolist()[market_open_index:]
-        intraday_closes = context.intraday_lookback['Close'].tolist()[market_open_index:]
+        intraday_opens = context.get_intraday_values('Open')[market_open_index:]
+        intraday_closes = context.get_intraday_values('Close')[market_open_index:]
         if len(intraday_closes) < 3:
             return
         if abs(context.current_price / context.prev_day_close - 1) > 0.5:
@@ -96,7 +96,7 @@ class CrossCloseProcessor(Processor):
         market_open_index = context.market_open_index
         if market_open_index is None:
             return
-        intraday_closes = context.intraday_lookback['Close'].tolist()[market_open_index:]
+        intraday_closes = context.get_intraday_values('Close')[market_open_index:]
         if len(intraday_closes) < n_long + 1:
             return
         level = None
@@ -139,8 +139,8 @@ class CrossCloseProcessor(Processor):
         market_open_index = context.market_open_index
         if market_open_index is None:
             return
-        intraday_highs = context.intraday_lookback['High'].tolist()[market_open_index:]
-        intraday_closes = context.intraday_lookback['Close'].tolist()[market_open_index:]
+        intraday_highs = context.get_intraday_values('High')[market_open_index:]
+        intraday_closes = context.get_intraday_values('Close')[market_open_index:]
         if len(intraday_closes) < n_long + 1:
             return
         level = None
@@ -55,9 +55,9 @@ class DownFourV2Processor(Processor):
         if context.current_price > context.prev_day_close * 1.2:
             return
 
-        intraday_closes = context.intraday_lookback['Close'].tolist()[market_open_index:]
-        intraday_opens = context.intraday_lookback['Open'].tolist()[market_open_index:]
-        intraday_vols = context.intraday_lookback['Volume'].tolist()[market_open_index:]
+        intraday_closes = context.get_intraday_values('Close')[market_open_index:]
+        intraday_opens = context.get_intraday_values('Open')[market_open_index:]
+        intraday_vols = context.get_intraday_values('Volume')[market_open_index:]
         h2l_avg = context.h2l_avg
 
         # Filters
@@ -97,7 +97,7 @@ class DownFourV2Processor(Processor):
 
     def _close_position(self, context: Context) -> Optional[ProcessorAction]:
         position = self._positions[context.symbol]
-        intraday_closes = context.intraday_lookback['Close'].tolist()
+        intraday_closes = context.get_intraday_values('Close')
         is_close = (context.current_time >= position['entry_time'] + datetime.timedelta(minutes=15) and
                     len(intraday_closes) >= 4 and
                     (intraday_closes[-1] < intraday_closes[-2] or (intraday_closes[-1] >= intraday_closes[-4])))
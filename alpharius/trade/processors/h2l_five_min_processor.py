@@ -64,14 +64,14 @@ class H2lFiveMinProcessor(Processor):
             return
         if context.current_price < 0.4 * self._get_quarterly_high(context):
             return
-        intraday_closes = context.intraday_lookback['Close'].tolist()[market_open_index:]
+        intraday_closes = context.get_intraday_values('Close')[market_open_index:]
         if len(intraday_closes) < 2:
             return
         if context.current_price > np.min(intraday_closes):
             return
         if abs(context.current_price / context.prev_day_close - 1) > 0.5:
             return
-        intraday_opens = context.intraday_lookback['Open'].tolist()[market_open_index:]
+        intraday_opens = context.get_intraday_values('Open')[market_open_index:]
         if intraday_opens[-2] > context.prev_day_close > intraday_closes[-1]:
             return
         prev_loss = intraday_closes[-2] / intraday_opens[-2] - 1
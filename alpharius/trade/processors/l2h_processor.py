@@ -60,8 +60,8 @@ class L2hProcessor(Processor):
         market_open_index = context.market_open_index
         if market_open_index is None:
             return
-        intraday_closes = context.intraday_lookback['Close'].tolist()[market_open_index:]
-        intraday_opens = context.intraday_lookback['Open'].tolist()[market_open_index:]
+        intraday_closes = context.get_intraday_values('Close')[market_open_index:]
+        intraday_opens = context.get_intraday_values('Open')[market_open_index:]
         if len(intraday_closes) < 10:
             return
         if abs(context.current_price / context.prev_day_close - 1) > 0.5:
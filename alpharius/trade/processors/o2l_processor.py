@@ -54,11 +54,8 @@ class O2lProcessor(Processor):
         key = context.symbol + context.current_time.strftime('%F')
         if key in self._memo:
             return self._memo[key]
-        interday_opens = context.interday_lookback['Open'][-DAYS_IN_A_MONTH:]
-        interday_lows = context.interday_lookback['Low'][-DAYS_IN_A_MONTH:]
-        o2l_losses = [l / o - 1 for o, l in zip(interday_opens, interday_lows)]
-        o2l_avg = np.average(o2l_losses)
-        o2l_std = np.std(o2l_losses)
+        o2l_avg = context.get_indicator('o2l_avg')
+        o2l_std = context.get_indicator('o2l_std')
         upper_threshold = o2l_avg - 4 * o2l_std
         lower_threshold = max(o2l_avg - 5.5 * o2l_std, -0.4)
         res = (lower_threshold, upper_threshold)
@@ -75,7 +72,7 @@ class O2lProcessor(Processor):
         if market_open_index is None:
             return
         market_open_price = context.intraday_lookback['Open'].iloc[market_open_index]
-        intraday_closes = context.intraday_lookback['Close'].tolist()[market_open_index:]
+        intraday_closes = context.get_intraday_values('Close')[market_open_index:]
         if intraday_closes[-1] > np.min(intraday_closes):
             return
         if context.current_price < context.prev_day_close < market_open_price and t <= datetime.time(10, 0):
@@ -95,7 +92,7 @@ class O2lProcessor(Processor):
 
     def _close_position(self, context: Context) -> Optional[ProcessorAction]:
         position = self._positions[context.symbol]
-        intraday_closes = context.intraday_lookback['Close'].tolist()
+        intraday_closes = context.get_intraday_values('Close')
         elapsed_fifteen = context.current_time == position['entry_time'] + datetime.timedelta(minutes=15)
         take_profit = elapsed_fifteen and len(intraday_closes) >= 4 and intraday_closes[-1] > intraday_closes[-4]
         early_stop = (elapsed_fifteen and len(intraday_closes) >= 4 and
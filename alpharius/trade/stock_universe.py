@@ -4,16 +4,16 @@ import functools
 import inspect
 import json
 import os
-from typing import List
+from typing import List, Set, Tuple
 
 import alpaca.trading as trading
 import numpy as np
 import pandas as pd
 
-from alpharius.data import DataClient, load_interday_dataset
+from alpharius.data import DataClient, load_interday_panel
 from alpharius.utils import ALPACA_API_KEY_ENV, ALPACA_SECRET_KEY_ENV, TIME_ZONE, hash_str, get_all_symbols
 from .common import (
-    DAYS_IN_A_QUARTER, DAYS_IN_A_MONTH, CACHE_DIR, timestamp_to_index,
+    DAYS_IN_A_QUARTER, DAYS_IN_A_MONTH, CACHE_DIR,
 )
 from .constants import COMPANY_SYMBOLS
 
@@ -109,10 +109,40 @@ class DataBasedStockUniverse(BaseStockUniverse):
                  lookback_end_date: pd.Timestamp,
                  data_client: DataClient) -> None:
         super().__init__(lookback_start_date, lookback_end_date)
-        self._historical_data = load_interday_dataset(get_all_symbols(),
-                                                      lookback_start_date,
-                                                      lookback_end_date,
-                                                      data_client)
+        self._panel = load_interday_panel(get_all_symbols(),
+                                          lookback_start_date,
+                                          lookback_end_date,
+                                          data_client)
+
+    def _get_candidates(self, view_time: pd.Timestamp, symbols: Set[str]) -> Tuple[np.ndarray, int]:
+        """Gets panel rows of symbols with enough history before view_time.
+
+        Returns the rows and the index of the previous market day on the panel.
+        """
+        prev_day_ind = self._panel.get_day_index(self.get_prev_day(view_time))
+        if prev_day_ind is None:
+            return np.empty(0, dtype=int), 0
+        rows = np.array([self._panel.get_row(symbol) for symbol in self._panel.symbols
+                         if symbol in symbols], dtype=int)
+        prev_closes = self._panel.get_column('Close')[rows, prev_day_ind]
+        num_bars = self._panel.get_num_bars()[rows, prev_day_ind]
+        mask = ~np.isnan(prev_closes) & (num_bars > DAYS_IN_A_MONTH)
+        return rows[mask], prev_day_ind
+
+    def _get_rank(self, rows: np.ndarray, metrics: np.ndarray, reverse: bool) -> List[str]:
+        order = np.argsort(-metrics if reverse else metrics, kind='stable')
+        return [self._panel.symbols[row] for row in rows[order]]
+
+    def _filter_drawdown(self, rows: np.ndarray, prev_day_ind: int) -> np.ndarray:
+        """Filters out symbols whose previous close is below 40% of the quarterly high."""
+        start_ind = max(prev_day_ind - DAYS_IN_A_QUARTER, 0)
+        closes = self._panel.get_column('Close')[rows, start_ind:prev_day_ind + 1]
+        mask = closes[:, -1] >= 0.4 * np.nanmax(closes, axis=1)
+        return rows[mask]
+
+    def _get_month_window(self, column: str, rows: np.ndarray, prev_day_ind: int) -> np.ndarray:
+        start_ind = prev_day_ind - DAYS_IN_A_MONTH + 1
+        return self._panel.get_column(column)[rows, start_ind:prev_day_ind + 1].astype(np.float64)
 
 
 class TopVolumeUniverse(DataBasedStockUniverse, CachedStockUniverse):
@@ -126,29 +156,13 @@ class TopVolumeUniverse(DataBasedStockUniverse, CachedStockUniverse):
         self._company_symbols = set(COMPANY_SYMBOLS)
         self._num_stocks = num_stocks
 
-    def _get_dollar_volume(self, symbol: str, prev_day_ind: int) -> float:
-        hist = self._historical_data[symbol]
-        pv = [hist['Close'].iloc[i] * hist['Volume'].iloc[i]
-              for i in range(max(prev_day_ind - DAYS_IN_A_MONTH + 1, 0), prev_day_ind + 1)]
-        return np.average(pv) if pv else 0
-
     def get_stock_universe_impl(self, view_time: pd.Timestamp) -> List[str]:
-        prev_day = self.get_prev_day(view_time)
-        dollar_volumes = []
-        for symbol, hist in self._historical_data.items():
-            if symbol not in self._company_symbols:
-                continue
-            if prev_day not in hist.index:
-                continue
-            prev_day_ind = timestamp_to_index(hist.index, prev_day)
-            if prev_day_ind < DAYS_IN_A_MONTH:
-                continue
-            prev_close = hist['Close'].iloc[prev_day_ind]
-            if prev_close < 5:
-                continue
-            dollar_volumes.append((symbol, self._get_dollar_volume(symbol, prev_day_ind)))
-        dollar_volumes.sort(key=lambda s: s[1], reverse=True)
-        return [s[0] for s in dollar_volumes[:self._num_stocks]]
+        rows, prev_day_ind = self._get_candidates(view_time, self._company_symbols)
+        rows = rows[self._panel.get_column('Close')[rows, prev_day_ind] >= 5]
+        closes = self._get_month_window('Close', rows, prev_day_ind)
+        volumes = self._get_month_window('Volume', rows, prev_day_ind)
+        dollar_volumes = np.nanmean(closes * volumes, axis=1)
+        return self._get_rank(rows, dollar_volumes, reverse=True)[:self._num_stocks]
 
 
 class IntradayVolatilityStockUniverse(DataBasedStockUniverse, CachedStockUniverse):
@@ -164,39 +178,15 @@ class IntradayVolatilityStockUniverse(DataBasedStockUniverse, CachedStockUnivers
         self._company_symbols = set(COMPANY_SYMBOLS)
         self._num_stocks = num_stocks
 
-    def _get_intraday_range(self, symbol: str, prev_day_ind: int) -> float:
-        hist = self._historical_data[symbol]
-        res = []
-        for i in range(max(prev_day_ind - DAYS_IN_A_MONTH + 1, 1), prev_day_ind + 1):
-            h = hist['High'].iloc[i]
-            l = hist['Low'].iloc[i]
-            c = hist['Close'].iloc[i - 1]
-            res.append((h - l) / c)
-        return np.average(res) if res else 0
-
     def get_stock_universe_impl(self, view_time: pd.Timestamp) -> List[str]:
-        prev_day = self.get_prev_day(view_time)
-        intraday_volatility_list = []
         top_volume_symbols = set(self._top_volume.get_stock_universe(view_time))
-        for symbol, hist in self._historical_data.items():
-            if symbol not in self._company_symbols:
-                continue
-            if symbol not in top_volume_symbols:
-                continue
-            if prev_day not in hist.index:
-                continue
-            prev_day_ind = timestamp_to_index(hist.index, prev_day)
-            if prev_day_ind < DAYS_IN_A_MONTH:
-                continue
-            prev_close = hist['Close'].iloc[prev_day_ind]
-            start_ind = max(prev_day_ind - DAYS_IN_A_QUARTER, 0)
-            if prev_close < 0.4 * np.max(hist['Close'][start_ind:prev_day_ind + 1]):
-                continue
-            intraday_volatility = self._get_intraday_range(symbol, prev_day_ind)
-            intraday_volatility_list.append((symbol, intraday_volatility))
-
-        intraday_volatility_list.sort(key=lambda s: s[1], reverse=True)
-        return [s[0] for s in intraday_volatility_list[:self._num_stocks]]
+        rows, prev_day_ind = self._get_candidates(view_time, self._company_symbols & top_volume_symbols)
+        rows = self._filter_drawdown(rows, prev_day_ind)
+        highs = self._get_month_window('High', rows, prev_day_ind)
+        lows = self._get_month_window('Low', rows, prev_day_ind)
+        prev_closes = self._get_month_window('Close', rows, prev_day_ind - 1)
+        intraday_volatility = np.nanmean((highs - lows) / prev_closes, axis=1)
+        return self._get_rank(rows, intraday_volatility, reverse=True)[:self._num_stocks]
 
 
 class L2hVolatilityStockUniverse(DataBasedStockUniverse, CachedStockUniverse):
@@ -210,36 +200,12 @@ class L2hVolatilityStockUniverse(DataBasedStockUniverse, CachedStockUniverse):
         self._top_volume = TopVolumeUniverse(lookback_start_date, lookback_end_date, data_client, num_top_volume)
         self._company_symbols = set(COMPANY_SYMBOLS)
 
-    def _get_l2h_avg(self, symbol: str, prev_day_ind: int) -> float:
-        hist = self._historical_data[symbol]
-        res = []
-        for i in range(max(prev_day_ind - DAYS_IN_A_MONTH + 1, 1), prev_day_ind + 1):
-            h = hist['High'].iloc[i]
-            l = hist['Low'].iloc[i]
-            res.append(l / h - 1)
-        return np.average(res) if res else 0
-
     def get_stock_universe_impl(self, view_time: pd.Timestamp) -> List[str]:
-        prev_day = self.get_prev_day(view_time)
         top_volume_symbols = set(self._top_volume.get_stock_universe(view_time))
-        symbols = []
-        for symbol, hist in self._historical_data.items():
-            if symbol not in self._company_symbols:
-                continue
-            if symbol not in top_volume_symbols:
-                continue
-            if prev_day not in hist.index:
-                continue
-            prev_day_ind = timestamp_to_index(hist.index, prev_day)
-            if prev_day_ind < DAYS_IN_A_MONTH:
-                continue
-            prev_close = hist['Close'].iloc[prev_day_ind]
-            start_ind = max(prev_day_ind - DAYS_IN_A_QUARTER, 0)
-            if prev_close < 0.4 * np.max(hist['Close'][start_ind:prev_day_ind + 1]):
-                continue
-            l2h_avg = self._get_l2h_avg(symbol, prev_day_ind)
-            if l2h_avg < -0.05:
-                symbols.append((symbol, l2h_avg))
-        symbols.sort(key=lambda x: x[1])
-        symbols = symbols[:100]
-        return [s[0] for s in symbols]
+        rows, prev_day_ind = self._get_candidates(view_time, self._company_symbols & top_volume_symbols)
+        rows = self._filter_drawdown(rows, prev_day_ind)
+        highs = self._get_month_window('High', rows, prev_day_ind)
+        lows = self._get_month_window('Low', rows, prev_day_ind)
+        l2h_avg = np.nanmean(lows / highs - 1, axis=1)
+        rows, l2h_avg = rows[l2h_avg < -0.05], l2h_avg[l2h_avg < -0.05]
+        return self._get_rank(rows, l2h_avg, reverse=False)[:100]
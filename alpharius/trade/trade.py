@@ -4,7 +4,7 @@ import datetime
 import matplotlib
 from dateutil.relativedelta import relativedelta
 
-from alpharius.data import get_default_data_client
+from alpharius.data import get_default_data_client, get_live_data_client
 from alpharius.trade import Backtest, Live, processors
 from alpharius.utils import get_latest_day
 
@@ -41,9 +41,9 @@ def main():
     parser.add_argument('--ack_all', action='store_true',
                         help='Ack all trade actions. Only used in backtest mode.')
     args = parser.parse_args()
-    data_client = get_default_data_client()
 
     if args.mode == 'backtest':
+        data_client = get_default_data_client()
         latest_day = get_latest_day()
         default_start_date = (latest_day - relativedelta(years=1)).strftime('%F')
         default_end_date = (latest_day + datetime.timedelta(days=1)).strftime('%F')
@@ -55,6 +55,7 @@ def main():
                           ack_all=args.ack_all)
         runner.run()
     else:
+        data_client = get_live_data_client()
         runner = Live(processor_factories=PROCESSOR_FACTORIES,
                       data_client=data_client)
         runner.run()
@@ -0,0 +1,190 @@
+import argparse
+import dataclasses
+import datetime
+import os
+from concurrent import futures
+from typing import List, Set, Tuple, Union
+
+import alpaca.trading as trading
+import pandas as pd
+import tabulate
+from dateutil.relativedelta import relativedelta
+from tqdm import tqdm
+
+from alpharius.data import (
+    DataClient, TimeInterval, get_default_data_client, load_intraday_range,
+    plan_interday_history, plan_intraday_range, update_interday_history,
+)
+from alpharius.data.fmp_client import get_call_rate, get_num_calls
+from alpharius.trade import PROCESSOR_FACTORIES
+from alpharius.trade.backtest import PREFETCH_DAYS
+from alpharius.trade.common import INTERDAY_LOOKBACK_LOAD, OUTPUT_DIR, Processor, ProcessorFactory
+from alpharius.utils import get_all_symbols, get_latest_day, get_trading_client
+
+_MAX_WORKERS = 20
+# Windows are cached independently, so a few of them are loaded at a time
+_MAX_WINDOWS = 4
+# Daily histories are persisted after each chunk of symbols
+_INTERDAY_CHUNK_SIZE = 1000
+
+
+@dataclasses.dataclass
+class WarmCachePlan:
+    """Partitions to load into the cache and the expected cost."""
+    time_interval: TimeInterval
+    num_partitions: int
+    num_missing: int
+    num_calls: int
+
+    @property
+    def estimated_seconds(self) -> float:
+        return self.num_calls / get_call_rate(self.time_interval)
+
+
+class CacheWarmer:
+    """Loads the data a backtest needs into the cache ahead of time.
+
+    Daily bars of all symbols are needed from INTERDAY_LOOKBACK_LOAD before the
+    start date. Five-minute bars are needed for the stock universes of the processors
+    on each market day, grouped into the same windows as the backtest prefetches.
+    Only partitions missing in the cache are loaded, and each chunk of symbols or
+    window of days is persisted once loaded, so an interrupted run resumes from
+    where it stopped.
+    """
+
+    def __init__(self,
+                 start_date: Union[pd.Timestamp, str],
+                 end_date: Union[pd.Timestamp, str],
+                 processor_factories: List[ProcessorFactory],
+                 data_client: DataClient) -> None:
+        self._start_date = pd.to_datetime(start_date)
+        self._end_date = pd.to_datetime(end_date)
+        self._processor_factories = processor_factories
+        self._data_client = data_client
+        self._history_start = self._start_date - datetime.timedelta(days=INTERDAY_LOOKBACK_LOAD)
+        self._output_dir = os.path.join(OUTPUT_DIR, 'warm_cache')
+        calendar = get_trading_client().get_calendar(
+            filters=trading.GetCalendarRequest(
+                start=self._start_date.date(),
+                end=(self._end_date - datetime.timedelta(days=1)).date(),
+            ))
+        self._market_dates = [market_day.date for market_day in calendar
+                              if market_day.date < self._end_date.date()]
+        self._symbols = get_all_symbols()
+        self._windows = None
+
+    def plan_interday(self) -> WarmCachePlan:
+        plans = plan_interday_history(self._symbols, self._history_start, self._end_date)
+        num_missing = sum(len(symbols) for symbols in plans.values())
+        num_calls = sum(len(gaps) * get_num_calls(len(symbols), TimeInterval.DAY)
+                        for gaps, symbols in plans.items())
+        return WarmCachePlan(TimeInterval.DAY, len(self._symbols), num_missing, num_calls)
+
+    def warm_interday(self) -> None:
+        update_interday_history(self._symbols, self._history_start, self._end_date,
+                                self._data_client, chunk_size=_INTERDAY_CHUNK_SIZE)
+
+    def _create_processors(self) -> List[Processor]:
+        os.makedirs(self._output_dir, exist_ok=True)
+        return [factory.create(lookback_start_date=self._history_start,
+                               lookback_end_date=self._end_date,
+                               data_client=self._data_client,
+                               output_dir=self._output_dir)
+                for factory in self._processor_factories]
+
+    def _get_windows(self) -> List[Tuple[List[datetime.date], Set[str]]]:
+        """Groups market days as the backtest prefetches them, with the symbols needed."""
+        if self._windows is not None:
+            return self._windows
+        # The first day is loaded on its own, and later days in windows of prefetched days
+        day_windows = [self._market_dates[:1]] + [self._market_dates[i:i + PREFETCH_DAYS]
+                                                  for i in range(1, len(self._market_dates), PREFETCH_DAYS)]
+        processors = self._create_processors()
+        self._windows = []
+        for days in tqdm(day_windows, ncols=80, desc='Stock universe'):
+            symbols = set()
+            for day in days:
+                for processor in processors:
+                    processor.setup([], day)
+                    symbols.update(processor.get_stock_universe(pd.Timestamp(day)))
+            if days:
+                self._windows.append((days, symbols))
+        for processor in processors:
+            processor.teardown()
+        return self._windows
+
+    def plan_intraday(self) -> WarmCachePlan:
+        num_partitions, num_missing, num_calls = 0, 0, 0
+        for days, symbols in self._get_windows():
+            num_partitions += len(days) * len(symbols)
+            window_missing, window_calls = _plan_window(symbols, days)
+            num_missing += window_missing
+            num_calls += window_calls
+        return WarmCachePlan(TimeInterval.FIVE_MIN, num_partitions, num_missing, num_calls)
+
+    def warm_intraday(self) -> None:
+        windows = [(days, symbols, _plan_window(symbols, days)[0]) for days, symbols in self._get_windows()]
+        windows = [window for window in windows if window[2]]
+        with futures.ThreadPoolExecutor(max_workers=_MAX_WORKERS) as batch_pool, \
+                futures.ThreadPoolExecutor(max_workers=_MAX_WINDOWS) as window_pool, \
+                tqdm(total=sum(window[2] for window in windows), ncols=80, desc='Intraday') as progress:
+            tasks = {window_pool.submit(load_intraday_range, symbols, days, self._data_client, batch_pool): num_missing
+                     for days, symbols, num_missing in windows}
+            for task in futures.as_completed(tasks):
+                task.result()
+                progress.update(tasks[task])
+
+
+def _plan_window(symbols: Set[str], days: List[datetime.date]) -> Tuple[int, int]:
+    """Gets the number of missing partitions of a window and the number of calls to load them."""
+    num_missing, num_calls = 0, 0
+    for (first_day, last_day), plan_symbols in plan_intraday_range(symbols, days).items():
+        num_missing += len([day for day in days if first_day <= day <= last_day]) * len(plan_symbols)
+        num_calls += get_num_calls(len(plan_symbols), TimeInterval.FIVE_MIN)
+    return num_missing, num_calls
+
+
+def _format_seconds(seconds: float) -> str:
+    return str(datetime.timedelta(seconds=round(seconds)))
+
+
+def _print_plans(plans: List[WarmCachePlan]) -> None:
+    rows = [[str(plan.time_interval), plan.num_partitions, plan.num_partitions - plan.num_missing,
+             plan.num_missing, plan.num_calls, _format_seconds(plan.estimated_seconds)]
+            for plan in plans]
+    print(tabulate.tabulate(rows, headers=['Interval', 'Partitions', 'Cached', 'Missing', 'API calls', 'Est. time'],
+                            tablefmt='grid'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Alpharius cache warming for backtesting.')
+    parser.add_argument('--start_date', default=None,
+                        help='Start date of the backtesting.')
+    parser.add_argument('--end_date', default=None,
+                        help='End date of the backtesting.')
+    parser.add_argument('--dry_run', action='store_true',
+                        help='Only print the partitions to load and the estimated cost.')
+    args = parser.parse_args()
+
+    latest_day = get_latest_day()
+    start_date = args.start_date or (latest_day - relativedelta(years=1)).strftime('%F')
+    end_date = args.end_date or (latest_day + datetime.timedelta(days=1)).strftime('%F')
+    warmer = CacheWarmer(start_date=start_date, end_date=end_date,
+                         processor_factories=PROCESSOR_FACTORIES,
+                         data_client=get_default_data_client())
+    interday_plan = warmer.plan_interday()
+    if args.dry_run and interday_plan.num_missing:
+        # Stock universes are computed from daily bars, which are not loaded in a dry run
+        _print_plans([interday_plan])
+        print('Intraday partitions are planned once daily bars are cached.')
+        return
+    if not args.dry_run:
+        warmer.warm_interday()
+    intraday_plan = warmer.plan_intraday()
+    _print_plans([interday_plan, intraday_plan])
+    if not args.dry_run:
+        warmer.warm_intraday()
+
+
+if __name__ == '__main__':
+    main()
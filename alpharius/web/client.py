@@ -25,6 +25,10 @@ app = Flask(__name__)
 
 START_DATE = '2023-03-14'
 
+# Shared by all requests so that bars cached in memory outlive a request
+_data_client = None
+_data_client_lock = threading.Lock()
+
 
 def get_time_vs_equity(history_equity: List[float],
                        history_time: List[int],
@@ -49,6 +53,15 @@ def get_time_vs_equity(history_equity: List[float],
     return time_list, equity_list
 
 
+def get_data_client() -> data.DataClient:
+    global _data_client
+    with _data_client_lock:
+        if _data_client is None:
+            _data_client = data.MemoryCacheClient(
+                data.SingleFlightClient(data.FmpClient(priority=data.Priority.REALTIME)))
+        return _data_client
+
+
 def round_time(t: pd.Timestamp, time_fmt_with_year: bool):
     fmt = f'<span class="xs-hidden">{"%Y-" if time_fmt_with_year else ""}%m-%d </span>%H:%M'
     if t.second < 30:
@@ -60,7 +73,7 @@ class Client:
 
     def __init__(self):
         self._alpaca = tradeapi.REST()
-        self._data_client = data.FmpClient()
+        self._data_client = get_data_client()
 
     def get_calendar(self):
         latest_day = get_latest_day()
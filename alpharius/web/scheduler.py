@@ -6,6 +6,7 @@ import traceback
 from concurrent import futures
 
 import flask
+import pandas as pd
 from flask_apscheduler import APScheduler
 
 import alpharius.data as data
@@ -48,7 +49,7 @@ def email_on_exception(func):
 @email_on_exception
 def _trade_run():
     Live(processor_factories=PROCESSOR_FACTORIES,
-         data_client=data.get_default_data_client(),
+         data_client=data.get_live_data_client(),
          logging_timezone=TIME_ZONE).run()
 
 
@@ -112,6 +113,33 @@ def backfill():
     app.logger.info('Finish backfilling')
 
 
+@scheduler.task('cron', id='ingest', day_of_week='mon-fri',
+                hour=18, minute=30, timezone='America/New_York')
+@email_on_exception
+def ingest():
+    latest_day = get_latest_day()
+    calendar = Client().get_calendar()
+    if len(calendar) < 2 or calendar[-1].date.strftime('%F') != latest_day.strftime('%F'):
+        return
+    app.logger.info('Start ingesting')
+    # Bars made stale by splits are invalidated before new bars are appended
+    new_splits = data.SplitCalendar().sync(data.FmpClient(), calendar[-1].date)
+    app.logger.info('Recorded [%d] new splits', len(new_splits))
+    num_extended = data.ingest_interday_bulk(pd.Timestamp(calendar[-1].date),
+                                             pd.Timestamp(calendar[-2].date),
+                                             data.FmpClient())
+    app.logger.info('Finish ingesting daily bars of [%d] symbols', num_extended)
+
+
+@scheduler.task('cron', id='cache', day_of_week='mon-fri',
+                hour=20, minute=0, timezone='America/New_York')
+@email_on_exception
+def cache():
+    app.logger.info('Start managing cache')
+    result = data.CacheManager().run()
+    app.logger.info('Finish managing cache: [%s]', result)
+
+
 @scheduler.task('cron', id='backtest', day_of_week='mon-fri',
                 hour=16, minute=15, timezone='America/New_York')
 def backtest():
@@ -38,4 +38,5 @@ def mock_trading_client(mocker):
 def mock_default_data_client(mocker):
     client = fakes.FakeDataClient()
     mocker.patch('alpharius.data.get_default_data_client', return_value=client)
+    mocker.patch('alpharius.data.get_live_data_client', return_value=client)
     return client
@@ -52,6 +52,16 @@ def test_get_data(time_interval):
     assert len(d) > 0
 
 
+def test_get_data_batch():
+    client = data.AlpacaClient()
+    d = client.get_data_batch(['AAPL', 'MSFT'],
+                              start_time=pd.Timestamp('2024-03-26'),
+                              end_time=pd.Timestamp('2024-03-27'),
+                              time_interval=data.TimeInterval.DAY)
+    assert len(d['AAPL']) > 0
+    assert len(d['MSFT']) == 0
+
+
 def test_get_last_trades():
     client = data.AlpacaClient()
     prices = client.get_last_trades(['AAPL'])
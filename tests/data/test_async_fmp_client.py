@@ -0,0 +1,63 @@
+import aiohttp
+import pandas as pd
+import pytest
+
+import alpharius.data as data
+from .test_fmp_client import fake_get
+
+
+class FakeResponse:
+
+    def __init__(self, url, params):
+        self._response = fake_get(url, params)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    def raise_for_status(self):
+        self._response.raise_for_status()
+
+    async def json(self, content_type=None):
+        return self._response.json()
+
+
+@pytest.fixture(autouse=True)
+def mock_session(mocker):
+    return mocker.patch.object(aiohttp.ClientSession, 'get',
+                               side_effect=lambda url, params: FakeResponse(url, params))
+
+
+@pytest.fixture
+def client():
+    client = data.AsyncFmpClient()
+    yield client
+    client.close()
+
+
+@pytest.mark.parametrize('time_interval',
+                         [data.TimeInterval.FIVE_MIN,
+                          data.TimeInterval.DAY])
+def test_get_data_batch(client, mock_session, time_interval):
+    symbols = ['AAPL', 'MSFT', 'GOOG', 'AMZN', 'META', 'NVDA']
+    d = client.get_data_batch(symbols,
+                              start_time=pd.Timestamp('2024-03-26'),
+                              end_time=pd.Timestamp('2024-03-27'),
+                              time_interval=time_interval)
+
+    assert list(d.keys()) == symbols
+    for df in d.values():
+        assert len(df) > 0
+    assert mock_session.call_count == (len(symbols) if time_interval == data.TimeInterval.FIVE_MIN else 2)
+
+
+def test_get_daily(client):
+    d = client.get_daily('AAPL', pd.Timestamp('2024-03-26'), data.TimeInterval.FIVE_MIN)
+    assert len(d) > 0
+
+
+def test_get_last_trades(client):
+    prices = client.get_last_trades(['AAPL', 'MSFT'])
+    assert len(prices) == 2
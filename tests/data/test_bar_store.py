@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+import alpharius.data as data
+from alpharius.data.bar_store import BarStore, to_records
+from ..fakes import FakeDataClient
+
+
+def _get_bars(symbol):
+    return FakeDataClient().get_daily(symbol, pd.Timestamp('2024-04-18'), data.TimeInterval.FIVE_MIN)
+
+
+def test_put_and_get(tmp_path):
+    store = BarStore(str(tmp_path))
+    df = _get_bars('QQQ')
+    store.put('QQQ', df)
+    assert 'QQQ' in store
+    assert 'SPY' not in store
+
+    res = store.get('QQQ')
+
+    assert res.index.equals(df.index)
+    for column in data.DATA_COLUMNS:
+        np.testing.assert_array_equal(res[column].to_numpy(), df[column].to_numpy())
+
+
+def test_flush_and_reopen(tmp_path):
+    store = BarStore(str(tmp_path))
+    store.put('QQQ', _get_bars('QQQ'))
+    store.put('EMPTY', pd.DataFrame([], columns=data.DATA_COLUMNS))
+    store.flush()
+    store = BarStore(str(tmp_path))
+    store.put('SPY', _get_bars('SPY'))
+    store.flush()
+
+    reopened = BarStore(str(tmp_path))
+
+    assert reopened.symbols() == ['EMPTY', 'QQQ', 'SPY']
+    assert len(reopened.get('EMPTY')) == 0
+    assert reopened.get('SPY').index.equals(_get_bars('SPY').index)
+    assert reopened.get('QQQ')['Close'].dtype == np.float32
+
+
+def test_inconsistent_files_ignored(tmp_path):
+    store = BarStore(str(tmp_path))
+    store.put('QQQ', _get_bars('QQQ'))
+    store.flush()
+    np.save(tmp_path / 'bars.npy', np.load(tmp_path / 'bars.npy')[:10])
+
+    reopened = BarStore(str(tmp_path))
+
+    assert 'QQQ' not in reopened
+
+
+def test_remove(tmp_path):
+    store = BarStore(str(tmp_path))
+    day = pd.Timestamp('2024-04-18').date()
+    store.put_records('QQQ', to_records(_get_bars('QQQ')), (day, day))
+    store.put('SPY', _get_bars('SPY'))
+    store.flush()
+
+    store.remove('QQQ')
+    store.flush()
+    reopened = BarStore(str(tmp_path))
+
+    assert reopened.symbols() == ['SPY']
+    assert reopened.get_coverage('QQQ') is None
+    assert reopened.get('SPY').index.equals(_get_bars('SPY').index)
+
+
+def test_read_retried_on_io_error(mocker, tmp_path):
+    store = BarStore(str(tmp_path))
+    store.put('QQQ', _get_bars('QQQ'))
+    store.flush()
+    load = np.load
+    mocker.patch.object(np, 'load', side_effect=[IOError('Resource busy'), load(tmp_path / 'bars.npy', mmap_mode='r')])
+
+    reopened = BarStore(str(tmp_path))
+
+    assert reopened.get('QQQ').index.equals(_get_bars('QQQ').index)
@@ -1,9 +1,13 @@
 import datetime
+import os
+import sqlite3
+from concurrent import futures
 
 import pandas as pd
 
 import alpharius.data as data
 import alpharius.data.cache_client as cache_client
+from alpharius.utils import TIME_ZONE
 from ..fakes import FakeDataClient
 
 
@@ -51,8 +55,39 @@ def test_time_range_include():
     assert not time_range.include(pd.Timestamp('2024-01-25'), pd.Timestamp('2024-02-10'))
 
 
-def test_cache_client(mocker):
-    mocker.patch.object(cache_client, 'get_db_file', return_value=':memory:')
+def test_time_range_get_gaps():
+    time_range = cache_client.TimeRange([])
+    time_range.merge(pd.Timestamp('2024-02-01'), pd.Timestamp('2024-03-01'))
+    time_range.merge(pd.Timestamp('2024-03-10'), pd.Timestamp('2024-03-20'))
+    assert time_range.get_gaps(pd.Timestamp('2024-02-12'), pd.Timestamp('2024-03-01')) == []
+    assert time_range.get_gaps(pd.Timestamp('2024-01-25 10:00'), pd.Timestamp('2024-03-25 12:00')) == [
+        (pd.Timestamp('2024-01-25 10:00'), pd.Timestamp('2024-01-31 23:59')),
+        (pd.Timestamp('2024-03-02 00:00'), pd.Timestamp('2024-03-09 23:59')),
+        (pd.Timestamp('2024-03-21 00:00'), pd.Timestamp('2024-03-25 12:00')),
+    ]
+
+
+def test_time_range_merge_consecutive_days():
+    time_range = cache_client.TimeRange([])
+    time_range.merge(pd.Timestamp('2024-02-01'), pd.Timestamp('2024-03-01'))
+    time_range.merge(pd.Timestamp('2024-03-02'), pd.Timestamp('2024-03-02'))
+    time_range.merge(pd.Timestamp('2024-02-10'), pd.Timestamp('2024-02-20'))
+    assert time_range.intervals == [(datetime.date(2024, 2, 1),
+                                     datetime.date(2024, 3, 2))]
+
+
+def test_time_range_remove():
+    time_range = cache_client.TimeRange([(datetime.date(2024, 2, 1), datetime.date(2024, 2, 5)),
+                                          (datetime.date(2024, 3, 1), datetime.date(2024, 3, 1))])
+    time_range.remove(datetime.date(2024, 2, 3))
+    time_range.remove(datetime.date(2024, 2, 1))
+    time_range.remove(datetime.date(2024, 3, 1))
+    assert time_range.intervals == [(datetime.date(2024, 2, 2), datetime.date(2024, 2, 2)),
+                                    (datetime.date(2024, 2, 4), datetime.date(2024, 2, 5))]
+
+
+def test_cache_client(mocker, tmp_path):
+    mocker.patch.object(cache_client, 'get_db_file', side_effect=lambda t: str(tmp_path / f'{t}.db'))
     fake_data_client = FakeDataClient()
     client = cache_client.CacheClient(fake_data_client)
     df1 = client.get_daily('QQQ', pd.Timestamp('2024-04-18'), data.TimeInterval.FIVE_MIN)
@@ -62,3 +97,168 @@ def test_cache_client(mocker):
     assert fake_data_client.get_data_call_count == 1
     assert client.cache_hit == 1
     assert df1.to_string() == df2.to_string()
+
+
+def test_cache_client_incremental(mocker, tmp_path):
+    mocker.patch.object(cache_client, 'get_db_file', side_effect=lambda t: str(tmp_path / f'{t}.db'))
+    fake_data_client = FakeDataClient()
+    client = cache_client.CacheClient(fake_data_client)
+    client.get_daily('QQQ', pd.Timestamp('2024-04-18'), data.TimeInterval.FIVE_MIN)
+    get_data = mocker.spy(fake_data_client, 'get_data')
+
+    df = client.get_data('QQQ', pd.Timestamp('2024-04-18 00:00'), pd.Timestamp('2024-04-19 23:59'),
+                         data.TimeInterval.FIVE_MIN)
+
+    assert get_data.call_count == 1
+    assert get_data.call_args.args[1] == pd.Timestamp('2024-04-19 00:00')
+    assert len(df) == 2 * 288
+
+
+def test_cache_client_window_in_day(mocker, tmp_path):
+    mocker.patch.object(cache_client, 'get_db_file', side_effect=lambda t: str(tmp_path / f'{t}.db'))
+    fake_data_client = FakeDataClient()
+    client = cache_client.CacheClient(fake_data_client)
+    entry_time = pd.Timestamp('2024-04-18 10:05').tz_localize(TIME_ZONE)
+    exit_time = pd.Timestamp('2024-04-18 15:05').tz_localize(TIME_ZONE)
+
+    df1 = client.get_data('QQQ', entry_time - datetime.timedelta(minutes=5), entry_time, data.TimeInterval.FIVE_MIN)
+    df2 = client.get_data('QQQ', exit_time - datetime.timedelta(minutes=5), exit_time, data.TimeInterval.FIVE_MIN)
+
+    assert fake_data_client.get_data_call_count == 1
+    assert client.cache_hit == 1
+    assert list(df1.index) == [entry_time - datetime.timedelta(minutes=5), entry_time]
+    assert list(df2.index) == [exit_time - datetime.timedelta(minutes=5), exit_time]
+
+
+def test_invalidate_db(mocker, tmp_path):
+    mocker.patch.object(cache_client, 'get_db_file', side_effect=lambda t: str(tmp_path / f'{t}.db'))
+    fake_data_client = FakeDataClient()
+    client = cache_client.CacheClient(fake_data_client)
+    start_time, end_time = pd.Timestamp('2024-04-18 00:00'), pd.Timestamp('2024-04-19 23:59')
+    client.get_data('QQQ', start_time, end_time, data.TimeInterval.FIVE_MIN)
+    client.get_data('SPY', start_time, end_time, data.TimeInterval.FIVE_MIN)
+
+    cache_client.invalidate_db(cache_client.get_db_file(data.TimeInterval.FIVE_MIN),
+                               {'QQQ': datetime.date(2024, 4, 19)})
+    get_data = mocker.spy(fake_data_client, 'get_data')
+    df = client.get_data('QQQ', start_time, end_time, data.TimeInterval.FIVE_MIN)
+    client.get_data('SPY', start_time, end_time, data.TimeInterval.FIVE_MIN)
+
+    assert get_data.call_count == 1
+    assert get_data.call_args.args[2] == pd.Timestamp('2024-04-18 23:59')
+    assert len(df) == 2 * 288
+
+
+def test_cache_client_batch(mocker, tmp_path):
+    mocker.patch.object(cache_client, 'get_db_file', side_effect=lambda t: str(tmp_path / f'{t}.db'))
+    fake_data_client = FakeDataClient()
+    client = cache_client.CacheClient(fake_data_client)
+    client.get_daily('QQQ', pd.Timestamp('2024-04-18'), data.TimeInterval.FIVE_MIN)
+    get_data_batch = mocker.spy(fake_data_client, 'get_data_batch')
+
+    res = client.get_daily_batch(['QQQ', 'SPY', 'DIA'], pd.Timestamp('2024-04-18'), data.TimeInterval.FIVE_MIN)
+
+    assert list(res.keys()) == ['QQQ', 'SPY', 'DIA']
+    assert client.cache_hit == 1
+    assert get_data_batch.call_count == 1
+    assert get_data_batch.call_args.args[0] == ['SPY', 'DIA']
+
+
+def test_cache_client_concurrent(mocker, tmp_path):
+    mocker.patch.object(cache_client, 'get_db_file', side_effect=lambda t: str(tmp_path / f'{t}.db'))
+    client = cache_client.CacheClient(FakeDataClient())
+    symbols = [f'S{i}' for i in range(20)]
+
+    with futures.ThreadPoolExecutor(max_workers=10) as pool:
+        tasks = [pool.submit(client.get_daily, symbol, pd.Timestamp('2024-04-18'), data.TimeInterval.FIVE_MIN)
+                 for symbol in symbols * 2]
+        results = [t.result() for t in tasks]
+    client.close()
+
+    assert all(len(df) == 288 for df in results)
+    reopened = cache_client.CacheClient(FakeDataClient())
+    reopened.get_daily_batch(symbols, pd.Timestamp('2024-04-18'), data.TimeInterval.FIVE_MIN)
+    assert reopened.cache_hit == len(symbols)
+
+
+def test_cache_client_resample(mocker, tmp_path):
+    mocker.patch.object(cache_client, 'get_db_file', side_effect=lambda t: str(tmp_path / f'{t}.db'))
+    fake_data_client = FakeDataClient()
+    client = cache_client.CacheClient(fake_data_client)
+    client.get_daily('QQQ', pd.Timestamp('2024-04-18'), data.TimeInterval.FIVE_MIN)
+
+    res = client.get_daily_batch(['QQQ', 'SPY'], pd.Timestamp('2024-04-18'), data.TimeInterval.HOUR)
+
+    assert fake_data_client.get_data_call_count == 2
+    assert client.resample_hit == 1
+    # Bars before 00:30 belong to the hour starting at 23:30 of the previous day
+    assert len(res['QQQ']) == 24
+    assert res['QQQ'].index[0].strftime('%H:%M') == '00:30'
+    assert res['QQQ']['Volume'].sum() == (288 - 6) * 123
+    # Hours of the regular session start at the open and have all of their bars
+    regular = res['QQQ'].between_time('09:30', '15:30')
+    assert list(regular.index.strftime('%H:%M')) == [f'{hour:02d}:30' for hour in range(9, 16)]
+    assert (regular['Volume'] == 12 * 123).all()
+
+
+def test_cache_client_daily_not_resampled(mocker, tmp_path):
+    mocker.patch.object(cache_client, 'get_db_file', side_effect=lambda t: str(tmp_path / f'{t}.db'))
+    fake_data_client = FakeDataClient()
+    client = cache_client.CacheClient(fake_data_client)
+    client.get_daily('QQQ', pd.Timestamp('2024-04-18'), data.TimeInterval.FIVE_MIN)
+
+    client.get_daily('QQQ', pd.Timestamp('2024-04-18'), data.TimeInterval.DAY)
+
+    assert fake_data_client.get_data_call_count == 2
+    assert client.resample_hit == 0
+
+
+def test_cache_client_today_not_cached(mocker, tmp_path):
+    mocker.patch.object(cache_client, 'get_db_file', side_effect=lambda t: str(tmp_path / f'{t}.db'))
+    fake_data_client = FakeDataClient()
+    client = cache_client.CacheClient(fake_data_client)
+    today = pd.Timestamp.now(tz=TIME_ZONE).normalize()
+
+    client.get_daily('QQQ', today, data.TimeInterval.FIVE_MIN)
+    client.get_daily('QQQ', today, data.TimeInterval.FIVE_MIN)
+
+    assert fake_data_client.get_data_call_count == 2
+    assert client.cache_hit == 0
+
+
+def test_cache_client_range_until_today(mocker, tmp_path):
+    mocker.patch.object(cache_client, 'get_db_file', side_effect=lambda t: str(tmp_path / f'{t}.db'))
+    fake_data_client = FakeDataClient()
+    client = cache_client.CacheClient(fake_data_client)
+    today = pd.Timestamp.now(tz=TIME_ZONE).normalize()
+    get_data = mocker.spy(fake_data_client, 'get_data')
+
+    client.get_data('QQQ', today - datetime.timedelta(days=1), today + datetime.timedelta(hours=12),
+                    data.TimeInterval.FIVE_MIN)
+    client.get_data('QQQ', today - datetime.timedelta(days=1), today + datetime.timedelta(hours=12),
+                    data.TimeInterval.FIVE_MIN)
+
+    # Yesterday is loaded once, and today is loaded on each call
+    assert get_data.call_count == 3
+    assert client.cache_hit == 1
+    assert get_data.call_args.args[1] == today
+
+
+def test_migrate_db():
+    conn = sqlite3.connect(':memory:')
+    conn.executescript("""
+        CREATE TABLE chart (symbol TEXT, date TEXT, time TEXT, open REAL, high REAL,
+                            low REAL, close REAL, volume INTEGER, UNIQUE (symbol, time));
+        CREATE INDEX chart_time ON chart (symbol);
+        INSERT INTO chart VALUES ('QQQ', '2024-04-18', '2024-04-18 09:30:00-04:00', 1, 2, 0.5, 1.5, 100);
+    """)
+    sql_file = os.path.join(os.path.dirname(os.path.realpath(cache_client.__file__)), 'cache_db.sql')
+    with open(sql_file, 'r') as f:
+        init_script = f.read()
+
+    cache_client.migrate_db(conn, init_script)
+
+    rows = conn.execute('SELECT symbol, time, close FROM chart').fetchall()
+    assert rows == [('QQQ', int(pd.Timestamp('2024-04-18 13:30:00Z').timestamp()), 1.5)]
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == 1
+    assert conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL").fetchall() == []
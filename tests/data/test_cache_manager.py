@@ -0,0 +1,131 @@
+import json
+import os
+import sqlite3
+import time
+
+import pandas as pd
+
+import alpharius.data as data
+import alpharius.data.cache_client as cache_client
+from alpharius.data.bar_store import BarStore
+from ..fakes import FakeDataClient
+
+
+def _write_universe(cache_dir, name, day, symbols):
+    universe_dir = os.path.join(cache_dir, 'stock_universe', name)
+    os.makedirs(universe_dir, exist_ok=True)
+    with open(os.path.join(universe_dir, day + '.json'), 'w') as f:
+        json.dump(symbols, f)
+
+
+def _write_intraday(cache_dir, day, symbols):
+    store = BarStore(os.path.join(cache_dir, 'FIVE_MIN', day))
+    for symbol in symbols:
+        store.put(symbol, FakeDataClient().get_daily(symbol, pd.Timestamp(day), data.TimeInterval.FIVE_MIN))
+    store.flush()
+
+
+def _set_time(path, t):
+    for root, _, files in os.walk(path):
+        for file in files:
+            os.utime(os.path.join(root, file), (t, t))
+
+
+def test_get_stats(tmp_path):
+    cache_dir = str(tmp_path)
+    _write_universe(cache_dir, 'TopVolume_abc', '2024-03-26', ['QQQ', 'SPY'])
+    _write_intraday(cache_dir, '2024-03-26', ['QQQ', 'SPY'])
+    os.makedirs(os.path.join(cache_dir, 'DAY', 'history'))
+
+    stats = data.CacheManager(cache_dir).get_stats()
+
+    assert stats['stock_universe'] == {'units': 1, 'files': 1, 'bytes': len('["QQQ", "SPY"]')}
+    assert stats['intraday']['files'] == 2
+
+
+def test_deduplicate(tmp_path):
+    cache_dir = str(tmp_path)
+    for day in ['2024-03-25', '2024-03-26', '2024-03-27']:
+        _write_universe(cache_dir, 'TopVolume_abc', day, ['QQQ', 'SPY'])
+    manager = data.CacheManager(cache_dir)
+    before = manager.get_total_bytes()
+
+    saved = manager.deduplicate()
+
+    assert saved == 2 * len('["QQQ", "SPY"]')
+    assert manager.get_total_bytes() == before - saved
+    with open(os.path.join(cache_dir, 'stock_universe', 'TopVolume_abc', '2024-03-27.json')) as f:
+        assert json.load(f) == ['QQQ', 'SPY']
+
+
+def test_evict(tmp_path):
+    cache_dir = str(tmp_path)
+    days = ['2024-03-25', '2024-03-26', '2024-03-27']
+    for i, day in enumerate(days):
+        _write_intraday(cache_dir, day, ['QQQ'])
+        _set_time(os.path.join(cache_dir, 'FIVE_MIN', day), time.time() - 86400 * (10 - i))
+    manager = data.CacheManager(cache_dir)
+    unit_bytes = manager.get_total_bytes() // 3
+    manager = data.CacheManager(cache_dir, budget_bytes=unit_bytes * 2)
+
+    freed = manager.evict()
+
+    assert freed == unit_bytes
+    assert sorted(os.listdir(os.path.join(cache_dir, 'FIVE_MIN'))) == days[1:]
+
+
+def test_evict_removes_days_from_intraday_db(mocker, tmp_path):
+    cache_dir = str(tmp_path)
+    days = ['2024-03-25', '2024-03-26', '2024-03-27']
+    # The middle day is least recently used, while the earlier day was used after it
+    for day, days_ago in zip(days, [9, 10, 8]):
+        _write_intraday(cache_dir, day, ['QQQ'])
+        _set_time(os.path.join(cache_dir, 'FIVE_MIN', day), time.time() - 86400 * days_ago)
+    for time_interval in data.TimeInterval:
+        os.makedirs(os.path.join(cache_dir, str(time_interval)), exist_ok=True)
+    db_file = os.path.join(cache_dir, 'FIVE_MIN', 'data.db')
+    mocker.patch.object(cache_client, 'get_db_file', side_effect=lambda t: os.path.join(cache_dir, str(t), 'data.db'))
+    client = cache_client.CacheClient(FakeDataClient())
+    for day in days:
+        client.get_daily('QQQ', pd.Timestamp(day), data.TimeInterval.FIVE_MIN)
+    client.close()
+    manager = data.CacheManager(cache_dir)
+    manager = data.CacheManager(cache_dir, budget_bytes=manager.get_total_bytes() - 1)
+
+    manager.evict()
+
+    partitions = [name for name in os.listdir(os.path.join(cache_dir, 'FIVE_MIN')) if not name.startswith('data.db')]
+    assert sorted(partitions) == ['2024-03-25', '2024-03-27']
+    conn = sqlite3.connect(db_file)
+    assert conn.execute('SELECT COUNT(*) FROM chart').fetchone()[0] == 2 * 288
+    assert conn.execute("SELECT time_range FROM time_range WHERE symbol = 'QQQ'").fetchone()[0] == \
+           '2024-03-25,2024-03-25;2024-03-27,2024-03-27'
+    conn.close()
+
+
+def test_evict_skips_recently_used(tmp_path):
+    cache_dir = str(tmp_path)
+    _write_intraday(cache_dir, '2024-03-26', ['QQQ'])
+
+    freed = data.CacheManager(cache_dir, budget_bytes=0).evict()
+
+    assert freed == 0
+    assert os.listdir(os.path.join(cache_dir, 'FIVE_MIN')) == ['2024-03-26']
+
+
+def test_compact(tmp_path):
+    cache_dir = str(tmp_path)
+    legacy_dir = os.path.join(cache_dir, 'DAY', '2023-01-01', '2024-01-01')
+    os.makedirs(legacy_dir)
+    with open(os.path.join(legacy_dir, 'history_QQQ.pickle'), 'wb') as f:
+        f.write(b'legacy')
+    partition_dir = os.path.join(cache_dir, 'FIVE_MIN', '2024-03-26')
+    os.makedirs(partition_dir)
+    df = FakeDataClient().get_daily('QQQ', pd.Timestamp('2024-03-26'), data.TimeInterval.FIVE_MIN)
+    df.to_pickle(os.path.join(partition_dir, 'history_QQQ.pickle'))
+
+    data.CacheManager(cache_dir).compact()
+
+    assert not os.path.exists(os.path.join(cache_dir, 'DAY', '2023-01-01'))
+    assert sorted(os.listdir(partition_dir)) == ['bars.npy', 'symbols.json']
+    assert len(BarStore(partition_dir).get('QQQ')) == len(df)
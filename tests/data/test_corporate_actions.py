@@ -0,0 +1,59 @@
+import datetime
+import os
+
+import pandas as pd
+
+import alpharius.data.utils as data_utils
+from alpharius.data import SplitCalendar, load_interday_dataset, load_intraday_dataset, load_intraday_range
+from alpharius.utils import TIME_ZONE
+from ..fakes import FakeDataClient
+
+
+class FakeSplitDataClient(FakeDataClient):
+
+    def __init__(self):
+        super().__init__()
+        self.get_splits_call_count = 0
+
+    def get_splits(self, start_date, end_date):
+        self.get_splits_call_count += 1
+        splits = pd.DataFrame([['A', datetime.date(2024, 1, 17), 2.0, 1.0]],
+                              columns=['Symbol', 'Date', 'Numerator', 'Denominator'])
+        return splits[(splits['Date'] >= start_date.date()) & (splits['Date'] <= end_date.date())]
+
+
+def test_sync_invalidates_split_symbols(mocker, tmp_path):
+    mocker.patch.object(data_utils, 'CACHE_DIR', str(tmp_path))
+    data_utils._interday_dataset_cache.clear()
+    start_time = pd.Timestamp('2024-01-01').tz_localize(TIME_ZONE)
+    end_time = pd.Timestamp('2024-02-01').tz_localize(TIME_ZONE)
+    days = [datetime.date(2024, 1, 16), datetime.date(2024, 1, 17)]
+    load_interday_dataset(['A', 'B'], start_time, end_time, FakeDataClient())
+    load_intraday_range(['A', 'B'], days, FakeDataClient())
+    # Directories other than partitions are skipped
+    os.makedirs(os.path.join(str(tmp_path), 'FIVE_MIN', 'stray'))
+    split_calendar = SplitCalendar(str(tmp_path))
+    split_client = FakeSplitDataClient()
+
+    new_splits = split_calendar.sync(split_client, datetime.date(2024, 2, 1))
+
+    # One year since the first sync is requested in ranges of 90 days
+    assert split_client.get_splits_call_count == 5
+    assert new_splits['Symbol'].tolist() == ['A']
+    data_client = FakeDataClient()
+    get_data_batch = mocker.spy(data_client, 'get_data_batch')
+    load_interday_dataset(['A', 'B'], start_time, end_time, data_client)
+    assert get_data_batch.call_count == 1
+    assert get_data_batch.call_args.args[0] == ['A']
+    assert get_data_batch.call_args.kwargs['end_time'].date() == datetime.date(2024, 1, 16)
+    load_intraday_dataset(['A', 'B'], pd.Timestamp(days[1]), data_client)
+    assert get_data_batch.call_count == 1
+    load_intraday_dataset(['A', 'B'], pd.Timestamp(days[0]), data_client)
+    assert get_data_batch.call_count == 2
+    assert get_data_batch.call_args.args[0] == ['A']
+
+    new_splits = split_calendar.sync(split_client, datetime.date(2024, 2, 5))
+
+    assert len(new_splits) == 0
+    assert len(split_calendar.get_splits()) == 1
+    assert split_client.get_splits_call_count == 6
@@ -0,0 +1,34 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from alpharius.data.decoding import decode_bars
+from alpharius.utils import TIME_ZONE
+
+
+def test_decode_strings():
+    rows = [('2024-03-26 16:00:00', 2, 3, 1, 2.5, 100),
+            ('2024-03-26 09:30:00', 1, 2, 0.5, 1.5, 200),
+            ('2024-03-27 09:30:00', 1, 2, 0.5, 1.5, 300)]
+
+    df = decode_bars(rows, pd.Timestamp('2024-03-26').tz_localize(TIME_ZONE),
+                     pd.Timestamp('2024-03-26 23:59').tz_localize(TIME_ZONE))
+
+    assert list(df.index) == [pd.Timestamp('2024-03-26 09:30:00').tz_localize(TIME_ZONE),
+                              pd.Timestamp('2024-03-26 16:00:00').tz_localize(TIME_ZONE)]
+    assert df['Close'].dtype == np.float32
+    assert df['Volume'].dtype == np.uint32
+    np.testing.assert_array_equal(df['Volume'].to_numpy(), [200, 100])
+
+
+def test_decode_datetimes():
+    t = datetime.datetime(2024, 3, 26, 20, 0, tzinfo=datetime.timezone.utc)
+    df = decode_bars([(t, 1, 2, 0.5, 1.5, 12.0)])
+    assert df.index[0] == pd.Timestamp('2024-03-26 16:00:00').tz_localize(TIME_ZONE)
+
+
+def test_decode_empty():
+    df = decode_bars([])
+    assert len(df) == 0
+    assert str(df.index.tz) == str(TIME_ZONE)
@@ -1,3 +1,4 @@
+import datetime
 import json
 import os
 import time
@@ -7,6 +8,8 @@ import pytest
 import requests
 
 import alpharius.data as data
+import alpharius.data.fmp_client as fmp_client
+from alpharius.utils import TIME_ZONE
 
 
 def fake_get(url, params, *args, **kwargs):
@@ -43,6 +46,26 @@ def fake_get(url, params, *args, **kwargs):
                 },
             ],
         }
+    elif 'historical-price-full' in url:
+        symbols = url.split('/')[-1].split(',')
+        content = {
+            'historicalStockList': [
+                {
+                    'symbol': symbol,
+                    'historical': [
+                        {
+                            'date': '2024-03-26',
+                            'open': 173.8,
+                            'high': 176.61,
+                            'low': 173.18,
+                            'close': 176.53,
+                            'volume': 21712747,
+                        },
+                    ],
+                }
+                for symbol in symbols
+            ],
+        }
     elif 'batch-quote-short' in url:
         symbols = params['symbols'].split(',')
         content = [
@@ -53,10 +76,19 @@ def fake_get(url, params, *args, **kwargs):
             }
             for symbol in symbols
         ]
+    elif 'eod-bulk' in url:
+        content = ('symbol,date,open,low,high,close,adjClose,volume\n'
+                   f'AAPL,{params["date"]},173.8,173.18,176.61,176.53,176.53,21712747\n'
+                   f'MSFT,{params["date"]},420.1,419.2,424.5,421.65,421.65,16725573\n')
+    elif 'splits-calendar' in url:
+        content = [
+            {'symbol': 'NVDA', 'date': '2024-06-10', 'numerator': 10, 'denominator': 1},
+            {'symbol': 'XYZ', 'date': '2024-06-11', 'numerator': 0, 'denominator': 0},
+        ]
     else:
         raise ValueError('url not recognized')
     response = requests.Response()
-    response._content = json.dumps(content).encode()
+    response._content = content.encode() if isinstance(content, str) else json.dumps(content).encode()
     response.status_code = 200
     return response
 
@@ -79,24 +111,77 @@ def test_get_data(time_interval):
     assert len(d) > 0
 
 
+def test_get_data_endpoint_follows_current_time(mocker):
+    get_current_time = mocker.patch.object(fmp_client, 'get_current_time',
+                                           return_value=pd.Timestamp('2024-04-01').tz_localize(TIME_ZONE))
+    client = data.FmpClient()
+    start_time, end_time = pd.Timestamp('2024-03-26'), pd.Timestamp('2024-03-27')
+
+    client.get_data('AAPL', start_time, end_time, data.TimeInterval.FIVE_MIN)
+    assert requests.get.call_args.args[0].endswith('stable/historical-chart/5min')
+
+    # The same client switches to the legacy endpoint once the range gets old
+    get_current_time.return_value = pd.Timestamp('2024-06-01').tz_localize(TIME_ZONE)
+    client.get_data('AAPL', start_time, end_time, data.TimeInterval.FIVE_MIN)
+    assert requests.get.call_args.args[0].endswith('api/v3/historical-chart/5min/AAPL')
+
+
 def test_get_daily():
     client = data.FmpClient()
     d = client.get_daily('AAPL', pd.Timestamp('2024-03-26'), data.TimeInterval.FIVE_MIN)
     assert len(d) > 0
 
 
+@pytest.mark.parametrize('time_interval',
+                         [data.TimeInterval.FIVE_MIN,
+                          data.TimeInterval.DAY])
+def test_get_data_batch(time_interval):
+    client = data.FmpClient()
+    symbols = ['AAPL', 'MSFT', 'GOOG', 'AMZN', 'META', 'NVDA']
+    d = client.get_data_batch(symbols,
+                              start_time=pd.Timestamp('2024-03-26'),
+                              end_time=pd.Timestamp('2024-03-27'),
+                              time_interval=time_interval)
+    assert list(d.keys()) == symbols
+    for df in d.values():
+        assert len(df) > 0
+
+
 def test_get_last_trades():
     client = data.FmpClient()
     prices = client.get_last_trades(['AAPL', 'MSFT'])
     assert len(prices) == 2
 
 
+def test_get_daily_bulk():
+    client = data.FmpClient()
+    bars = client.get_daily_bulk(pd.Timestamp('2024-03-26'))
+    assert bars['Symbol'].tolist() == ['AAPL', 'MSFT']
+    assert list(bars.columns) == ['Symbol'] + data.DATA_COLUMNS
+    assert bars.index[0] == pd.Timestamp('2024-03-26').tz_localize('America/New_York')
+
+
+def test_get_splits():
+    client = data.FmpClient()
+    splits = client.get_splits(pd.Timestamp('2024-06-01'), pd.Timestamp('2024-06-30'))
+    assert splits['Symbol'].tolist() == ['NVDA']
+    assert splits['Date'].iloc[0] == datetime.date(2024, 6, 10)
+    assert splits['Numerator'].iloc[0] == 10
+
+
+@pytest.mark.parametrize('time_interval', [data.TimeInterval.FIVE_MIN, data.TimeInterval.DAY])
+def test_get_call_rate(time_interval):
+    # Endpoint budgets of 600 calls per minute keep 60 calls for bursts
+    assert fmp_client.get_call_rate(time_interval) == 9
+
+
 def test_rate_limited(mocker):
     client = data.FmpClient()
-    mock_sleep = mocker.patch.object(time, 'sleep')
-    mocker.patch.object(time, 'time', side_effect=[100] * 3000 + [1000] * 2000)
+    mocker.patch.object(client, '_rate_limiter', data.RateLimiter(max_calls=20, period=1, burst=2))
+    start = time.time()
 
-    for _ in range(800):
+    for _ in range(10):
         client.get_daily('AAPL', pd.Timestamp('2024-03-26'), data.TimeInterval.FIVE_MIN)
 
-    assert mock_sleep.call_count > 0
+    # The first 2 calls burst and the other 8 are paced at 18 calls per second
+    assert time.time() - start > 0.4
@@ -0,0 +1,142 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import alpharius.data as data
+from ..fakes import FakeDataClient
+
+
+class SlowDataClient(FakeDataClient):
+
+    def __init__(self, latency: float, error: bool = False):
+        super().__init__()
+        self._latency = latency
+        self._error = error
+
+    def get_data(self, *args, **kwargs):
+        time.sleep(self._latency)
+        if self._error:
+            raise ValueError('fake data error')
+        return super().get_data(*args, **kwargs)
+
+    def get_last_trades(self, symbols):
+        time.sleep(self._latency)
+        return super().get_last_trades(symbols)
+
+
+_START_TIME = pd.Timestamp('2024-03-26 09:30')
+_END_TIME = pd.Timestamp('2024-03-26 16:00')
+
+
+def test_primary_fast():
+    primary, secondary = SlowDataClient(0), SlowDataClient(0)
+    client = data.HedgedClient(primary, secondary, initial_hedge_delay=1)
+
+    df = client.get_data('QQQ', _START_TIME, _END_TIME, data.TimeInterval.FIVE_MIN)
+
+    assert len(df) > 0
+    assert primary.get_data_call_count == 1
+    assert secondary.get_data_call_count == 0
+    assert client.hedged == 0
+
+
+def test_primary_slow():
+    primary, secondary = SlowDataClient(1), SlowDataClient(0)
+    client = data.HedgedClient(primary, secondary, initial_hedge_delay=0.1)
+
+    start = time.time()
+    res = client.get_data_batch(['QQQ', 'SPY'], _START_TIME, _END_TIME, data.TimeInterval.FIVE_MIN)
+
+    assert time.time() - start < 0.9
+    assert list(res.keys()) == ['QQQ', 'SPY']
+    assert secondary.get_data_call_count == 2
+    assert client.hedged == 1
+    assert client.secondary_wins == 1
+
+
+def test_hedge_delay_excludes_queue_time():
+    primary, secondary = SlowDataClient(0.3), SlowDataClient(0)
+    client = data.HedgedClient(primary, secondary, initial_hedge_delay=0.5, max_workers=1)
+    thread = threading.Thread(target=client.get_data,
+                              args=('SPY', _START_TIME, _END_TIME, data.TimeInterval.FIVE_MIN))
+    thread.start()
+    time.sleep(0.01)
+
+    # Queued for 0.3 seconds behind the other call, then takes 0.3 seconds itself
+    res = client.get_data_batch(['QQQ'], _START_TIME, _END_TIME, data.TimeInterval.FIVE_MIN)
+    thread.join()
+
+    assert list(res.keys()) == ['QQQ']
+    assert client.hedged == 0
+    assert secondary.get_data_call_count == 0
+
+
+def test_queued_primary_cancelled():
+    primary, secondary = SlowDataClient(1), SlowDataClient(0)
+    client = data.HedgedClient(primary, secondary, initial_hedge_delay=0.1, max_workers=1)
+    thread = threading.Thread(target=client.get_data,
+                              args=('SPY', _START_TIME, _END_TIME, data.TimeInterval.FIVE_MIN))
+    thread.start()
+    time.sleep(0.01)
+
+    res = client.get_data_batch(['QQQ', 'DIA'], _START_TIME, _END_TIME, data.TimeInterval.FIVE_MIN)
+    thread.join()
+
+    assert list(res.keys()) == ['QQQ', 'DIA']
+    assert client.secondary_wins == 2
+    # Waits for the primary call of SPY to finish, which is the only one sent
+    time.sleep(1.2)
+    assert primary.get_data_call_count == 1
+
+
+def test_primary_error():
+    primary, secondary = SlowDataClient(0, error=True), SlowDataClient(0)
+    client = data.HedgedClient(primary, secondary, initial_hedge_delay=1)
+
+    df = client.get_data('QQQ', _START_TIME, _END_TIME, data.TimeInterval.FIVE_MIN)
+
+    assert len(df) > 0
+    assert client.secondary_wins == 1
+
+
+def test_both_error():
+    primary, secondary = SlowDataClient(0, error=True), SlowDataClient(0, error=True)
+    client = data.HedgedClient(primary, secondary)
+
+    with pytest.raises(ValueError):
+        client.get_data('QQQ', _START_TIME, _END_TIME, data.TimeInterval.FIVE_MIN)
+
+
+def test_hedge_delay_from_latencies():
+    primary, secondary = SlowDataClient(0.01), SlowDataClient(0)
+    client = data.HedgedClient(primary, secondary, initial_hedge_delay=1)
+
+    for _ in range(20):
+        client.get_last_trades(['QQQ'])
+
+    assert client.get_hedge_delay('get_last_trades') < 1
+    assert client.get_hedge_delay('get_data') == 1
+
+
+def test_hedge_delay_ignores_failed_calls():
+    primary, secondary = SlowDataClient(0.01, error=True), SlowDataClient(0)
+    client = data.HedgedClient(primary, secondary, initial_hedge_delay=1)
+
+    for _ in range(20):
+        client.get_data('QQQ', _START_TIME, _END_TIME, data.TimeInterval.FIVE_MIN)
+
+    assert client.get_hedge_delay('get_data') == 1
+
+
+def test_normalize_dtypes():
+    primary = FakeDataClient()
+    client = data.HedgedClient(primary, FakeDataClient())
+
+    df = client.get_data('QQQ', _START_TIME, _END_TIME, data.TimeInterval.FIVE_MIN)
+
+    assert list(df.columns) == data.DATA_COLUMNS
+    assert df['Close'].dtype == np.float32
+    assert df['Volume'].dtype == np.uint32
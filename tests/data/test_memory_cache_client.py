@@ -0,0 +1,71 @@
+import time
+
+import pandas as pd
+
+import alpharius.data as data
+from ..fakes import FakeDataClient
+
+
+def test_get_data_cached():
+    client = FakeDataClient()
+    memory_cache_client = data.MemoryCacheClient(client)
+    start_time = pd.Timestamp('2024-03-26 09:30')
+    end_time = pd.Timestamp('2024-03-26 16:00')
+
+    df1 = memory_cache_client.get_data('QQQ', start_time, end_time, data.TimeInterval.FIVE_MIN)
+    df1['Close'] = 0
+    df2 = memory_cache_client.get_data('QQQ', start_time, end_time, data.TimeInterval.FIVE_MIN)
+
+    assert client.get_data_call_count == 1
+    assert memory_cache_client.cache_hit == 1
+    assert memory_cache_client.cache_miss == 1
+    assert (df2['Close'] != 0).all()
+
+
+def test_get_data_batch_loads_missing():
+    client = FakeDataClient()
+    memory_cache_client = data.MemoryCacheClient(client)
+    start_time = pd.Timestamp('2024-03-26 09:30')
+    end_time = pd.Timestamp('2024-03-26 16:00')
+
+    memory_cache_client.get_data('QQQ', start_time, end_time, data.TimeInterval.FIVE_MIN)
+    res = memory_cache_client.get_data_batch(['SPY', 'QQQ'], start_time, end_time, data.TimeInterval.FIVE_MIN)
+
+    assert list(res.keys()) == ['SPY', 'QQQ']
+    assert client.get_data_call_count == 2
+
+
+def test_bounded_by_bytes():
+    client = FakeDataClient()
+    start_time = pd.Timestamp('2024-03-26 09:30')
+    end_time = pd.Timestamp('2024-03-26 16:00')
+    df = client.get_data('QQQ', start_time, end_time, data.TimeInterval.FIVE_MIN)
+    size = int(df.memory_usage(index=True).sum())
+    memory_cache_client = data.MemoryCacheClient(client, max_bytes=size * 2)
+
+    for symbol in ['QQQ', 'SPY', 'DIA']:
+        memory_cache_client.get_data(symbol, start_time, end_time, data.TimeInterval.FIVE_MIN)
+
+    assert memory_cache_client.current_bytes <= size * 2
+    memory_cache_client.get_data('QQQ', start_time, end_time, data.TimeInterval.FIVE_MIN)
+    assert memory_cache_client.cache_hit == 0
+
+
+def test_today_data_expires(mocker):
+    client = FakeDataClient()
+    memory_cache_client = data.MemoryCacheClient(client, historical_ttl=60, today_ttl=0.1)
+    mocker.patch('alpharius.data.memory_cache_client.get_today',
+                 return_value=pd.Timestamp('2024-03-26').tz_localize('America/New_York'))
+    yesterday_start = pd.Timestamp('2024-03-25 09:30')
+    yesterday_end = pd.Timestamp('2024-03-25 16:00')
+    today_start = pd.Timestamp('2024-03-26 09:30')
+    today_end = pd.Timestamp('2024-03-26 16:00')
+
+    memory_cache_client.get_data('QQQ', yesterday_start, yesterday_end, data.TimeInterval.FIVE_MIN)
+    memory_cache_client.get_data('QQQ', today_start, today_end, data.TimeInterval.FIVE_MIN)
+    time.sleep(0.2)
+    memory_cache_client.get_data('QQQ', yesterday_start, yesterday_end, data.TimeInterval.FIVE_MIN)
+    memory_cache_client.get_data('QQQ', today_start, today_end, data.TimeInterval.FIVE_MIN)
+
+    assert memory_cache_client.cache_hit == 1
+    assert client.get_data_call_count == 3
@@ -0,0 +1,25 @@
+import numpy as np
+import pandas as pd
+
+import alpharius.data as data
+from alpharius.utils import TIME_ZONE
+from ..fakes import FakeDataClient
+
+
+def test_from_dataset():
+    client = FakeDataClient()
+    qqq = client.get_data('QQQ', pd.Timestamp('2024-04-01'), pd.Timestamp('2024-04-20'), data.TimeInterval.DAY)
+    spy = client.get_data('SPY', pd.Timestamp('2024-04-10'), pd.Timestamp('2024-04-20'), data.TimeInterval.DAY)
+
+    panel = data.InterdayPanel.from_dataset({'QQQ': qqq, 'SPY': spy})
+
+    assert panel.values.shape == (2, len(qqq), len(data.DATA_COLUMNS))
+    assert panel.values.dtype == np.float32
+    assert panel.index.equals(qqq.index)
+    spy_row = panel.get_row('SPY')
+    day_ind = panel.get_day_index(pd.Timestamp('2024-04-10').tz_localize(TIME_ZONE))
+    assert np.all(np.isnan(panel.get_column('Close')[spy_row, :day_ind]))
+    np.testing.assert_array_equal(panel.get_column('Close')[spy_row, day_ind:], spy['Close'].to_numpy())
+    assert panel.get_num_bars()[spy_row, -1] == len(spy)
+    assert panel.get_day_index(pd.Timestamp('2024-04-13')) is None
+    pd.testing.assert_frame_equal(panel.get_frame('SPY'), spy, check_freq=False)
@@ -0,0 +1,70 @@
+import threading
+import time
+
+import alpharius.data as data
+
+
+def _acquire_in_thread(limiter, endpoint, priority, flow, order):
+    def run():
+        with limiter.acquire(endpoint, priority, flow):
+            order.append(flow)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_priority_first():
+    limiter = data.RateLimiter(max_calls=20, period=1, burst=1)
+    order = []
+    with limiter.acquire('quote'):
+        pass
+    threads = [_acquire_in_thread(limiter, 'quote', data.Priority.BACKGROUND, 'backfill', order)]
+    time.sleep(0.01)
+    threads.append(_acquire_in_thread(limiter, 'quote', data.Priority.REALTIME, 'live', order))
+
+    for thread in threads:
+        thread.join()
+
+    assert order == ['live', 'backfill']
+
+
+def test_round_robin_flows():
+    limiter = data.RateLimiter(max_calls=100, period=1, burst=1)
+    order = []
+    with limiter.acquire('quote'):
+        pass
+    threads = []
+    for flow in ['a', 'a', 'a', 'b']:
+        threads.append(_acquire_in_thread(limiter, 'quote', data.Priority.BACKGROUND, flow, order))
+        time.sleep(0.001)
+
+    for thread in threads:
+        thread.join()
+
+    assert order[:2] in (['a', 'b'], ['b', 'a'])
+
+
+def test_endpoint_budget():
+    limiter = data.RateLimiter(max_calls=1000, period=1, budgets={'chart': 20})
+    start = time.time()
+
+    for _ in range(10):
+        with limiter.acquire('chart'):
+            pass
+    chart_time = time.time() - start
+    start = time.time()
+    for _ in range(10):
+        with limiter.acquire('quote'):
+            pass
+    quote_time = time.time() - start
+
+    assert chart_time > 0.3
+    assert quote_time < 0.1
+
+
+def test_get_rate():
+    limiter = data.RateLimiter(max_calls=700, period=60, budgets={'chart': 600})
+
+    assert limiter.get_rate('chart') == (600 - 60) / 60
+    assert limiter.get_rate('quote') == (700 - 70) / 60
@@ -0,0 +1,87 @@
+import pandas as pd
+import pytest
+import requests
+
+import alpharius.data as data
+from alpharius.data import replay_server
+
+
+@pytest.fixture
+def server():
+    server = replay_server.ReplayServer(replay_server.SyntheticClient())
+    server.start()
+    yield server
+    server.close()
+
+
+def test_get_data(server):
+    client = data.FmpClient(api_key='fake_replay_key', base_url=server.url)
+
+    df = client.get_data('QQQ', pd.Timestamp('2024-03-25'), pd.Timestamp('2024-03-26 23:59'),
+                         data.TimeInterval.FIVE_MIN)
+
+    assert len(df) == 78 * 2
+    assert list(df.columns) == data.DATA_COLUMNS
+    assert df.index.is_monotonic_increasing
+
+
+@pytest.mark.parametrize('time_interval, expected_len',
+                         [(data.TimeInterval.HOUR, 14),
+                          (data.TimeInterval.DAY, 2)])
+def test_get_data_interval(server, time_interval, expected_len):
+    client = data.FmpClient(api_key='fake_replay_key', base_url=server.url)
+
+    df = client.get_data('QQQ', pd.Timestamp('2024-03-25'), pd.Timestamp('2024-03-26 23:59'), time_interval)
+
+    assert len(df) == expected_len
+
+
+def test_get_data_batch(server):
+    client = data.FmpClient(api_key='fake_replay_key', base_url=server.url)
+    symbols = ['QQQ', 'SPY', 'DIA', 'IWM', 'TQQQ', 'AAPL']
+
+    res = client.get_data_batch(symbols, pd.Timestamp('2024-03-01'), pd.Timestamp('2024-03-29'),
+                                data.TimeInterval.DAY)
+
+    assert list(res.keys()) == symbols
+    assert all(len(df) == 21 for df in res.values())
+
+
+def test_get_last_trades(server):
+    client = data.FmpClient(api_key='fake_replay_key', base_url=server.url)
+
+    res = client.get_last_trades(['QQQ', 'SPY'])
+
+    assert list(res.keys()) == ['QQQ', 'SPY']
+
+
+def test_rate_limited():
+    server = replay_server.ReplayServer(replay_server.SyntheticClient(), max_calls=2)
+    server.start()
+    url = server.url + 'stable/batch-quote-short'
+    statuses = [requests.get(url, params={'symbols': 'QQQ'}).status_code for _ in range(3)]
+    server.close()
+
+    assert statuses == [200, 200, 429]
+    assert server.stats['rate_limited'] == 1
+
+
+def test_error_injection():
+    server = replay_server.ReplayServer(replay_server.SyntheticClient(), error_rate=1)
+    server.start()
+    response = requests.get(server.url + 'stable/batch-quote-short', params={'symbols': 'QQQ'})
+    server.close()
+
+    assert response.status_code == 500
+
+
+def test_unexpected_error(mocker):
+    data_client = replay_server.SyntheticClient()
+    mocker.patch.object(data_client, 'get_data', side_effect=RuntimeError('fake error'))
+    server = replay_server.ReplayServer(data_client)
+    server.start()
+    response = requests.get(server.url + 'stable/historical-chart/5min',
+                            params={'symbol': 'QQQ', 'from': '2024-03-25', 'to': '2024-03-25'})
+    server.close()
+
+    assert response.status_code == 500
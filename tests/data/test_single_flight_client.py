@@ -0,0 +1,68 @@
+import threading
+import time
+from concurrent import futures
+
+import pandas as pd
+import pytest
+
+import alpharius.data as data
+from ..fakes import FakeDataClient
+
+
+class SlowDataClient(FakeDataClient):
+
+    def __init__(self):
+        super().__init__()
+        self.get_data_batch_call_count = 0
+        self._lock = threading.Lock()
+
+    def get_data(self, *args, **kwargs):
+        time.sleep(0.2)
+        with self._lock:
+            return super().get_data(*args, **kwargs)
+
+    def get_data_batch(self, *args, **kwargs):
+        with self._lock:
+            self.get_data_batch_call_count += 1
+        return super().get_data_batch(*args, **kwargs)
+
+
+def test_get_data_shared():
+    client = SlowDataClient()
+    single_flight_client = data.SingleFlightClient(client)
+    start_time = pd.Timestamp('2024-03-26 09:30')
+    end_time = pd.Timestamp('2024-03-26 16:00')
+
+    with futures.ThreadPoolExecutor(max_workers=4) as pool:
+        tasks = [pool.submit(single_flight_client.get_data, 'QQQ', start_time, end_time,
+                             data.TimeInterval.FIVE_MIN) for _ in range(4)]
+        results = [task.result() for task in tasks]
+
+    assert client.get_data_call_count == 1
+    for result in results[1:]:
+        pd.testing.assert_frame_equal(result, results[0])
+
+
+def test_get_data_batch_joins_get_data():
+    client = SlowDataClient()
+    single_flight_client = data.SingleFlightClient(client)
+    start_time = pd.Timestamp('2024-03-26 09:30')
+    end_time = pd.Timestamp('2024-03-26 16:00')
+
+    with futures.ThreadPoolExecutor(max_workers=2) as pool:
+        task = pool.submit(single_flight_client.get_data, 'QQQ', start_time, end_time, data.TimeInterval.FIVE_MIN)
+        time.sleep(0.05)
+        res = single_flight_client.get_data_batch(['QQQ', 'SPY'], start_time, end_time, data.TimeInterval.FIVE_MIN)
+        task.result()
+
+    assert client.get_data_call_count == 2
+    assert list(res.keys()) == ['QQQ', 'SPY']
+
+
+def test_error_shared():
+    client = SlowDataClient()
+    single_flight_client = data.SingleFlightClient(client)
+
+    with pytest.raises(ValueError):
+        single_flight_client.get_data('QQQ', pd.Timestamp('2024-03-26'), pd.Timestamp('2024-03-27'), None)
+    assert client.get_data_call_count == 1
@@ -2,8 +2,14 @@ import datetime
 
 import alpaca.trading as trading
 import pandas as pd
+import pytest
 
-from alpharius.data import get_transactions
+import alpharius.data.utils as data_utils
+from alpharius.data import (
+    DataError, get_transactions, ingest_interday_bulk, load_interday_dataset, load_intraday_dataset, load_intraday_range,
+)
+from alpharius.data.rate_limiter import Priority
+from alpharius.utils import TIME_ZONE
 from ..fakes import get_order, FakeDataClient
 
 
@@ -23,3 +29,194 @@ def test_get_transactions(mocker, mock_trading_client):
 
     assert get_orders.call_count == 2
     assert len(transactions) == 400
+
+
+def test_load_interday_dataset_appends_new_days(mocker, tmp_path):
+    mocker.patch.object(data_utils, 'CACHE_DIR', str(tmp_path))
+    data_utils._interday_dataset_cache.clear()
+    data_client = FakeDataClient()
+    get_data_batch = mocker.spy(data_client, 'get_data_batch')
+    start_time = pd.Timestamp('2024-01-01').tz_localize(TIME_ZONE)
+
+    data = load_interday_dataset(['A', 'B'], start_time,
+                                 pd.Timestamp('2024-02-01').tz_localize(TIME_ZONE), data_client)
+    assert len(data['A']) == 24
+    assert get_data_batch.call_args.kwargs['start_time'].date() == datetime.date(2024, 1, 1)
+
+    data = load_interday_dataset(['A', 'B'], start_time,
+                                 pd.Timestamp('2024-02-05').tz_localize(TIME_ZONE), data_client)
+    assert len(data['B']) == 26
+    assert get_data_batch.call_args.kwargs['start_time'].date() == datetime.date(2024, 2, 2)
+    assert get_data_batch.call_args.kwargs['end_time'].date() == datetime.date(2024, 2, 5)
+
+
+class FakeBulkDataClient(FakeDataClient):
+
+    def get_daily_bulk(self, day):
+        index = pd.DatetimeIndex([day] * 3).tz_localize(TIME_ZONE)
+        return pd.DataFrame({'Symbol': ['A', 'B', 'C'], 'Open': 1.0, 'High': 2.0, 'Low': 0.5,
+                             'Close': 1.5, 'Volume': 100}, index=index)
+
+
+def test_ingest_interday_bulk(mocker, tmp_path):
+    mocker.patch.object(data_utils, 'CACHE_DIR', str(tmp_path))
+    data_utils._interday_dataset_cache.clear()
+    start_time = pd.Timestamp('2024-01-01').tz_localize(TIME_ZONE)
+    load_interday_dataset(['A', 'B'], start_time, pd.Timestamp('2024-02-01').tz_localize(TIME_ZONE),
+                          FakeDataClient())
+    load_interday_dataset(['C'], start_time, pd.Timestamp('2024-01-15').tz_localize(TIME_ZONE),
+                          FakeDataClient())
+
+    num_extended = ingest_interday_bulk(pd.Timestamp('2024-02-02'), pd.Timestamp('2024-02-01'),
+                                        FakeBulkDataClient())
+
+    assert num_extended == 2
+    data_utils._interday_dataset_cache.clear()
+    data_client = FakeDataClient()
+    get_data_batch = mocker.spy(data_client, 'get_data_batch')
+    data = load_interday_dataset(['A', 'B'], start_time, pd.Timestamp('2024-02-02').tz_localize(TIME_ZONE),
+                                 data_client)
+    assert get_data_batch.call_count == 0
+    assert len(data['A']) == 25
+    assert data['A']['Close'].iloc[-1] == 1.5
+
+
+def test_ingest_interday_bulk_missing_symbol(mocker, tmp_path):
+    mocker.patch.object(data_utils, 'CACHE_DIR', str(tmp_path))
+    data_utils._interday_dataset_cache.clear()
+    start_time = pd.Timestamp('2024-01-01').tz_localize(TIME_ZONE)
+    load_interday_dataset(['A', 'B'], start_time, pd.Timestamp('2024-02-01').tz_localize(TIME_ZONE),
+                          FakeDataClient())
+    bulk_data_client = FakeBulkDataClient()
+    bulk = bulk_data_client.get_daily_bulk(pd.Timestamp('2024-02-02'))
+    mocker.patch.object(bulk_data_client, 'get_daily_bulk', return_value=bulk[bulk['Symbol'] != 'B'])
+
+    num_extended = ingest_interday_bulk(pd.Timestamp('2024-02-02'), pd.Timestamp('2024-02-01'),
+                                        bulk_data_client)
+
+    assert num_extended == 1
+    data_utils._interday_dataset_cache.clear()
+    data_client = FakeDataClient()
+    get_data_batch = mocker.spy(data_client, 'get_data_batch')
+    data = load_interday_dataset(['A', 'B'], start_time, pd.Timestamp('2024-02-02').tz_localize(TIME_ZONE),
+                                 data_client)
+    assert get_data_batch.call_count == 1
+    assert get_data_batch.call_args.args[0] == ['B']
+    # 23 days in January, and the first two days in February
+    assert len(data['B']) == 25
+    assert data['B'].index[-1].date() == datetime.date(2024, 2, 2)
+
+
+def test_ingest_interday_bulk_without_day(mocker, tmp_path):
+    mocker.patch.object(data_utils, 'CACHE_DIR', str(tmp_path))
+    data_utils._interday_dataset_cache.clear()
+    start_time = pd.Timestamp('2024-01-01').tz_localize(TIME_ZONE)
+    load_interday_dataset(['A'], start_time, pd.Timestamp('2024-02-01').tz_localize(TIME_ZONE),
+                          FakeDataClient())
+
+    bulk_data_client = FakeBulkDataClient()
+    # The vendor still serves bars of the previous day
+    mocker.patch.object(bulk_data_client, 'get_daily_bulk',
+                        return_value=bulk_data_client.get_daily_bulk(pd.Timestamp('2024-02-01')))
+
+    with pytest.raises(DataError):
+        ingest_interday_bulk(pd.Timestamp('2024-02-02'), pd.Timestamp('2024-02-01'), bulk_data_client)
+
+    assert data_utils._get_history_store().get_coverage('A')[1] == datetime.date(2024, 2, 1)
+
+
+def test_load_interday_dataset_republishes_after_ingest(mocker, tmp_path):
+    mocker.patch.object(data_utils, 'CACHE_DIR', str(tmp_path))
+    data_utils._interday_dataset_cache.clear()
+    today = pd.Timestamp('2024-02-02').tz_localize(TIME_ZONE)
+    mocker.patch.object(data_utils, 'get_today', return_value=today)
+    mocker.patch.object(data_utils, 'get_current_time', return_value=today + datetime.timedelta(hours=17))
+    start_time = pd.Timestamp('2024-01-01').tz_localize(TIME_ZONE)
+    load_interday_dataset(['A', 'B'], start_time, today, FakeDataClient())
+
+    ingest_interday_bulk(pd.Timestamp('2024-02-02'), pd.Timestamp('2024-02-01'), FakeBulkDataClient())
+    data_client = FakeDataClient()
+    get_data_batch = mocker.spy(data_client, 'get_data_batch')
+    data = load_interday_dataset(['A', 'B'], start_time, today, data_client)
+
+    assert get_data_batch.call_count == 0
+    assert data['A'].index[-1] == today
+    assert data['A']['Close'].iloc[-1] == 1.5
+
+
+def test_load_interday_dataset_republishes_after_close(mocker, tmp_path):
+    mocker.patch.object(data_utils, 'CACHE_DIR', str(tmp_path))
+    data_utils._interday_dataset_cache.clear()
+    today = pd.Timestamp('2024-02-05').tz_localize(TIME_ZONE)
+    mocker.patch.object(data_utils, 'get_today', return_value=today)
+    get_current_time = mocker.patch.object(data_utils, 'get_current_time',
+                                           return_value=today + datetime.timedelta(hours=12))
+    start_time = pd.Timestamp('2024-01-01').tz_localize(TIME_ZONE)
+    data_client = FakeDataClient()
+    get_data_batch = mocker.spy(data_client, 'get_data_batch')
+    load_interday_dataset(['A', 'B'], start_time, today, data_client)
+    assert get_data_batch.call_args.kwargs['end_time'].date() == datetime.date(2024, 2, 4)
+    num_calls = get_data_batch.call_count
+
+    get_current_time.return_value = today + datetime.timedelta(hours=17)
+    data_utils._interday_dataset_cache.clear()
+    load_interday_dataset(['A', 'B'], start_time, today, data_client)
+
+    # Only the day closed since the first load is fetched, for both symbols
+    calls = get_data_batch.call_args_list[num_calls:]
+    assert sorted(symbol for call in calls for symbol in call.args[0]) == ['A', 'B']
+    assert all(call.kwargs['start_time'].date() == datetime.date(2024, 2, 5) for call in calls)
+    assert all(call.kwargs['end_time'].date() == datetime.date(2024, 2, 5) for call in calls)
+
+
+def test_load_interday_dataset_attaches_snapshot(mocker, tmp_path):
+    mocker.patch.object(data_utils, 'CACHE_DIR', str(tmp_path))
+    data_utils._interday_dataset_cache.clear()
+    start_time = pd.Timestamp('2024-01-01').tz_localize(TIME_ZONE)
+    end_time = pd.Timestamp('2024-02-01').tz_localize(TIME_ZONE)
+    data = load_interday_dataset(['A', 'B'], start_time, end_time, FakeDataClient())
+
+    # Simulates another process loading the same window
+    data_utils._interday_dataset_cache.clear()
+    data_client = FakeDataClient()
+    get_data_batch = mocker.spy(data_client, 'get_data_batch')
+    attached = load_interday_dataset(['A', 'B'], start_time, end_time, data_client)
+
+    assert get_data_batch.call_count == 0
+    assert len(attached['A']) == 24
+    pd.testing.assert_frame_equal(attached['B'], data['B'])
+
+
+def test_load_intraday_range(mocker, tmp_path):
+    mocker.patch.object(data_utils, 'CACHE_DIR', str(tmp_path))
+    data_client = FakeDataClient()
+    get_data_batch = mocker.spy(data_client, 'get_data_batch')
+    days = [datetime.date(2024, 4, 15), datetime.date(2024, 4, 16), datetime.date(2024, 4, 17)]
+
+    load_intraday_range(['A', 'B'], days, data_client)
+
+    # Symbols may be split into several batches, each requesting the whole range
+    calls = get_data_batch.call_args_list
+    assert sorted(symbol for call in calls for symbol in call.args[0]) == ['A', 'B']
+    assert all(call.kwargs['start_time'].date() == days[0] for call in calls)
+    assert all(call.kwargs['end_time'].date() == days[-1] for call in calls)
+    num_calls = get_data_batch.call_count
+    dataset = load_intraday_dataset(['A', 'B'], pd.Timestamp(days[1]), data_client)
+    assert get_data_batch.call_count == num_calls
+    assert len(dataset['B']) > 0
+    assert all(t.date() == days[1] for t in dataset['B'].index)
+
+    load_intraday_range(['A', 'C'], days, data_client)
+    assert [symbol for call in get_data_batch.call_args_list[num_calls:] for symbol in call.args[0]] == ['C']
+
+
+def test_get_default_data_client_shared(mocker):
+    mocker.patch.object(data_utils, '_default_data_clients', dict())
+    async_fmp_client = mocker.patch.object(data_utils, 'AsyncFmpClient')
+    mocker.patch.object(data_utils, 'CacheClient')
+
+    client = data_utils.get_default_data_client()
+
+    assert data_utils.get_default_data_client() is client
+    assert data_utils.get_default_data_client(Priority.REALTIME) is not client
+    assert async_fmp_client.call_count == 2
@@ -342,6 +342,7 @@ class FakeProcessor(trade.Processor):
     def __init__(self, trading_frequency):
         super().__init__('fake_output_dir')
         self.get_stock_universe_call_count = 0
+        self.stock_universe_days = []
         self.process_data_call_count = 0
         self.trading_frequency = trading_frequency
 
@@ -350,6 +351,7 @@ class FakeProcessor(trade.Processor):
 
     def get_stock_universe(self, view_time):
         self.get_stock_universe_call_count += 1
+        self.stock_universe_days.append(view_time.date())
         return ['QQQ', 'SPY', 'DIA']
 
     def process_data(self, context):
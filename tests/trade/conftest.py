@@ -24,3 +24,4 @@ def mock_os(mocker):
     mocker.patch('builtins.open', mocker.mock_open(read_data='data'))
     mocker.patch.object(os.path, 'isfile', return_value=False)
     mocker.patch.object(os, 'makedirs')
+    mocker.patch.object(os, 'replace')
@@ -3,7 +3,9 @@ import pandas as pd
 import pytest
 
 from alpharius import trade
+from alpharius.data import TimeInterval
 from alpharius.trade import PROCESSOR_FACTORIES
+from alpharius.utils import TIME_ZONE
 from ..fakes import FakeProcessorFactory, FakeDataClient
 
 
@@ -37,6 +39,21 @@ def test_run_success(trading_frequency):
     assert fake_processor.process_data_call_count > 0
 
 
+def test_run_computes_current_universe_first():
+    fake_processor_factory = FakeProcessorFactory(trade.TradingFrequency.FIVE_MIN)
+    fake_processor = fake_processor_factory.processor
+    backtesting = trade.Backtest(start_date=pd.to_datetime('2021-03-17'),
+                                 end_date=pd.to_datetime('2021-03-24'),
+                                 processor_factories=[fake_processor_factory],
+                                 data_client=FakeDataClient())
+
+    backtesting.run()
+
+    # Universes of upcoming days are computed for prefetching after the current day
+    days = [day.strftime('%F') for day in fake_processor.stock_universe_days]
+    assert days[:6] == ['2021-03-17', '2021-03-18', '2021-03-19', '2021-03-22', '2021-03-23', '2021-03-18']
+
+
 def test_run_with_processors():
     backtesting = trade.Backtest(start_date=pd.to_datetime('2021-03-17'),
                                  end_date=pd.to_datetime('2021-03-18'),
@@ -44,3 +61,40 @@ def test_run_with_processors():
                                  data_client=FakeDataClient())
 
     backtesting.run()
+
+
+def test_intraday_prefetcher():
+    data_client = FakeDataClient()
+    prefetcher = trade.backtest.IntradayPrefetcher(data_client)
+    day = pd.to_datetime('2021-03-17').date()
+
+    prefetcher.schedule([day], {'A', 'B'})
+    assert day in prefetcher
+    intraday_dataset = prefetcher.get(day, {'A', 'C'})
+    prefetcher.close()
+
+    assert day not in prefetcher
+    assert set(intraday_dataset) == {'A', 'B', 'C'}
+    assert len(intraday_dataset['C']) > 0
+
+
+def test_intraday_grid():
+    day = pd.Timestamp('2021-03-17')
+    intraday_data = FakeDataClient().get_daily('A', day, TimeInterval.FIVE_MIN)
+    market_open = pd.Timestamp('2021-03-17 09:30').tz_localize(TIME_ZONE)
+    market_close = pd.Timestamp('2021-03-17 16:00').tz_localize(TIME_ZONE)
+    # The bar starting at 10:00 is missing
+    intraday_datas = {'A': intraday_data.drop(market_open + pd.Timedelta(minutes=30)),
+                      'B': intraday_data.iloc[:0]}
+
+    grid = trade.backtest.IntradayGrid(intraday_datas, market_open, market_close)
+
+    assert grid.num_intervals == 78
+    lookback, current_price = grid.get_lookback('A', 1)
+    assert lookback.index[-1] == market_open + pd.Timedelta(minutes=5)
+    assert current_price == lookback['Close'].iloc[-1]
+    assert grid.get_lookback('A', 6) is None
+    assert grid.get_lookback('A', 77)[0].index[-1] == market_close - pd.Timedelta(minutes=5)
+    assert lookback.index[grid.get_market_open_index('A', 1)] == market_open
+    assert grid.get_lookback('B', 0) is None
+    assert grid.get_lookback('C', 0) is None
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+from alpharius.data import TimeInterval
+from alpharius.trade import common
+from ..fakes import FakeDataClient
+
+
+def _create_context(**kwargs):
+    intraday_lookback = FakeDataClient().get_daily('A', pd.Timestamp('2021-03-17'), TimeInterval.FIVE_MIN)
+    intraday_lookback = intraday_lookback.between_time('04:00', '10:00')
+    interday_lookback = FakeDataClient().get_data('A', pd.Timestamp('2021-02-01'), pd.Timestamp('2021-03-16'),
+                                                  TimeInterval.DAY)
+    return common.Context(symbol='A',
+                          current_time=intraday_lookback.index[-1],
+                          current_price=intraday_lookback['Close'].iloc[-1],
+                          interday_lookback=interday_lookback,
+                          intraday_lookback=intraday_lookback,
+                          **kwargs)
+
+
+def test_context_columns():
+    context = _create_context()
+
+    closes = context.get_intraday_values('Close')
+
+    assert closes == context.intraday_lookback['Close'].tolist()
+    assert context.get_intraday_values('Close') is closes
+    assert context.get_interday_array('Close') is context.get_interday_array('Close')
+    assert context.prev_day_close == context.interday_lookback['Close'].iloc[-1]
+    assert not hasattr(context, '__dict__')
+
+
+def test_context_market_open_index():
+    context = _create_context()
+
+    assert context.intraday_lookback.index[context.market_open_index].time() == common.MARKET_OPEN
+    assert context.today_open == context.intraday_lookback['Open'].iloc[context.market_open_index]
+    assert _create_context(market_open_index=None).market_open_index is None
+
+
+def test_compute_indicators():
+    context = _create_context()
+    interday_lookback = context.interday_lookback
+    highs = interday_lookback['High'].to_numpy(dtype=np.float64)[-common.DAYS_IN_A_MONTH:]
+    lows = interday_lookback['Low'].to_numpy(dtype=np.float64)[-common.DAYS_IN_A_MONTH:]
+
+    indicators = common.compute_indicators(interday_lookback)
+
+    assert indicators.shape == (len(interday_lookback) + 1, len(common.INDICATORS))
+    assert np.isnan(indicators[0]).all()
+    np.testing.assert_allclose(indicators[-1, common.INDICATORS.index('h2l_std')], np.std(lows / highs - 1))
+    np.testing.assert_allclose(context.h2l_avg, np.average(lows / highs - 1))
+    np.testing.assert_allclose(context.l2h_avg, np.average(highs / lows - 1))
+    table = common.IndicatorTable({'A': interday_lookback})
+    np.testing.assert_array_equal(table.get('A', 3), indicators[3])
+    assert table.get('B', 3) is None
+
+
+def test_context_indicator_over_last_window(mocker):
+    context = _create_context()
+    expected = common.compute_indicators(context.interday_lookback)[-1]
+    compute_indicators = mocker.spy(common, 'compute_indicators')
+
+    for i, name in enumerate(common.INDICATORS):
+        np.testing.assert_allclose(context.get_indicator(name), expected[i], rtol=1e-6)
+
+    compute_indicators.assert_called_once()
+    assert len(compute_indicators.call_args.args[0]) == common.DAYS_IN_A_MONTH + 1
@@ -153,7 +153,8 @@ def test_update_db(mocker, mock_engine):
 def test_complete_intraday_data(mocker):
     fake_processor_factory = FakeProcessorFactory(trade.TradingFrequency.CLOSE_TO_OPEN)
     patch_market_close(mocker, next_close=1615988100)
-    mocker.patch.object(FakeDataClient, 'get_daily', return_value=pd.DataFrame())
+    mocker.patch.object(FakeDataClient, 'get_daily_batch',
+                        side_effect=lambda symbols, *args: {symbol: pd.DataFrame() for symbol in symbols})
     live = trade.Live(processor_factories=[fake_processor_factory], data_client=FakeDataClient())
     live.run()
     for df in live._intraday_data.values():
@@ -164,11 +165,12 @@ def test_adjust_price(mocker):
     fake_processor_factory = FakeProcessorFactory(trade.TradingFrequency.CLOSE_TO_OPEN)
     patch_market_close(mocker, next_close=1615988100)
     columns = data.DATA_COLUMNS
+    df = pd.DataFrame(index=[pd.to_datetime(1615987800, utc=True, unit='s').tz_convert(TIME_ZONE)],
+                      data=[[1] * len(columns)], columns=columns)
     mocker.patch.object(
         FakeDataClient,
-        'get_daily',
-        return_value=pd.DataFrame(index=[pd.to_datetime(1615987800, utc=True, unit='s').tz_convert(TIME_ZONE)],
-                                  data=[[1] * len(columns)], columns=columns),
+        'get_daily_batch',
+        side_effect=lambda symbols, *args: {symbol: df for symbol in symbols},
     )
     live = trade.Live(processor_factories=[fake_processor_factory], data_client=FakeDataClient())
     live.run()
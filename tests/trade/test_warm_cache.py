@@ -0,0 +1,56 @@
+import datetime
+
+from alpharius import trade
+from alpharius.data import TimeInterval
+from alpharius.trade import warm_cache
+from ..fakes import FakeProcessorFactory, FakeDataClient
+
+
+def _plan_all_missing(symbols, days):
+    return {(days[0], days[-1]): sorted(symbols)}
+
+
+def _create_warmer():
+    return warm_cache.CacheWarmer(start_date='2021-03-17',
+                                  end_date='2021-03-24',
+                                  processor_factories=[FakeProcessorFactory(trade.TradingFrequency.FIVE_MIN)],
+                                  data_client=FakeDataClient())
+
+
+def test_plan_interday(mocker):
+    start_date = datetime.date(2020, 3, 17)
+    end_date = datetime.date(2021, 3, 23)
+    mocker.patch.object(warm_cache, 'plan_interday_history',
+                        return_value={((start_date, end_date),): ['A', 'B', 'C', 'D', 'E', 'F']})
+
+    plan = _create_warmer().plan_interday()
+
+    assert plan.time_interval == TimeInterval.DAY
+    assert plan.num_missing == 6
+    assert plan.num_calls == 2
+    assert plan.estimated_seconds > 0
+
+
+def test_plan_intraday(mocker):
+    mocker.patch.object(warm_cache, 'plan_intraday_range', side_effect=_plan_all_missing)
+
+    plan = _create_warmer().plan_intraday()
+
+    # Days are grouped as [03-17] and [03-18, 03-19, 03-22, 03-23]
+    assert plan.time_interval == TimeInterval.FIVE_MIN
+    assert plan.num_partitions == 15
+    assert plan.num_missing == 15
+    assert plan.num_calls == 6
+
+
+def test_warm_intraday_skips_cached_windows(mocker):
+    mocker.patch.object(warm_cache, 'plan_intraday_range',
+                        side_effect=lambda symbols, days: _plan_all_missing(symbols, days) if len(days) > 1 else {})
+    load_intraday_range = mocker.patch.object(warm_cache, 'load_intraday_range')
+
+    _create_warmer().warm_intraday()
+
+    load_intraday_range.assert_called_once()
+    symbols, days = load_intraday_range.call_args.args[:2]
+    assert symbols == {'QQQ', 'SPY', 'DIA'}
+    assert [day.strftime('%F') for day in days] == ['2021-03-18', '2021-03-19', '2021-03-22', '2021-03-23']
@@ -3,7 +3,7 @@ import os
 import pytest
 import sqlalchemy
 
-from alpharius.web import create_app
+from alpharius.web import client as web_client, create_app
 from .. import fakes
 
 
@@ -34,4 +34,5 @@ def mock_engine(mocker):
 def mock_data_client(mocker):
     client = fakes.FakeDataClient()
     mocker.patch('alpharius.data.FmpClient', return_value=client)
+    mocker.patch.object(web_client, '_data_client', None)
     return client
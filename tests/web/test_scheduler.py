@@ -65,7 +65,7 @@ def test_backfill(mock_engine):
 
 
 @pytest.mark.parametrize('job_name',
-                         ['trade', 'backfill', 'backtest'])
+                         ['trade', 'backfill', 'backtest', 'ingest', 'cache'])
 def test_scheduler(job_name):
     job = scheduler.scheduler.get_job(job_name)
     assert job.next_run_time.timestamp() < time.time() + 86400 * 3
@@ -91,8 +91,30 @@ def test_backtest_run(mocker, mock_trading_client):
     assert mock_trading_client.get_calendar_call_count > 0
 
 
+def test_ingest(mocker):
+    ingest_interday_bulk = mocker.patch.object(scheduler.data, 'ingest_interday_bulk', return_value=1)
+    sync = mocker.patch.object(scheduler.data.SplitCalendar, 'sync', return_value=pd.DataFrame())
+    # Current time is 2023-08-30 22:46 in New York
+    mocker.patch.object(time, 'time', return_value=1693450000)
+
+    scheduler.ingest()
+
+    sync.assert_called_once()
+    ingest_interday_bulk.assert_called_once()
+    assert ingest_interday_bulk.call_args.args[0] == pd.Timestamp('2023-08-30')
+    assert ingest_interday_bulk.call_args.args[1] == pd.Timestamp('2023-08-29')
+
+
+def test_cache(mocker):
+    run = mocker.patch.object(scheduler.data.CacheManager, 'run', return_value={})
+
+    scheduler.cache()
+
+    run.assert_called_once()
+
+
 @pytest.mark.parametrize('method_name',
-                         ['_backtest_run', '_trade_run', 'backfill'])
+                         ['_backtest_run', '_trade_run', 'backfill', 'ingest'])
 def test_email_send(mocker, method_name, mock_smtp, mock_alpaca, mock_trading_client, mock_engine):
     mocker.patch.object(image, 'MIMEImage', autospec=True)
     mocker.patch.object(multipart.MIMEMultipart, 'as_string', return_value='')